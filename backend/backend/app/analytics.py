@@ -3,12 +3,18 @@ from __future__ import annotations
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
+from types import SimpleNamespace
 
-from sqlalchemy import select, func, desc, and_
+from sqlalchemy import Float, Select, select, func, desc, and_, case, cast, true
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Task, Device, ActionLog, User, TaskStatus
+from app.models import (
+    Task, Device, ActionLog, User, TaskStatus, TaskHourlyRollup, ActionHourlyRollup
+)
+from app import analytics_clickhouse as clickhouse_analytics
 from app.clients import get_redis
+from app.config import get_settings
+from app.rollups import ACTION_SUCCESS_STATUSES, DURATION_PATTERN
 
 
 @dataclass
@@ -29,6 +35,69 @@ class DeviceAnalytics:
     avg_duration: float
     last_active: Optional[datetime]
     health_score: float
+    task_share: float = 0.0
+
+
+@dataclass(frozen=True)
+class _TaskSource:
+    """Maps task aggregates onto raw `tasks` rows or hourly rollup rows"""
+    time: Any
+    user_id: Any
+    device_id: Any
+    status: Any
+    rows: Any
+    hourly: bool
+
+    def count(self, condition: Any = None) -> Any:
+        if not self.hourly:
+            return func.count() if condition is None else func.count().filter(condition)
+        total = func.sum(TaskHourlyRollup.task_count)
+        return func.coalesce(total if condition is None else total.filter(condition), 0)
+
+    def avg_duration(self, condition: Any) -> Any:
+        if not self.hourly:
+            return func.avg(func.extract("epoch", Task.updated_at - Task.created_at)).filter(condition)
+        return (
+            func.sum(TaskHourlyRollup.duration_sum).filter(condition)
+            / func.nullif(func.sum(TaskHourlyRollup.duration_count).filter(condition), 0)
+        )
+
+    def since(self, moment: datetime) -> datetime:
+        """Window start; rollups only resolve whole hours"""
+        if self.hourly:
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment
+
+
+_RAW_TASKS = _TaskSource(
+    time=Task.created_at, user_id=Task.user_id, device_id=Task.device_id,
+    status=Task.status, rows=true(), hourly=False,
+)
+_ROLLUP_TASKS = _TaskSource(
+    time=TaskHourlyRollup.hour, user_id=TaskHourlyRollup.user_id,
+    device_id=TaskHourlyRollup.device_id, status=TaskHourlyRollup.status,
+    rows=TaskHourlyRollup.task_count > 0, hourly=True,
+)
+
+
+def _use_rollups(db: AsyncSession) -> bool:
+    """Rollups are trigger-maintained, so only Postgres has them"""
+    return (
+        get_settings().analytics_use_rollups
+        and db.get_bind().dialect.name == "postgresql"
+    )
+
+
+_NO_DEVICE_STATS = SimpleNamespace(
+    total=0, completed=0, failed=0, avg_duration=0, task_share=0)
+
+
+def _use_clickhouse() -> bool:
+    return get_settings().analytics_backend == "clickhouse"
+
+
+def _task_source(db: AsyncSession) -> _TaskSource:
+    return _ROLLUP_TASKS if _use_rollups(db) else _RAW_TASKS
 
 
 class AdvancedAnalytics:
@@ -42,28 +111,25 @@ class AdvancedAnalytics:
     ) -> Dict[str, Any]:
         """Get comprehensive performance summary for user"""
 
-        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-        cutoff_naive = cutoff.replace(tzinfo=None)
-
-        # Total tasks and status breakdown
-        total_tasks = await db.scalar(
-            select(func.count(Task.id)).where(
-                Task.user_id == user_id,
-                Task.created_at >= cutoff_naive
+        now = datetime.now(timezone.utc)
+        if _use_clickhouse():
+            row, peak_hours = await clickhouse_analytics.performance_rows(
+                user_id,
+                (now - timedelta(days=days)).replace(tzinfo=None),
+                (now - timedelta(days=7)).replace(tzinfo=None),
+                (now - timedelta(days=14)).replace(tzinfo=None),
             )
-        ) or 0
+            row.device_count = await db.scalar(
+                select(func.count(Device.id)).where(Device.user_id == user_id)
+            )
+        else:
+            row, peak_hours = await AdvancedAnalytics._performance_rows(
+                db, user_id, now, days)
 
-        # Status breakdown
-        status_breakdown = {}
-        for status in TaskStatus:
-            count = await db.scalar(
-                select(func.count(Task.id)).where(
-                    Task.user_id == user_id,
-                    Task.status == status.value,
-                    Task.created_at >= cutoff_naive
-                )
-            ) or 0
-            status_breakdown[status.value] = count
+        total_tasks = row.total_tasks or 0
+        status_breakdown = {
+            status.value: getattr(row, status.value) or 0 for status in TaskStatus
+        }
 
         # Success rate
         completed = status_breakdown.get("completed", 0)
@@ -72,77 +138,17 @@ class AdvancedAnalytics:
             100 if (completed + failed) > 0 else 0
 
         # Average task duration (from creation to completion/failure)
-        completed_tasks = (await db.execute(
-            select(Task).where(
-                Task.user_id == user_id,
-                Task.status.in_(["completed", "failed"]),
-                Task.created_at >= cutoff_naive
-            )
-        )).scalars().all()
-
-        durations = []
-        for task in completed_tasks:
-            if task.updated_at and task.created_at:
-                duration = (task.updated_at - task.created_at).total_seconds()
-                durations.append(duration)
-
-        avg_duration = sum(durations) / len(durations) if durations else 0
-
-        # Device count and utilization
-        device_count = await db.scalar(
-            select(func.count(Device.id)).where(Device.user_id == user_id)
-        ) or 0
-
-        # Active devices (had tasks in last 7 days)
-        week_ago = (datetime.now(timezone.utc) -
-                    timedelta(days=7)).replace(tzinfo=None)
-        active_devices = await db.scalar(
-            select(func.count(func.distinct(Task.device_id))).where(
-                Task.user_id == user_id,
-                Task.created_at >= week_ago
-            )
-        ) or 0
+        avg_duration = float(row.avg_duration or 0)
 
+        # Device count and utilization (active = had tasks in last 7 days)
+        device_count = row.device_count or 0
+        active_devices = row.active_devices or 0
         device_utilization = (active_devices / device_count) * \
             100 if device_count > 0 else 0
 
-        # Peak hours analysis
-        hourly_counts = {}
-        for task in (await db.execute(
-            select(Task).where(
-                Task.user_id == user_id,
-                Task.created_at >= cutoff_naive
-            )
-        )).scalars().all():
-            if task.created_at:
-                hour = task.created_at.hour
-                hourly_counts[hour] = hourly_counts.get(hour, 0) + 1
-
-        # Top 3 peak hours
-        peak_hours = sorted(hourly_counts.items(),
-                            key=lambda x: x[1], reverse=True)[:3]
-        peak_hours = [hour for hour, count in peak_hours]
-
         # Recent trends (last 7 days vs previous 7 days)
-        recent_week = (datetime.now(timezone.utc) -
-                       timedelta(days=7)).replace(tzinfo=None)
-        previous_week = (datetime.now(timezone.utc) -
-                         timedelta(days=14)).replace(tzinfo=None)
-
-        recent_tasks = await db.scalar(
-            select(func.count(Task.id)).where(
-                Task.user_id == user_id,
-                Task.created_at >= recent_week
-            )
-        ) or 0
-
-        previous_tasks = await db.scalar(
-            select(func.count(Task.id)).where(
-                Task.user_id == user_id,
-                Task.created_at >= previous_week,
-                Task.created_at < recent_week
-            )
-        ) or 0
+        recent_tasks = row.recent_tasks or 0
+        previous_tasks = row.previous_tasks or 0
 
         trend = "up" if recent_tasks > previous_tasks else "down" if recent_tasks < previous_tasks else "stable"
         trend_percentage = ((recent_tasks - previous_tasks) /
@@ -167,93 +173,105 @@ class AdvancedAnalytics:
             }
         }
 
+    @staticmethod
+    async def _performance_rows(
+        db: AsyncSession,
+        user_id: str,
+        now: datetime,
+        days: int
+    ) -> tuple[Any, List[int]]:
+        src = _task_source(db)
+        cutoff_naive = src.since((now - timedelta(days=days)).replace(tzinfo=None))
+        recent_week = src.since((now - timedelta(days=7)).replace(tzinfo=None))
+        previous_week = src.since((now - timedelta(days=14)).replace(tzinfo=None))
+
+        in_window = src.time >= cutoff_naive
+        finished = and_(in_window, src.status.in_(["completed", "failed"]))
+
+        # Single pass over the user's tasks: counts per status, average
+        # duration, device activity and week-over-week trend
+        aggregates = select(
+            src.count(in_window).label("total_tasks"),
+            *[
+                src.count(
+                    and_(in_window, src.status == status.value)
+                ).label(status.value)
+                for status in TaskStatus
+            ],
+            src.avg_duration(finished).label("avg_duration"),
+            func.count(func.distinct(src.device_id)).filter(
+                src.time >= recent_week
+            ).label("active_devices"),
+            src.count(src.time >= recent_week).label("recent_tasks"),
+            src.count(
+                and_(src.time >= previous_week,
+                     src.time < recent_week)
+            ).label("previous_tasks"),
+            select(func.count(Device.id))
+            .where(Device.user_id == user_id)
+            .scalar_subquery()
+            .label("device_count"),
+        ).where(
+            src.user_id == user_id,
+            src.time >= min(cutoff_naive, previous_week),
+            src.rows,
+        )
+        row = (await db.execute(aggregates)).one()
+
+        # Peak hours analysis: top 3 hours by task count
+        hour = func.date_part("hour", src.time)
+        peak_rows = (await db.execute(
+            select(hour.label("hour"), src.count().label("tasks"))
+            .where(src.user_id == user_id, in_window, src.rows)
+            .group_by(hour)
+            .order_by(desc("tasks"), hour)
+            .limit(3)
+        )).all()
+        peak_hours = [int(r.hour) for r in peak_rows]
+
+        return row, peak_hours
+
     @staticmethod
     async def get_device_analytics(
         db: AsyncSession,
         user_id: str,
-        days: int = 30
+        days: int = 30,
+        device_id: Optional[str] = None
     ) -> List[DeviceAnalytics]:
-        """Get analytics for each user device"""
-
-        cutoff = (datetime.now(timezone.utc) -
-                  timedelta(days=days)).replace(tzinfo=None)
-
-        # Get user devices with task stats
-        devices = (await db.execute(
-            select(Device).where(Device.user_id == user_id)
-        )).scalars().all()
+        """Get analytics for each user device, or only `device_id`"""
+
+        if _use_clickhouse():
+            cutoff = (datetime.now(timezone.utc) -
+                      timedelta(days=days)).replace(tzinfo=None)
+            stats = await clickhouse_analytics.device_rows(user_id, cutoff)
+            query = (
+                select(Device)
+                .where(Device.user_id == user_id)
+                .order_by(Device.created_at, Device.id)
+            )
+            if device_id is not None:
+                query = query.where(Device.id == device_id)
+            rows = [
+                (device, stats.get(str(device.id), _NO_DEVICE_STATS))
+                for device in (await db.execute(query)).scalars().all()
+            ]
+        else:
+            rows = await AdvancedAnalytics._device_rows(db, user_id, days, device_id)
 
         analytics = []
 
-        for device in devices:
-            # Task counts
-            total_tasks = await db.scalar(
-                select(func.count(Task.id)).where(
-                    Task.device_id == device.id,
-                    Task.created_at >= cutoff
-                )
-            ) or 0
-
-            completed_tasks = await db.scalar(
-                select(func.count(Task.id)).where(
-                    Task.device_id == device.id,
-                    Task.status == "completed",
-                    Task.created_at >= cutoff
-                )
-            ) or 0
-
-            failed_tasks = await db.scalar(
-                select(func.count(Task.id)).where(
-                    Task.device_id == device.id,
-                    Task.status == "failed",
-                    Task.created_at >= cutoff
-                )
-            ) or 0
+        for device, row in rows:
+            total_tasks = row.total or 0
+            completed_tasks = row.completed or 0
+            failed_tasks = row.failed or 0
 
             success_rate = (completed_tasks / (completed_tasks + failed_tasks)
                             ) * 100 if (completed_tasks + failed_tasks) > 0 else 0
 
-            # Average duration
-            finished_tasks = (await db.execute(
-                select(Task).where(
-                    Task.device_id == device.id,
-                    Task.status.in_(["completed", "failed"]),
-                    Task.created_at >= cutoff
-                )
-            )).scalars().all()
-
-            durations = []
-            for task in finished_tasks:
-                if task.updated_at and task.created_at:
-                    duration = (task.updated_at -
-                                task.created_at).total_seconds()
-                    durations.append(duration)
-
-            avg_duration = sum(durations) / len(durations) if durations else 0
-
-            # Health score calculation
-            health_score = 100.0
-
-            # Reduce for low success rate
-            if success_rate < 90:
-                health_score -= (90 - success_rate)
-
-            # Reduce for being offline too long
-            if device.last_seen:
-                offline_hours = (datetime.now(
-                    timezone.utc) - device.last_seen.replace(tzinfo=timezone.utc)).total_seconds() / 3600
-                if offline_hours > 24:
-                    health_score -= min(50, offline_hours - 24)
-            else:
-                health_score -= 50  # Never connected
-
-            # Reduce for high task failure rate
-            if total_tasks > 0:
-                failure_rate = (failed_tasks / total_tasks) * 100
-                if failure_rate > 10:
-                    health_score -= (failure_rate - 10)
-
-            health_score = max(0, min(100, health_score))
+            avg_duration = float(row.avg_duration or 0)
+
+            health_score = AdvancedAnalytics._device_health_score(
+                success_rate, device.last_seen, total_tasks, failed_tasks)
 
             analytics.append(DeviceAnalytics(
                 device_id=str(device.id),
@@ -262,11 +280,95 @@ class AdvancedAnalytics:
                 success_rate=round(success_rate, 2),
                 avg_duration=round(avg_duration, 2),
                 last_active=device.last_seen,
-                health_score=round(health_score, 2)
+                health_score=round(health_score, 2),
+                task_share=round(float(row.task_share or 0), 2)
             ))
 
         return analytics
 
+    @staticmethod
+    async def _device_rows(
+        db: AsyncSession,
+        user_id: str,
+        days: int,
+        device_id: Optional[str]
+    ) -> List[tuple[Device, Any]]:
+        src = _task_source(db)
+        cutoff = src.since((datetime.now(timezone.utc) -
+                            timedelta(days=days)).replace(tzinfo=None))
+        in_scope = [src.user_id == user_id, src.time >= cutoff, src.rows]
+        if device_id is not None:
+            in_scope.append(src.device_id == device_id)
+
+        # Task stats for all devices in one grouped pass
+        stats = select(
+            src.device_id.label("device_id"),
+            src.count().label("total"),
+            src.count(src.status == "completed").label("completed"),
+            src.count(src.status == "failed").label("failed"),
+            src.avg_duration(
+                src.status.in_(["completed", "failed"])
+            ).label("avg_duration"),
+        ).where(*in_scope).group_by(src.device_id).subquery("stats")
+
+        # Share of the user's tasks handled by each device
+        if device_id is None:
+            user_total = func.sum(stats.c.total).over()
+        else:
+            user_total = (
+                select(src.count())
+                .where(src.user_id == user_id, src.time >= cutoff, src.rows)
+                .scalar_subquery()
+            )
+
+        query = (
+            select(
+                Device,
+                stats.c.total,
+                stats.c.completed,
+                stats.c.failed,
+                stats.c.avg_duration,
+                (stats.c.total * 100.0 / func.nullif(user_total, 0)).label("task_share"),
+            )
+            .outerjoin(stats, stats.c.device_id == Device.id)
+            .where(Device.user_id == user_id)
+            .order_by(Device.created_at, Device.id)
+        )
+        if device_id is not None:
+            query = query.where(Device.id == device_id)
+
+        return [(row.Device, row) for row in (await db.execute(query)).all()]
+
+    @staticmethod
+    def _device_health_score(
+        success_rate: float,
+        last_seen: Optional[datetime],
+        total_tasks: int,
+        failed_tasks: int
+    ) -> float:
+        health_score = 100.0
+
+        # Reduce for low success rate
+        if success_rate < 90:
+            health_score -= (90 - success_rate)
+
+        # Reduce for being offline too long
+        if last_seen:
+            offline_hours = (datetime.now(
+                timezone.utc) - last_seen.replace(tzinfo=timezone.utc)).total_seconds() / 3600
+            if offline_hours > 24:
+                health_score -= min(50, offline_hours - 24)
+        else:
+            health_score -= 50  # Never connected
+
+        # Reduce for high task failure rate
+        if total_tasks > 0:
+            failure_rate = (failed_tasks / total_tasks) * 100
+            if failure_rate > 10:
+                health_score -= (failure_rate - 10)
+
+        return max(0, min(100, health_score))
+
     @staticmethod
     async def get_action_performance(
         db: AsyncSession,
@@ -278,68 +380,81 @@ class AdvancedAnalytics:
         cutoff = (datetime.now(timezone.utc) -
                   timedelta(days=days)).replace(tzinfo=None)
 
-        # Get all action logs for user's tasks
-        action_logs = (await db.execute(
-            select(ActionLog)
-            .join(Task, Task.id == ActionLog.task_id)
-            .where(
-                Task.user_id == user_id,
-                ActionLog.created_at >= cutoff
-            )
-        )).scalars().all()
-
-        action_stats = {}
-
-        for log in action_logs:
-            action_type = log.action.get("type", "unknown")
-
-            if action_type not in action_stats:
-                action_stats[action_type] = {
-                    "total": 0,
-                    "success": 0,
-                    "failure": 0,
-                    "durations": []
-                }
-
-            action_stats[action_type]["total"] += 1
-
-            # Check result status
-            result = log.result or {}
-            status = result.get("status", "unknown")
-
-            if status in ("done", "ok", "success", "completed"):
-                action_stats[action_type]["success"] += 1
-            elif status in ("failed", "error"):
-                action_stats[action_type]["failure"] += 1
-
-            # Duration if available
-            if "duration" in result:
-                try:
-                    duration = float(result["duration"])
-                    action_stats[action_type]["durations"].append(duration)
-                except (ValueError, TypeError):
-                    pass
+        if _use_clickhouse():
+            rows = await clickhouse_analytics.action_rows(user_id, cutoff)
+        elif _use_rollups(db):
+            rows = (await db.execute(AdvancedAnalytics._action_rollup_query(
+                user_id, _ROLLUP_TASKS.since(cutoff)))).all()
+        else:
+            rows = (await db.execute(
+                AdvancedAnalytics._action_log_query(user_id, cutoff))).all()
 
         # Calculate summary stats
         summary = {}
-        for action_type, stats in action_stats.items():
-            total = stats["total"]
-            success = stats["success"]
-            durations = stats["durations"]
-
-            success_rate = (success / total) * 100 if total > 0 else 0
-            avg_duration = sum(durations) / len(durations) if durations else 0
+        for row in rows:
+            total = row.total or 0
+            success_rate = (row.success / total) * 100 if total > 0 else 0
+            avg_duration = (row.duration_sum / row.duration_count
+                            if row.duration_count else 0)
 
-            summary[action_type] = {
+            summary[row.action_type] = {
                 "total_executions": total,
                 "success_rate": round(success_rate, 2),
                 "avg_duration_seconds": round(avg_duration, 2),
-                "fastest": round(min(durations), 2) if durations else 0,
-                "slowest": round(max(durations), 2) if durations else 0
+                "fastest": round(row.fastest, 2) if row.fastest is not None else 0,
+                "slowest": round(row.slowest, 2) if row.slowest is not None else 0
             }
 
         return summary
 
+    @staticmethod
+    def _action_log_query(user_id: str, cutoff: datetime) -> Select:
+        """Per action type aggregates straight from action_logs"""
+        action_type = func.coalesce(ActionLog.action["type"].as_string(), "unknown")
+        status = ActionLog.result["status"].as_string()
+        raw_duration = ActionLog.result["duration"].as_string()
+        duration = case(
+            (func.jsonb_typeof(ActionLog.result["duration"]) == "number",
+             cast(raw_duration, Float)),
+            # Numeric strings count too; anything else is ignored
+            (raw_duration.op("~")(DURATION_PATTERN), cast(raw_duration, Float)),
+        )
+        return (
+            select(
+                action_type.label("action_type"),
+                func.count().label("total"),
+                func.count().filter(
+                    status.in_(ACTION_SUCCESS_STATUSES)).label("success"),
+                func.sum(duration).label("duration_sum"),
+                func.count(duration).label("duration_count"),
+                func.min(duration).label("fastest"),
+                func.max(duration).label("slowest"),
+            )
+            .join(Task, Task.id == ActionLog.task_id)
+            .where(Task.user_id == user_id, ActionLog.created_at >= cutoff)
+            .group_by(action_type)
+        )
+
+    @staticmethod
+    def _action_rollup_query(user_id: str, cutoff: datetime) -> Select:
+        """Per action type aggregates from hourly rollups"""
+        r = ActionHourlyRollup
+        return (
+            select(
+                r.action_type,
+                func.sum(r.action_count).label("total"),
+                func.coalesce(
+                    func.sum(r.action_count).filter(r.outcome == "success"), 0
+                ).label("success"),
+                func.sum(r.duration_sum).label("duration_sum"),
+                func.sum(r.duration_count).label("duration_count"),
+                func.min(r.duration_min).label("fastest"),
+                func.max(r.duration_max).label("slowest"),
+            )
+            .where(r.user_id == user_id, r.hour >= cutoff, r.action_count > 0)
+            .group_by(r.action_type)
+        )
+
     @staticmethod
     async def get_system_health(db: AsyncSession) -> Dict[str, Any]:
         """Get overall system health metrics (admin only)"""
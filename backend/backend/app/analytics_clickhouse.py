@@ -0,0 +1,143 @@
+"""
+ClickHouse query backend for AdvancedAnalytics (ANALYTICS_BACKEND=clickhouse).
+
+Reads the `task_events` table written by app.task_events. A task's current
+state is its latest status event (argMax over ts); rows come back with the
+same field names as the Postgres queries so AdvancedAnalytics can share the
+post-processing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any
+
+from app.clients import get_clickhouse
+from app.models import TaskStatus
+from app.task_events import TASK_EVENTS_TABLE
+
+
+_client: Any = None
+
+# Latest state of each of the user's tasks created since {since}
+_TASK_STATE = f"""
+    SELECT
+        task_id,
+        any(device_id) AS device_id,
+        min(task_created_at) AS created_at,
+        argMax(status, ts) AS status,
+        argMax(duration, ts) AS duration
+    FROM {TASK_EVENTS_TABLE}
+    WHERE user_id = {{user_id:String}}
+      AND event != 'action'
+      AND task_created_at >= {{since:DateTime64(3, 'UTC')}}
+    GROUP BY task_id
+"""
+
+_FINISHED = "status IN ('completed', 'failed')"
+
+
+def _get_client() -> Any:
+    # Shared HTTP client; without a session id concurrent queries are safe
+    global _client
+    if _client is None:
+        _client = get_clickhouse(autogenerate_session_id=False)
+        if _client is None:
+            raise RuntimeError("ANALYTICS_BACKEND=clickhouse but ClickHouse is not configured")
+    return _client
+
+
+async def _query(sql: str, parameters: dict[str, Any]) -> list[SimpleNamespace]:
+    client = await asyncio.to_thread(_get_client)
+    result = await asyncio.to_thread(client.query, sql, parameters=parameters)
+    return [SimpleNamespace(**row) for row in result.named_results()]
+
+
+async def performance_rows(
+    user_id: str,
+    cutoff: datetime,
+    recent_week: datetime,
+    previous_week: datetime,
+) -> tuple[SimpleNamespace, list[int]]:
+    """Summary aggregates and top 3 peak hours"""
+    in_window = "created_at >= {cutoff:DateTime64(3, 'UTC')}"
+    recent = "created_at >= {recent:DateTime64(3, 'UTC')}"
+    status_counts = ",\n".join(
+        f"countIf({in_window} AND status = '{status.value}') AS {status.value}"
+        for status in TaskStatus
+    )
+    params = {
+        "user_id": user_id,
+        "since": min(cutoff, previous_week),
+        "cutoff": cutoff,
+        "recent": recent_week,
+        "previous": previous_week,
+    }
+    summary = await _query(
+        f"""
+        SELECT
+            countIf({in_window}) AS total_tasks,
+            {status_counts},
+            ifNotFinite(avgIf(duration, {in_window} AND {_FINISHED}), 0) AS avg_duration,
+            uniqExactIf(device_id, {recent}) AS active_devices,
+            countIf({recent}) AS recent_tasks,
+            countIf(created_at >= {{previous:DateTime64(3, 'UTC')}} AND NOT {recent}) AS previous_tasks
+        FROM ({_TASK_STATE})
+        """,
+        params,
+    )
+    peaks = await _query(
+        f"""
+        SELECT toHour(created_at) AS hour, count() AS tasks
+        FROM ({_TASK_STATE})
+        WHERE {in_window}
+        GROUP BY hour
+        ORDER BY tasks DESC, hour
+        LIMIT 3
+        """,
+        params,
+    )
+    return summary[0], [int(r.hour) for r in peaks]
+
+
+async def device_rows(user_id: str, cutoff: datetime) -> dict[str, SimpleNamespace]:
+    """Per-device task stats keyed by device id"""
+    rows = await _query(
+        f"""
+        SELECT
+            device_id,
+            count() AS total,
+            countIf(status = 'completed') AS completed,
+            countIf(status = 'failed') AS failed,
+            ifNotFinite(avgIf(duration, {_FINISHED}), 0) AS avg_duration,
+            count() * 100.0 / sum(count()) OVER () AS task_share
+        FROM ({_TASK_STATE})
+        GROUP BY device_id
+        """,
+        {"user_id": user_id, "since": cutoff},
+    )
+    return {r.device_id: r for r in rows}
+
+
+async def action_rows(user_id: str, cutoff: datetime) -> list[SimpleNamespace]:
+    """Per action type aggregates"""
+    return await _query(
+        f"""
+        SELECT
+            action_type,
+            count() AS total,
+            countIf(outcome = 'success') AS success,
+            sum(duration) AS duration_sum,
+            count(duration) AS duration_count,
+            min(duration) AS fastest,
+            max(duration) AS slowest
+        FROM {TASK_EVENTS_TABLE}
+        WHERE user_id = {{user_id:String}}
+          AND event = 'action'
+          AND ts >= {{since:DateTime64(3, 'UTC')}}
+        GROUP BY action_type
+        """,
+        {"user_id": user_id, "since": cutoff},
+    )
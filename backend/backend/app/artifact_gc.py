@@ -0,0 +1,307 @@
+"""
+Artifact retention.
+
+`artifact_collector` runs every ARTIFACT_GC_INTERVAL_SECONDS and deletes
+objects from the artifact store (app.storage) according to
+
+- ARTIFACT_RETENTION_RULES: `prefix=days` pairs (e.g.
+  `screenshots/=14,derived/=30`); objects under a prefix are deleted once
+  their LastModified is older than its days. The longest matching prefix
+  wins. Content-addressed objects (`cas/`) are only deleted while no task
+  references them.
+- ARTIFACT_TASK_RETENTION_DAYS: presigned uploads live under
+  `tasks/<task_id>/` and go when their task is older than that. A user can
+  shorten or extend it with the `artifact_retention_days` preference. The
+  same age ends a task's references to content-addressed artifacts
+  (`artifact_refs`). Objects whose task no longer exists (for example a
+  dropped partition) are deleted too.
+- Content-addressed artifacts left without references are deleted after
+  ARTIFACT_UNREFERENCED_GRACE_HOURS, together with their derivatives.
+
+Objects are listed a page (up to 1000 keys) at a time and removed with one
+delete call (`delete_objects` on S3) per page, so a run holds at most one
+page in memory.
+Nothing is deleted unless a retention setting is configured. A run holds a
+Postgres advisory lock, so only one replica collects at a time.
+
+Usage:
+    python -m app.artifact_gc [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from loguru import logger
+from sqlalchemy import text
+
+from app.config import settings
+from app.content_store import CAS_PREFIX
+from app.db import engine
+from app.metrics import artifact_gc_deleted_total
+from app.storage import ArtifactStorage, get_storage
+from app.thumbnails import DERIVED_PREFIX, VARIANTS, derived_key
+
+
+DELETE_BATCH = 1000  # S3 limit for one delete_objects call
+TASKS_PREFIX = "tasks/"
+USER_RETENTION_PREFERENCE = "artifact_retention_days"
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+_LOCK_KEY = 724_310_041
+
+
+@dataclass(frozen=True)
+class RetentionRule:
+    prefix: str
+    days: int
+
+
+def parse_rules(raw: str | None) -> list[RetentionRule]:
+    """`prefix=days,...`, longest prefix first"""
+    rules = []
+    for item in (raw or "").split(","):
+        if not item.strip():
+            continue
+        prefix, _, days = item.partition("=")
+        rules.append(RetentionRule(prefix.strip(), int(days)))
+    return sorted(rules, key=lambda r: len(r.prefix), reverse=True)
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def _naive(value: datetime) -> datetime:
+    # S3 timestamps are aware; the database stores naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def delete_keys(
+    storage: ArtifactStorage, keys: list[str], reason: str | None, dry_run: bool = False
+) -> int:
+    """Delete `keys` in batches of 1000; returns how many were deleted.
+    Deletions without a `reason` are not counted in the metric"""
+    deleted = 0
+    for start in range(0, len(keys), DELETE_BATCH):
+        batch = keys[start:start + DELETE_BATCH]
+        deleted += len(batch) if dry_run else await storage.delete(batch)
+    if reason and deleted and not dry_run:
+        artifact_gc_deleted_total.labels(reason).inc(deleted)
+    return deleted
+
+
+async def delete_with_derivatives(
+    storage: ArtifactStorage, keys: list[str], reason: str, dry_run: bool = False
+) -> int:
+    """Delete `keys` and their thumbnails/previews (app.thumbnails)"""
+    deleted = await delete_keys(storage, keys, reason, dry_run)
+    derived = [derived_key(k, v) for k in keys for v in VARIANTS
+               if not k.startswith(f"{DERIVED_PREFIX}/")]
+    if derived and not dry_run:
+        await delete_keys(storage, derived, None)
+    return deleted
+
+
+def _rule_for(key: str, rules: list[RetentionRule]) -> RetentionRule | None:
+    return next((r for r in rules if key.startswith(r.prefix)), None)
+
+
+async def _still_referenced(digests: list[str], dry_run: bool) -> set[str]:
+    """Drop the rows of unreferenced `digests`; returns the ones to keep"""
+    if not digests:
+        return set()
+    async with engine.begin() as conn:
+        if not dry_run:
+            await conn.execute(text(
+                "DELETE FROM artifacts WHERE sha256 = ANY(:digests) AND ref_count = 0"
+            ), {"digests": digests})
+        rows = await conn.execute(text(
+            "SELECT sha256 FROM artifacts WHERE sha256 = ANY(:digests) AND ref_count > 0"
+        ), {"digests": digests})
+        return {r[0] for r in rows}
+
+
+async def collect_prefixes(
+    storage: ArtifactStorage, rules: list[RetentionRule], now: datetime, dry_run: bool = False
+) -> int:
+    """Apply ARTIFACT_RETENTION_RULES"""
+    deleted = 0
+    # Overlapping prefixes are listed once, under the shortest one
+    roots = [r.prefix for r in sorted(rules, key=lambda r: len(r.prefix))]
+    roots = [p for i, p in enumerate(roots) if not any(p.startswith(q) for q in roots[:i])]
+    for root in roots:
+        async for page in storage.list_pages(root):
+            expired = []
+            for obj in page:
+                rule = _rule_for(obj.key, rules)
+                if rule and _naive(obj.last_modified) < now - timedelta(days=rule.days):
+                    expired.append(obj.key)
+            cas = {k.rsplit("/", 1)[-1]: k for k in expired if k.startswith(f"{CAS_PREFIX}/")}
+            keep = {cas[d] for d in await _still_referenced(list(cas), dry_run)}
+            expired = [k for k in expired if k not in keep]
+            deleted += await delete_with_derivatives(storage, expired, "prefix", dry_run)
+    return deleted
+
+
+async def _task_ages(task_ids: list[str]) -> dict[str, tuple[datetime, int | None]]:
+    """created_at and the owner's retention preference of existing tasks"""
+    if not task_ids:
+        return {}
+    async with engine.connect() as conn:
+        rows = await conn.execute(text(f"""
+            SELECT t.id, t.created_at,
+                   CASE WHEN u.preferences->>'{USER_RETENTION_PREFERENCE}' ~ '^[0-9]+$'
+                        THEN (u.preferences->>'{USER_RETENTION_PREFERENCE}')::int END
+            FROM tasks t JOIN users u ON u.id = t.user_id
+            WHERE t.id = ANY(:ids)
+        """), {"ids": task_ids})
+        return {r[0]: (_naive(r[1]), r[2]) for r in rows}
+
+
+def _task_expired(age: tuple[datetime, int | None] | None, default_days: int, now: datetime) -> bool:
+    if age is None:
+        return True  # task is gone
+    created_at, user_days = age
+    days = user_days if user_days is not None else default_days
+    return created_at < now - timedelta(days=days)
+
+
+async def collect_task_objects(
+    storage: ArtifactStorage, days: int, now: datetime, dry_run: bool = False
+) -> int:
+    """Delete `tasks/<task_id>/...` objects of expired or deleted tasks"""
+    deleted = 0
+    async for page in storage.list_pages(TASKS_PREFIX):
+        by_task: dict[str, list[str]] = {}
+        for obj in page:
+            task_id = obj.key[len(TASKS_PREFIX):].split("/", 1)[0]
+            by_task.setdefault(task_id, []).append(obj.key)
+        ages = await _task_ages(list(by_task))
+        expired = [
+            key for task_id, keys in by_task.items()
+            if _task_expired(ages.get(task_id), days, now) for key in keys
+        ]
+        deleted += await delete_with_derivatives(storage, expired, "task", dry_run)
+    return deleted
+
+
+async def release_task_refs(days: int, now: datetime, dry_run: bool = False) -> int:
+    """Drop artifact_refs of expired or deleted tasks; triggers lower ref_count"""
+    where = f"""
+        NOT EXISTS (
+            SELECT 1 FROM tasks t JOIN users u ON u.id = t.user_id
+            WHERE t.id = r.task_id AND t.created_at >= CAST(:now AS timestamp) - make_interval(
+                days => CASE WHEN u.preferences->>'{USER_RETENTION_PREFERENCE}' ~ '^[0-9]+$'
+                             THEN (u.preferences->>'{USER_RETENTION_PREFERENCE}')::int
+                             ELSE :days END))
+    """
+    async with engine.begin() as conn:
+        if dry_run:
+            return await conn.scalar(text(
+                f"SELECT count(*) FROM artifact_refs r WHERE {where}"), {"now": now, "days": days})
+        result = await conn.execute(text(
+            f"DELETE FROM artifact_refs r WHERE {where}"), {"now": now, "days": days})
+        return result.rowcount
+
+
+async def collect_unreferenced(
+    storage: ArtifactStorage, grace_hours: int, now: datetime, dry_run: bool = False
+) -> int:
+    """Delete content-addressed artifacts nobody references any more"""
+    deleted = 0
+    cutoff = now - timedelta(hours=grace_hours)
+    while True:
+        async with engine.begin() as conn:
+            if dry_run:
+                rows = await conn.execute(text(
+                    "SELECT sha256, s3_key FROM artifacts "
+                    "WHERE ref_count = 0 AND created_at < :cutoff"), {"cutoff": cutoff})
+            else:
+                # Rows go first, so a reference added meanwhile keeps its row
+                # (ref_count > 0) and the object
+                rows = await conn.execute(text("""
+                    DELETE FROM artifacts WHERE sha256 IN (
+                        SELECT sha256 FROM artifacts
+                        WHERE ref_count = 0 AND created_at < :cutoff
+                        LIMIT :batch FOR UPDATE SKIP LOCKED)
+                    AND ref_count = 0
+                    RETURNING sha256, s3_key
+                """), {"cutoff": cutoff, "batch": DELETE_BATCH})
+            keys = [r.s3_key for r in rows]
+        deleted += await delete_with_derivatives(storage, keys, "unreferenced", dry_run)
+        if dry_run or len(keys) < DELETE_BATCH:
+            return deleted
+
+
+async def collect_artifacts(dry_run: bool = False, now: datetime | None = None) -> dict[str, int]:
+    """Apply every configured retention setting; does nothing (empty report)
+    while another process holds the collector lock"""
+    storage = get_storage()
+    if storage is None:
+        return {}
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await lock_conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}):
+            logger.info("Artifact retention is running in another process, skipping")
+            return {}
+        try:
+            return await _collect_artifacts(storage, dry_run, now or _utcnow())
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+
+async def _collect_artifacts(
+    storage: ArtifactStorage, dry_run: bool, now: datetime
+) -> dict[str, int]:
+    report: dict[str, int] = {}
+    rules = parse_rules(settings.artifact_retention_rules)
+    if rules:
+        report["prefix"] = await collect_prefixes(storage, rules, now, dry_run)
+    days = settings.artifact_task_retention_days
+    if days is not None:
+        report["task"] = await collect_task_objects(storage, days, now, dry_run)
+        report["released_refs"] = await release_task_refs(days, now, dry_run)
+    if rules or days is not None:
+        report["unreferenced"] = await collect_unreferenced(
+            storage, settings.artifact_unreferenced_grace_hours, now, dry_run)
+    return report
+
+
+class ArtifactCollector:
+    """Runs `collect_artifacts` every ARTIFACT_GC_INTERVAL_SECONDS"""
+
+    def __init__(self):
+        self.running = False
+
+    async def start(self) -> None:
+        self.running = True
+        while self.running:
+            try:
+                report = await collect_artifacts()
+                if any(report.values()):
+                    logger.info(f"Artifact retention: {report}")
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Artifact retention error: {e}")
+            await asyncio.sleep(settings.artifact_gc_interval_seconds)
+
+    def stop(self) -> None:
+        self.running = False
+
+
+artifact_collector = ArtifactCollector()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply artifact retention")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only count what retention would delete")
+    args = parser.parse_args()
+    print(asyncio.run(collect_artifacts(args.dry_run)))
@@ -3,6 +3,8 @@ from __future__ import annotations
 from typing import Optional
 import json
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from urllib.parse import urlparse
 from loguru import logger
 
@@ -30,13 +32,13 @@ def get_redis() -> Redis | None:
     return redis_client
 
 
-def get_clickhouse():  # type: ignore[no-untyped-def]
+def get_clickhouse(**client_kwargs):  # type: ignore[no-untyped-def]
     if settings.clickhouse_url is None or get_ch_client is None:
         return None
     parsed = urlparse(settings.clickhouse_url)
     host = parsed.hostname or settings.clickhouse_url
     port = parsed.port or 8123
-    return get_ch_client(host=host, port=port)
+    return get_ch_client(host=host, port=port, **client_kwargs)
 
 
 # Kafka
@@ -88,35 +90,127 @@ async def close_kafka_producer() -> None:
 
 
 # MinIO / S3
+#
+# boto3 is blocking, so S3 calls run on a dedicated thread pool sized together
+# with botocore's connection pool (S3_MAX_CONNECTIONS) instead of the default
+# executor shared with the rest of the app. Presigned URLs are signed locally.
 _s3_client = None
+_s3_presign_client = None
+_s3_executor: ThreadPoolExecutor | None = None
+_ready_buckets: set[str] = set()
+_bucket_lock = asyncio.Lock()
 
 
-def get_s3_client():  # type: ignore[no-untyped-def]
-    global _s3_client
-    if _s3_client is not None:
-        return _s3_client
-    if settings.__dict__.get("minio_endpoint") is None:
-        return None
-
+def _s3_config():  # type: ignore[no-untyped-def]
     from botocore.config import Config
-    config = Config(
+    return Config(
         region_name="us-east-1",
         signature_version='s3v4',
         connect_timeout=5,
         read_timeout=10,
-        retries={'max_attempts': 3}
+        retries={'max_attempts': 3},
+        max_pool_connections=settings.s3_max_connections,
+        tcp_keepalive=True,
     )
 
+
+def get_s3_client():  # type: ignore[no-untyped-def]
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+    if settings.__dict__.get("minio_endpoint") is None:
+        return None
+
     _s3_client = boto3.client(
         "s3",
         endpoint_url=settings.minio_endpoint,
         aws_access_key_id=settings.minio_access_key,
         aws_secret_access_key=settings.minio_secret_key,
-        config=config,
+        config=_s3_config(),
     )
     return _s3_client
 
 
+def get_s3_presign_client():  # type: ignore[no-untyped-def]
+    """Client whose presigned URLs point at MINIO_EXTERNAL_ENDPOINT (the
+    internal client when unset); signing needs no network round trip"""
+    global _s3_presign_client
+    if not settings.minio_external_endpoint:
+        return get_s3_client()
+    if _s3_presign_client is None:
+        _s3_presign_client = boto3.client(
+            "s3",
+            endpoint_url=settings.minio_external_endpoint,
+            aws_access_key_id=settings.minio_access_key,
+            aws_secret_access_key=settings.minio_secret_key,
+            config=_s3_config(),
+        )
+    return _s3_presign_client
+
+
+def _get_s3_executor() -> ThreadPoolExecutor:
+    global _s3_executor
+    if _s3_executor is None:
+        _s3_executor = ThreadPoolExecutor(
+            max_workers=settings.s3_max_connections, thread_name_prefix="s3")
+    return _s3_executor
+
+
+async def run_s3_operation(func_or_partial):
+    """Run S3 operation on the S3 thread pool to avoid blocking the event loop"""
+    from fastapi import HTTPException
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(_get_s3_executor(), func_or_partial),
+            timeout=30.0  # 30 second timeout
+        )
+    except asyncio.TimeoutError as exc:
+        logger.error("S3 operation timed out after 30 seconds")
+        raise HTTPException(
+            status_code=504, detail="S3 operation timed out") from exc
+    except Exception as exc:
+        logger.error(f"S3 operation failed: {exc}")
+        raise
+
+
+async def ensure_bucket(bucket: str) -> bool:
+    """Make sure `bucket` exists, creating it if needed; checked once per
+    process. Returns True if the bucket had to be created"""
+    from fastapi import HTTPException
+    if bucket in _ready_buckets:
+        return False
+    s3 = get_s3_client()
+    if s3 is None:
+        raise HTTPException(status_code=500, detail="S3 client not available")
+    async with _bucket_lock:
+        if bucket in _ready_buckets:
+            return False
+        created = False
+        try:
+            await run_s3_operation(partial(s3.head_bucket, Bucket=bucket))
+        except HTTPException:
+            raise  # Re-raise timeout errors
+        except Exception:
+            # Bucket doesn't exist, create it
+            try:
+                await run_s3_operation(partial(s3.create_bucket, Bucket=bucket))
+                created = True
+            except Exception as exc:
+                code = getattr(exc, "response", {}).get("Error", {}).get("Code")
+                if code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                    raise
+        _ready_buckets.add(bucket)
+        return created
+
+
+def shutdown_s3_executor() -> None:
+    global _s3_executor
+    if _s3_executor is not None:
+        _s3_executor.shutdown(wait=False, cancel_futures=True)
+        _s3_executor = None
+
+
 async def publish_event(channel: str, event: dict) -> None:
     """
     Publish an event to Redis pub/sub channel if Redis is configured.
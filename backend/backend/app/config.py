@@ -43,6 +43,13 @@ class Settings(BaseSettings):
         default=None, alias="MINIO_SECRET_KEY")
     artifacts_bucket: str | None = Field(
         default=None, alias="ARTIFACTS_BUCKET")
+    # Artifact backend (app.storage): "s3" (ARTIFACTS_BUCKET) or "local"
+    artifact_storage: str = Field(default="s3", alias="ARTIFACT_STORAGE")
+    artifact_local_dir: str = Field(
+        default="./data/artifacts", alias="ARTIFACT_LOCAL_DIR")
+    # Base of public URLs of the local backend; unset gives root-relative URLs
+    artifact_local_public_url: str | None = Field(
+        default=None, alias="ARTIFACT_LOCAL_PUBLIC_URL")
 
     rate_limit_login_per_minute: int = Field(
         default=100, alias="RATE_LIMIT_LOGIN_PER_MINUTE")
@@ -57,6 +64,124 @@ class Settings(BaseSettings):
         default=True, alias="ENABLE_DEBUG_ROUTES"
     )
 
+    # Analytics
+    analytics_backend: str = Field(
+        default="postgres", alias="ANALYTICS_BACKEND"
+    )  # postgres | clickhouse
+    analytics_use_rollups: bool = Field(
+        default=True, alias="ANALYTICS_USE_ROLLUPS"
+    )
+    task_events_batch_size: int = Field(
+        default=1000, alias="TASK_EVENTS_BATCH_SIZE"
+    )
+    task_events_flush_seconds: float = Field(
+        default=1.0, alias="TASK_EVENTS_FLUSH_SECONDS"
+    )
+
+    # Response cache (analytics/statistics endpoints)
+    response_cache_enabled: bool = Field(
+        default=True, alias="RESPONSE_CACHE_ENABLED"
+    )
+    response_cache_ttl_seconds: int = Field(
+        default=60, alias="RESPONSE_CACHE_TTL_SECONDS"
+    )
+    response_cache_lock_seconds: float = Field(
+        default=5.0, alias="RESPONSE_CACHE_LOCK_SECONDS"
+    )
+
+    # Redis fast path for Idempotency-Key claims (app.idempotency)
+    idempotency_redis_enabled: bool = Field(
+        default=True, alias="IDEMPOTENCY_REDIS_ENABLED"
+    )
+    idempotency_response_ttl_seconds: int = Field(
+        default=86400, alias="IDEMPOTENCY_RESPONSE_TTL_SECONDS"
+    )
+    idempotency_pending_ttl_seconds: int = Field(
+        default=30, alias="IDEMPOTENCY_PENDING_TTL_SECONDS"
+    )
+    idempotency_wait_seconds: float = Field(
+        default=3.0, alias="IDEMPOTENCY_WAIT_SECONDS"
+    )
+
+    # Task status long-poll/SSE (app.task_watch)
+    task_wait_max_seconds: float = Field(
+        default=60.0, alias="TASK_WAIT_MAX_SECONDS"
+    )
+    task_events_keepalive_seconds: float = Field(
+        default=15.0, alias="TASK_EVENTS_KEEPALIVE_SECONDS"
+    )
+    # Longest /v1/chat/agent waits for a screenshot before answering
+    chat_screenshot_wait_seconds: float = Field(
+        default=10.0, alias="CHAT_SCREENSHOT_WAIT_SECONDS"
+    )
+
+    # Threads and pooled HTTP connections for S3 calls (app.clients)
+    s3_max_connections: int = Field(default=32, alias="S3_MAX_CONNECTIONS")
+    # Artifact uploads are streamed to S3 as multipart uploads (app.uploads):
+    # part size (S3 minimum 5 MiB) and parts in flight per upload bound memory
+    artifact_upload_part_size: int = Field(
+        default=8 * 1024 * 1024, alias="ARTIFACT_UPLOAD_PART_SIZE"
+    )
+    artifact_upload_concurrency: int = Field(
+        default=4, alias="ARTIFACT_UPLOAD_CONCURRENCY"
+    )
+    # Bucket lifecycle rule that drops parts of uploads never completed
+    artifact_multipart_expiry_days: int = Field(
+        default=1, alias="ARTIFACT_MULTIPART_EXPIRY_DAYS"
+    )
+
+    # Artifact retention (app.artifact_gc); unset keeps artifacts forever.
+    # Rules are `prefix=days` pairs, e.g. "screenshots/=14,derived/=30"
+    artifact_retention_rules: str | None = Field(
+        default=None, alias="ARTIFACT_RETENTION_RULES"
+    )
+    artifact_task_retention_days: int | None = Field(
+        default=None, alias="ARTIFACT_TASK_RETENTION_DAYS"
+    )
+    artifact_unreferenced_grace_hours: int = Field(
+        default=24, alias="ARTIFACT_UNREFERENCED_GRACE_HOURS"
+    )
+    artifact_gc_interval_seconds: float = Field(
+        default=24 * 3600.0, alias="ARTIFACT_GC_INTERVAL_SECONDS"
+    )
+
+    # WebP thumbnails/previews of image artifacts (app.thumbnails)
+    thumbnail_workers: int = Field(default=2, alias="THUMBNAIL_WORKERS")
+    thumbnail_quality: int = Field(default=80, alias="THUMBNAIL_QUALITY")
+    thumbnail_max_source_bytes: int = Field(
+        default=32 * 1024 * 1024, alias="THUMBNAIL_MAX_SOURCE_BYTES"
+    )
+    # Browser cache lifetime of derivatives of overwritable keys
+    thumbnail_cache_seconds: int = Field(
+        default=3600, alias="THUMBNAIL_CACHE_SECONDS"
+    )
+    # Longest a chat reply waits for a screenshot preview before linking
+    # the original
+    thumbnail_wait_seconds: float = Field(
+        default=5.0, alias="THUMBNAIL_WAIT_SECONDS"
+    )
+
+    # Monthly partitions of tasks/action_logs (app.partitions); retention
+    # drops whole partitions, unset keeps history forever
+    partition_months_ahead: int = Field(default=3, alias="PARTITION_MONTHS_AHEAD")
+    tasks_retention_months: int | None = Field(
+        default=None, alias="TASKS_RETENTION_MONTHS"
+    )
+    action_logs_retention_months: int | None = Field(
+        default=None, alias="ACTION_LOGS_RETENTION_MONTHS"
+    )
+    partition_archive_bucket: str | None = Field(
+        default=None, alias="PARTITION_ARCHIVE_BUCKET"
+    )
+    partition_archive_dir: str | None = Field(
+        default=None, alias="PARTITION_ARCHIVE_DIR"
+    )
+
+    # Admin/debug system statistics snapshot refresh interval
+    system_stats_interval_seconds: float = Field(
+        default=30.0, alias="SYSTEM_STATS_INTERVAL_SECONDS"
+    )
+
     # CORS / Metrics
     allowed_origins_raw: str = Field(default="*", alias="ALLOWED_ORIGINS")
     metrics_token: str | None = Field(default=None, alias="METRICS_TOKEN")
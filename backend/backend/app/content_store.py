@@ -0,0 +1,147 @@
+"""
+Content-addressed artifacts.
+
+An artifact uploaded with its SHA-256 is stored once under
+`cas/sha256/<ab>/<cd>/<digest>`, whoever uploads it and however often.
+`artifacts` has one row per digest; `artifact_refs` records which tasks
+reference it and triggers keep `artifacts.ref_count` (migration 7 in
+app.migrations), so a digest with no references left can be collected.
+
+A presign only skips the upload for content the caller's own tasks already
+reference (`referenced_by`), so knowing a digest neither reveals whether
+somebody else stored it nor grants a reference to it. Presigned PUTs carry
+`x-amz-checksum-sha256` (a signed `sha256` for the local backend), so a body
+that does not match the digest in the key is rejected. A task references a
+presigned upload only once the client commits it with the ETag the PUT
+returned (`commit_upload`), so references always point at stored objects.
+
+The upserts and the ref_count triggers are Postgres only; content addressing
+is refused on other databases (`require_content_store`).
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import re
+from typing import IO, Any
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import artifact_dedup_bytes_total, artifact_dedup_total
+from app.models import Artifact, ArtifactRef, Task, utcnow
+
+
+CAS_PREFIX = "cas/sha256"
+CHECKSUM_HEADER = "x-amz-checksum-sha256"
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_sha256(value: str) -> bool:
+    return bool(_SHA256_HEX.match(value))
+
+
+def cas_key(sha256: str) -> str:
+    return f"{CAS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def checksum_header(sha256: str) -> str:
+    """`x-amz-checksum-sha256` value (base64 of the raw digest)"""
+    return base64.b64encode(bytes.fromhex(sha256)).decode()
+
+
+def file_sha256(fileobj: IO[bytes]) -> str:
+    """Digest of a seekable file, left rewound; blocking, run in a thread"""
+    fileobj.seek(0)
+    digest = hashlib.file_digest(fileobj, "sha256").hexdigest()
+    fileobj.seek(0)
+    return digest
+
+
+def require_content_store(db: AsyncSession) -> None:
+    """501 unless the database is Postgres"""
+    if db.get_bind().dialect.name != "postgresql":
+        raise HTTPException(
+            status_code=501, detail="Content-addressed artifacts require PostgreSQL")
+
+
+async def record_artifact(
+    db: AsyncSession,
+    sha256: str,
+    size: int,
+    content_type: str | None = None,
+    stored: bool = False,
+) -> None:
+    """Insert the artifact row if missing; mark it stored when `stored`"""
+    stmt = insert(Artifact).values(
+        sha256=sha256, s3_key=cas_key(sha256), size=size,
+        content_type=content_type, created_at=utcnow(),
+        stored_at=utcnow() if stored else None,
+    )
+    if stored:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Artifact.sha256],
+            set_={"stored_at": func.coalesce(Artifact.stored_at, stmt.excluded.stored_at)},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Artifact.sha256])
+    await db.execute(stmt)
+
+
+async def add_ref(db: AsyncSession, sha256: str, task_id: str) -> None:
+    """Reference the artifact from a task (once per task)"""
+    await db.execute(
+        insert(ArtifactRef)
+        .values(task_id=task_id, sha256=sha256, created_at=utcnow())
+        .on_conflict_do_nothing()
+    )
+
+
+async def referenced_by(db: AsyncSession, sha256: str, user_id: Any) -> bool:
+    """Whether any task of `user_id` references the artifact"""
+    return await db.scalar(
+        select(
+            select(ArtifactRef.task_id)
+            .join(Task, Task.id == ArtifactRef.task_id)
+            .where(ArtifactRef.sha256 == sha256, Task.user_id == user_id)
+            .exists()
+        )
+    )
+
+
+async def commit_upload(db: AsyncSession, storage: Any, sha256: str, etag: str) -> bool:
+    """Mark a presigned upload stored if the object is there with `etag`
+    (the MD5 ETag returned by the PUT, which only the uploader knows)"""
+    stored_etag = await storage.etag(cas_key(sha256))
+    if stored_etag is None or stored_etag.strip('"') != etag.strip('"'):
+        return False
+    result = await db.execute(
+        update(Artifact)
+        .where(Artifact.sha256 == sha256)
+        .values(stored_at=func.coalesce(Artifact.stored_at, utcnow()))
+    )
+    return result.rowcount > 0
+
+
+async def is_stored(db: AsyncSession, storage: Any, sha256: str) -> bool:
+    """Whether the object for `sha256` is already in `storage` (app.storage);
+    record the answer with `record_artifact(..., stored=...)`.
+
+    Without an `artifacts` row the object is not trusted even if it exists:
+    retention (app.artifact_gc) deletes the row before the object."""
+    row = (await db.execute(
+        select(Artifact.stored_at).where(Artifact.sha256 == sha256))).first()
+    if row is None:
+        return False
+    if row.stored_at is not None:
+        return True
+    return await storage.exists(cas_key(sha256))
+
+
+def count_dedup(size: int) -> None:
+    artifact_dedup_total.inc()
+    artifact_dedup_bytes_total.inc(size)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import json
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List
 from dataclasses import dataclass
@@ -14,6 +15,25 @@ from app.clients import get_redis
 from app.routers.notifications import notification_manager
 
 
+# One sample per check interval (60s) for a week; older entries are trimmed by XADD
+HEALTH_HISTORY_MAXLEN = 7 * 24 * 60
+HEALTH_HISTORY_TTL_SECONDS = 8 * 24 * 3600
+HEALTH_STATUS_CODES = {"healthy": 0, "warning": 1, "critical": 2, "offline": 3}
+HEALTH_STATUS_NAMES = {code: name for name, code in HEALTH_STATUS_CODES.items()}
+# Stream field name -> metric name exposed by the history API
+HEALTH_HISTORY_FIELDS = {
+    "cpu": "cpu_usage",
+    "mem": "memory_usage",
+    "disk": "disk_usage",
+    "tasks": "recent_tasks",
+    "fail": "failure_rate",
+}
+
+
+def health_history_key(device_id: str) -> str:
+    return f"device_health_history:{device_id}"
+
+
 @dataclass
 class DeviceHealthStatus:
     device_id: str
@@ -90,7 +110,6 @@ class DeviceHealthMonitor:
                 if presence:
                     # Parse capabilities and check for issues
                     if 'capabilities' in presence:
-                        import json
                         try:
                             caps = json.loads(presence['capabilities'])
                             metrics['capabilities'] = caps
@@ -164,9 +183,10 @@ class DeviceHealthMonitor:
                 "status": health.status,
                 "last_check": datetime.now(timezone.utc).isoformat(),
                 "issues": ",".join(health.issues),
-                "metrics": str(health.metrics)
+                "metrics": json.dumps(health.metrics, default=str)
             })
             await self.redis.expire(health_key, 300)  # 5 min TTL
+            await self._append_health_history(health)
 
         # Alert on status changes
         if health.status in ("warning", "critical"):
@@ -182,6 +202,92 @@ class DeviceHealthMonitor:
                 f"issues: {health.issues}"
             )
 
+    async def _append_health_history(self, health: DeviceHealthStatus):
+        """Append a fixed-width sample to the device's capped history stream"""
+        caps = health.metrics.get("capabilities") or {}
+        sample = {
+            "cpu": caps.get("cpu_usage"),
+            "mem": caps.get("memory_usage"),
+            "disk": caps.get("disk_usage"),
+            "tasks": health.metrics.get("recent_tasks", 0),
+            "fail": health.metrics.get("failure_rate", 0.0),
+        }
+        fields: Dict[str, Any] = {"s": HEALTH_STATUS_CODES.get(health.status, 3)}
+        for name, value in sample.items():
+            try:
+                fields[name] = round(float(value), 4)
+            except (TypeError, ValueError):
+                # Missing metrics are stored as empty strings to keep records uniform
+                fields[name] = ""
+        key = health_history_key(health.device_id)
+        try:
+            await self.redis.xadd(
+                key, fields, maxlen=HEALTH_HISTORY_MAXLEN, approximate=True)
+            await self.redis.expire(key, HEALTH_HISTORY_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(
+                f"Failed to append health history for device {health.device_id}: {e}")
+
+
+def downsample_health_history(
+    samples: List[tuple[str, Dict[str, str]]],
+    since: datetime,
+    bucket_seconds: int,
+) -> List[Dict[str, Any]]:
+    """Reduce raw stream entries to per-bucket min/max/avg aggregates.
+
+    `samples` are (stream_id, fields) pairs as returned by XRANGE; the stream id
+    carries the sample timestamp in milliseconds. Buckets are aligned to
+    multiples of `bucket_seconds` since the epoch, so repeated polls return the
+    same buckets; the first one may start before `since`.
+    """
+    since_ms = int(since.timestamp() * 1000)
+    bucket_ms = bucket_seconds * 1000
+    buckets: Dict[int, Dict[str, Any]] = {}
+
+    for entry_id, fields in samples:
+        ts_ms = int(str(entry_id).split("-", 1)[0])
+        if ts_ms < since_ms:
+            continue
+        index = ts_ms // bucket_ms
+        bucket = buckets.setdefault(index, {"samples": 0, "worst": 0, "values": {}})
+        bucket["samples"] += 1
+        try:
+            bucket["worst"] = max(bucket["worst"], int(fields.get("s", 3)))
+        except (TypeError, ValueError):
+            pass
+        for field in HEALTH_HISTORY_FIELDS:
+            raw = fields.get(field)
+            if raw in (None, ""):
+                continue
+            try:
+                bucket["values"].setdefault(field, []).append(float(raw))
+            except (TypeError, ValueError):
+                continue
+
+    result = []
+    for index in sorted(buckets):
+        bucket = buckets[index]
+        start = datetime.fromtimestamp(index * bucket_seconds, tz=since.tzinfo or timezone.utc)
+        metrics = {}
+        for field, metric in HEALTH_HISTORY_FIELDS.items():
+            values = bucket["values"].get(field)
+            if not values:
+                metrics[metric] = None
+                continue
+            metrics[metric] = {
+                "min": round(min(values), 4),
+                "max": round(max(values), 4),
+                "avg": round(sum(values) / len(values), 4),
+            }
+        result.append({
+            "bucket_start": start.isoformat(),
+            "samples": bucket["samples"],
+            "worst_status": HEALTH_STATUS_NAMES.get(bucket["worst"], "offline"),
+            "metrics": metrics,
+        })
+    return result
+
 
 # Global health monitor instance
 health_monitor = DeviceHealthMonitor()
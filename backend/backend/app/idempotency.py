@@ -0,0 +1,124 @@
+"""
+Redis fast path for Idempotency-Key claims.
+
+Postgres `idempotency_keys` rows stay the durable record; Redis sits in
+front of them. The first request for a (user, endpoint, key, body) scope
+takes a `SET NX` marker and, once it has created the resource, replaces the
+marker with the serialized response. Duplicates read that response in one
+Redis round-trip. A duplicate that arrives while the first request is still
+running waits on the marker instead of polling Postgres, and falls back to
+the Postgres claim logic if the owner does not finish in time or Redis is
+unavailable.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from app.clients import get_redis
+from app.config import settings
+from app.metrics import idempotency_requests_total
+
+
+_CLAIM_KEY = "idem:{endpoint}:{user_id}:{digest}"
+_PENDING = "pending"
+_POLL_SECONDS = 0.05
+
+
+def _claim_key(endpoint: str, user_id: Any, idem_key: str, body_hash: str) -> str:
+    digest = hashlib.sha1(f"{idem_key}\0{body_hash}".encode()).hexdigest()
+    return _CLAIM_KEY.format(endpoint=endpoint, user_id=user_id, digest=digest)
+
+
+class IdempotencyClaim:
+    """Outcome of `claim_idempotency_key`.
+
+    `response` is the stored response of an earlier identical request, if
+    any. Otherwise the caller proceeds with the durable Postgres path and
+    reports the outcome with `complete` or `release`.
+    """
+
+    def __init__(self, redis: Any, key: str, endpoint: str, owned: bool,
+                 response: Any = None):
+        self.redis = redis
+        self.key = key
+        self.endpoint = endpoint
+        self.owned = owned
+        self.response = response
+
+    async def complete(self, response: Any) -> None:
+        """Store `response` for duplicates of this request"""
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                self.key, json.dumps(jsonable_encoder(response)),
+                ex=settings.idempotency_response_ttl_seconds,
+            )
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Failed to store idempotent response for {self.endpoint}: {e}")
+
+    async def release(self) -> None:
+        """Drop our pending marker after a failed request so retries can run"""
+        if self.redis is None or not self.owned:
+            return
+        try:
+            # Only delete our own marker, never a stored response
+            if await self.redis.get(self.key) == _PENDING:
+                await self.redis.delete(self.key)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Failed to release idempotency claim for {self.endpoint}: {e}")
+
+
+async def claim_idempotency_key(
+    endpoint: str,
+    user_id: Any,
+    idem_key: str,
+    body_hash: str,
+    wait_seconds: float | None = None,
+) -> IdempotencyClaim:
+    """Claim the idempotency scope in Redis or fetch its stored response.
+
+    A duplicate of a request that is still running waits up to
+    `wait_seconds` (IDEMPOTENCY_WAIT_SECONDS by default) for its response.
+    """
+    redis = get_redis()
+    key = _claim_key(endpoint, user_id, idem_key, body_hash)
+    if redis is None or not settings.idempotency_redis_enabled:
+        idempotency_requests_total.labels(endpoint, "bypass").inc()
+        return IdempotencyClaim(None, key, endpoint, owned=False)
+
+    try:
+        if await redis.set(key, _PENDING, nx=True,
+                           ex=settings.idempotency_pending_ttl_seconds):
+            idempotency_requests_total.labels(endpoint, "claimed").inc()
+            return IdempotencyClaim(redis, key, endpoint, owned=True)
+
+        # Duplicate: wait for the first request's response
+        loop = asyncio.get_running_loop()
+        if wait_seconds is None:
+            wait_seconds = settings.idempotency_wait_seconds
+        deadline = loop.time() + wait_seconds
+        while True:
+            stored = await redis.get(key)
+            if stored is not None and stored != _PENDING:
+                idempotency_requests_total.labels(endpoint, "replayed").inc()
+                return IdempotencyClaim(redis, key, endpoint, owned=False,
+                                        response=json.loads(stored))
+            if stored is None or loop.time() >= deadline:
+                break
+            await asyncio.sleep(_POLL_SECONDS)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Idempotency fast path unavailable for {endpoint}: {e}")
+        idempotency_requests_total.labels(endpoint, "bypass").inc()
+        return IdempotencyClaim(None, key, endpoint, owned=False)
+
+    # Owner failed or is slow; Postgres decides
+    idempotency_requests_total.labels(endpoint, "fallback").inc()
+    return IdempotencyClaim(redis, key, endpoint, owned=False)
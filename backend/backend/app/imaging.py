@@ -0,0 +1,24 @@
+"""
+Image resizing for app.thumbnails, run in worker processes.
+
+Imports nothing from the app so spawned workers start quickly and do not
+need the app's settings.
+"""
+
+from __future__ import annotations
+
+import io
+
+
+def render(data: bytes, max_edge: int, quality: int) -> bytes:
+    """Downscale an image so its longest edge is at most `max_edge`; WebP"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (max_edge, max_edge))  # JPEG: decode at reduced scale
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=quality, method=4)
+        return out.getvalue()
@@ -17,7 +17,7 @@ from loguru import logger
 import time
 
 from app.config import settings
-from app.db import init_models
+from app.db import engine, init_models
 from app.routers import auth, devices
 from app.routers import ws as ws_router
 from app.routers import tasks as tasks_router
@@ -25,8 +25,15 @@ from app.routers import artifacts as artifacts_router
 from app.routing import start_delivery_subscriber
 from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.audit import init_audit
-from app.clients import close_kafka_producer, get_s3_client
+from app.clients import (
+    close_kafka_producer,
+    ensure_bucket,
+    get_s3_client,
+    run_s3_operation,
+    shutdown_s3_executor,
+)
 import asyncio
+from functools import partial
 
 # Import blocked IPs from WebSocket module
 from app.routers.ws import _blocked_ips, _rate_limit_lock
@@ -82,6 +89,16 @@ app.add_middleware(
 
 async def init_minio_bucket() -> None:
     """Initialize MinIO bucket for artifacts if configured"""
+    if settings.artifact_storage == "local":
+        from app.storage import get_storage
+
+        try:
+            await get_storage().ensure()
+            logger.info(f"Using local artifact storage at {settings.artifact_local_dir}")
+        except Exception as e:
+            logger.error(f"Failed to prepare local artifact storage: {e}")
+        return
+
     if not settings.artifacts_bucket:
         logger.info(
             "No artifacts bucket configured, skipping MinIO initialization")
@@ -94,19 +111,26 @@ async def init_minio_bucket() -> None:
         return
 
     try:
-        # Check if bucket exists
-        s3_client.head_bucket(Bucket=settings.artifacts_bucket)
-        logger.info(
-            f"MinIO bucket '{settings.artifacts_bucket}' already exists")
-    except Exception:
-        # Bucket doesn't exist, create it
-        try:
-            s3_client.create_bucket(Bucket=settings.artifacts_bucket)
+        # Checked once per process; uploads and presigns reuse the result
+        if await ensure_bucket(settings.artifacts_bucket):
             logger.info(f"Created MinIO bucket '{settings.artifacts_bucket}'")
-        except Exception as e:
-            logger.error(
-                f"Failed to create MinIO bucket '{settings.artifacts_bucket}': {e}")
-            # Don't raise - let the app start even if bucket creation fails
+        else:
+            logger.info(
+                f"MinIO bucket '{settings.artifacts_bucket}' already exists")
+    except Exception as e:
+        logger.error(
+            f"Failed to create MinIO bucket '{settings.artifacts_bucket}': {e}")
+        # Don't raise - let the app start even if bucket creation fails
+        return
+
+    try:
+        from app.uploads import ensure_multipart_cleanup
+
+        await run_s3_operation(partial(
+            ensure_multipart_cleanup, s3_client, settings.artifacts_bucket))
+    except Exception as e:
+        logger.warning(
+            f"Could not set multipart cleanup rule on '{settings.artifacts_bucket}': {e}")
 
 
 @app.on_event("startup")
@@ -125,6 +149,11 @@ async def on_startup() -> None:
         app.state.delivery_task = task
         logger.info("Started delivery subscriber background task")
 
+        # Relay task status changes to long-poll/SSE watchers on this node
+        from app.task_watch import task_status_hub
+        app.state.task_status_task = asyncio.create_task(task_status_hub.start())
+        logger.info("Started task status relay")
+
         # Start device health monitoring
         from app.device_health import health_monitor
         health_task = asyncio.create_task(health_monitor.start_monitoring())
@@ -137,6 +166,30 @@ async def on_startup() -> None:
         app.state.scheduler_task = scheduler_task
         logger.info("Started task scheduler")
 
+        # Start system statistics snapshotter (admin/debug dashboards)
+        from app.system_stats import system_stats
+        app.state.system_stats_task = asyncio.create_task(system_stats.start())
+        logger.info("Started system statistics snapshotter")
+
+        # Start partition maintenance (monthly tasks/action_logs partitions)
+        if engine.dialect.name == "postgresql":
+            from app.partitions import partition_maintainer
+            app.state.partition_task = asyncio.create_task(partition_maintainer.start())
+            logger.info("Started partition maintainer")
+
+        # Start artifact retention (no-op until a retention setting is configured)
+        if engine.dialect.name == "postgresql":
+            from app.artifact_gc import artifact_collector
+            app.state.artifact_gc_task = asyncio.create_task(artifact_collector.start())
+            logger.info("Started artifact collector")
+
+        # Start task event writer (ClickHouse analytics)
+        from app.task_events import task_event_writer
+        if task_event_writer.enabled:
+            app.state.task_events_task = asyncio.create_task(
+                task_event_writer.start())
+            logger.info("Started task event writer")
+
     except Exception as e:
         logger.warning(f"Failed to start background tasks: {e}")
 
@@ -151,11 +204,29 @@ async def on_shutdown() -> None:
             await app.state.delivery_task
         except asyncio.CancelledError:
             pass
+    # Stop the task status relay
+    try:
+        from app.task_watch import task_status_hub
+        task_status_hub.stop()
+        if hasattr(app.state, "task_status_task"):
+            app.state.task_status_task.cancel()
+            try:
+                await app.state.task_status_task
+            except asyncio.CancelledError:
+                pass
+    except Exception:
+        pass
     # Close kafka producer if created
     try:
         await close_kafka_producer()
     except Exception:
         pass
+    shutdown_s3_executor()
+    try:
+        from app.thumbnails import shutdown_thumbnail_pool
+        shutdown_thumbnail_pool()
+    except Exception:
+        pass
 
     # Stop device health monitoring
     try:
@@ -177,6 +248,58 @@ async def on_shutdown() -> None:
     except Exception:
         pass
 
+    # Stop system statistics snapshotter
+    try:
+        from app.system_stats import system_stats
+        system_stats.stop()
+        if hasattr(app.state, "system_stats_task"):
+            app.state.system_stats_task.cancel()
+            try:
+                await app.state.system_stats_task
+            except asyncio.CancelledError:
+                pass
+    except Exception:
+        pass
+
+    # Stop partition maintenance
+    try:
+        from app.partitions import partition_maintainer
+        partition_maintainer.stop()
+        if hasattr(app.state, "partition_task"):
+            app.state.partition_task.cancel()
+            try:
+                await app.state.partition_task
+            except asyncio.CancelledError:
+                pass
+    except Exception:
+        pass
+
+    # Stop artifact retention
+    try:
+        from app.artifact_gc import artifact_collector
+        artifact_collector.stop()
+        if hasattr(app.state, "artifact_gc_task"):
+            app.state.artifact_gc_task.cancel()
+            try:
+                await app.state.artifact_gc_task
+            except asyncio.CancelledError:
+                pass
+    except Exception:
+        pass
+
+    # Flush buffered task events
+    try:
+        from app.task_events import task_event_writer
+        if hasattr(app.state, "task_events_task"):
+            await task_event_writer.stop()
+            app.state.task_events_task.cancel()
+            try:
+                await app.state.task_events_task
+            except asyncio.CancelledError:
+                pass
+    except Exception:
+        pass
+
 
 app.include_router(auth.router, prefix="/v1/auth", tags=["auth"])
 app.include_router(devices.router, prefix="/v1/devices", tags=["devices"])
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
 
 # WebSocket metrics
@@ -20,5 +20,67 @@ tasks_completed_total = Counter("tasks_completed_total", "Total tasks completed
 tasks_failed_total = Counter("tasks_failed_total", "Total tasks that failed")
 
 
+# Task lifecycle stage latencies (see app.task_latency)
+_STAGE_LABELS = ["action_type", "node"]
+task_queue_wait_seconds = Histogram(
+    "task_queue_wait_seconds",
+    "Time from a task becoming deliverable to its envelope being issued",
+    _STAGE_LABELS,
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600),
+)
+task_delivery_latency_seconds = Histogram(
+    "task_delivery_latency_seconds",
+    "Time from envelope issue to the WebSocket send to the device",
+    _STAGE_LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+task_execution_seconds = Histogram(
+    "task_execution_seconds",
+    "Time from the WebSocket send to the device's task.result",
+    _STAGE_LABELS,
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+task_result_persist_seconds = Histogram(
+    "task_result_persist_seconds",
+    "Time to persist a task.result (action logs and task status)",
+    _STAGE_LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+# Response cache metrics (hit rate = hit / (hit + miss + coalesced))
+response_cache_requests_total = Counter(
+    "response_cache_requests_total",
+    "Cached endpoint lookups by result (hit, miss, coalesced, bypass)",
+    ["endpoint", "result"],
+)
+
+
+# Idempotency-Key fast path (see app.idempotency)
+idempotency_requests_total = Counter(
+    "idempotency_requests_total",
+    "Idempotency claims by result (claimed, replayed, fallback, bypass)",
+    ["endpoint", "result"],
+)
+
+# Task status watchers (long-poll and SSE, see app.task_watch)
+task_status_watchers = Gauge(
+    "task_status_watchers", "Open task status long-poll and SSE subscriptions"
+)
+
+# Content-addressed artifacts (see app.content_store)
+artifact_dedup_total = Counter(
+    "artifact_dedup_total", "Artifact uploads skipped because the content was already stored"
+)
+artifact_dedup_bytes_total = Counter(
+    "artifact_dedup_bytes_total", "Bytes not stored again thanks to content addressing"
+)
+
+artifact_gc_deleted_total = Counter(
+    "artifact_gc_deleted_total",
+    "Artifacts deleted by retention (see app.artifact_gc)",
+    ["reason"],
+)
+
 # DLQ metrics
 dlq_messages_total = Counter("dlq_messages_total", "Total messages routed to the DLQ")
@@ -0,0 +1,543 @@
+"""
+Versioned schema migrations (Postgres).
+
+Applied versions are recorded in `schema_migrations`. On startup
+`run_migrations` reads the current version and returns at once when the
+schema is at head, so a normal restart costs two small queries. Otherwise it
+takes an advisory lock (concurrent workers wait instead of racing) and
+applies the pending migrations in order, each in its own transaction unless
+it is marked non-transactional (CREATE INDEX CONCURRENTLY).
+
+A fresh database gets every current table and model-declared index from
+`create_all` in the baseline and then runs the later migrations as well, so
+migrations must be idempotent (IF NOT EXISTS, OR REPLACE, ...). Add new
+migrations at the end with the next version number; never edit applied ones.
+
+Usage:
+    python -m app.migrations [--status]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.config import settings
+from app.db import Base
+from app.partitions import (
+    PARTITIONED_TABLES,
+    TASK_DEPENDENTS_DDL,
+    add_months,
+    bound_literal,
+    ensure_partitions,
+    month_start,
+)
+from app.rollups import install_rollup_triggers, populate_rollups_if_empty
+from app.search import CHAT_SEARCH_CONFIG
+
+
+# Arbitrary application-wide key for pg_advisory_lock
+_LOCK_KEY = 724_310_038
+
+_SCHEMA_MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(128) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[AsyncConnection], Awaitable[None]]
+    transactional: bool = True
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    """Register the decorated coroutine as migration `version`"""
+    def register(fn: Callable[[AsyncConnection], Awaitable[None]]):
+        MIGRATIONS.append(Migration(version, name, fn, transactional))
+        return fn
+    return register
+
+
+async def create_index_concurrently(conn: AsyncConnection, name: str, definition: str) -> None:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS, replacing an invalid leftover
+    from an interrupted earlier attempt. Partitioned tables do not support
+    CONCURRENTLY; their index is created normally."""
+    table = definition.split("(", 1)[0].split()[0]
+    if await conn.scalar(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"
+    ), {"table": table}):
+        await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+        return
+    invalid = await conn.scalar(text(
+        "SELECT NOT i.indisvalid FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name})
+    if invalid:
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+
+@migration(1, "baseline")
+async def _baseline(conn: AsyncConnection) -> None:
+    # Everything init_models used to run on each startup
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(
+        text(
+            "ALTER TABLE devices ADD COLUMN IF NOT EXISTS device_token_kid VARCHAR(32)"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE devices ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP NULL"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE devices ADD COLUMN IF NOT EXISTS connection_status VARCHAR(16) DEFAULT 'offline'"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_email_verified BOOLEAN DEFAULT FALSE"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS display_name VARCHAR(255)"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS preferences JSONB DEFAULT '{}'"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()"
+        )
+    )
+    # Fix timezone issues in existing tables
+    await conn.execute(
+        text(
+            "ALTER TABLE tasks ALTER COLUMN created_at TYPE TIMESTAMP WITH TIME ZONE"
+        )
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE tasks ALTER COLUMN updated_at TYPE TIMESTAMP WITH TIME ZONE"
+        )
+    )
+    # Add new tables for advanced features
+    await conn.execute(
+        text("""
+            CREATE TABLE IF NOT EXISTS task_templates (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                name VARCHAR(255) NOT NULL,
+                description TEXT,
+                category VARCHAR(100) DEFAULT 'general',
+                actions JSONB NOT NULL,
+                variables JSONB DEFAULT '{}',
+                is_public BOOLEAN DEFAULT FALSE,
+                usage_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+    )
+    await conn.execute(
+        text("""
+            CREATE TABLE IF NOT EXISTS scheduled_tasks (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                device_id UUID NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+                template_id UUID REFERENCES task_templates(id) ON DELETE SET NULL,
+                name VARCHAR(255) NOT NULL,
+                cron_expression VARCHAR(100) NOT NULL,
+                actions JSONB NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                last_run TIMESTAMP,
+                next_run TIMESTAMP,
+                run_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE idempotency_keys ALTER COLUMN resource_id DROP NOT NULL")
+    )
+    # Action logs: JSONB payloads and an index for per-user
+    # action aggregation (join on task_id, window on created_at)
+    await conn.execute(
+        text("""
+            DO $$
+            BEGIN
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'action_logs' AND column_name = 'action') = 'json' THEN
+                    ALTER TABLE action_logs
+                        ALTER COLUMN action TYPE JSONB USING action::jsonb,
+                        ALTER COLUMN result TYPE JSONB USING result::jsonb;
+                END IF;
+            END $$
+        """)
+    )
+    await conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_action_logs_task_created_type "
+            "ON action_logs (task_id, created_at, (action->>'type'))"
+        )
+    )
+    # Hourly analytics rollups maintained by triggers
+    await install_rollup_triggers(conn)
+    await populate_rollups_if_empty(conn)
+
+
+@migration(2, "keyset_pagination_indexes", transactional=False)
+async def _keyset_pagination_indexes(conn: AsyncConnection) -> None:
+    # Orderings used by app.pagination
+    for name, definition in (
+        ("ix_users_created_id", "users (created_at, id)"),
+        ("ix_devices_created_id", "devices (created_at, id)"),
+        ("ix_tasks_user_created_id", "tasks (user_id, created_at, id)"),
+        ("ix_tasks_created_id", "tasks (created_at, id)"),
+        ("ix_action_logs_created_id", "action_logs (created_at, id)"),
+        ("ix_chat_sessions_user_updated_id", "chat_sessions (user_id, updated_at, id)"),
+        ("ix_chat_messages_session_created_id", "chat_messages (session_id, created_at, id)"),
+    ):
+        await create_index_concurrently(conn, name, definition)
+
+
+@migration(3, "hot_path_indexes", transactional=False)
+async def _hot_path_indexes(conn: AsyncConnection) -> None:
+    # tasks (user_id, created_at) and chat_messages (session_id, created_at)
+    # are served by the keyset pagination indexes of migration 2
+    for name, definition in (
+        # Pending replay on device connect
+        ("ix_tasks_device_pending",
+         "tasks (device_id, created_at) WHERE status IN ('queued', 'assigned')"),
+        # Approval queue
+        ("ix_tasks_user_awaiting",
+         "tasks (user_id, created_at) WHERE status = 'awaiting_confirmation'"),
+        # Device health: recent tasks per device
+        ("ix_tasks_device_created", "tasks (device_id, created_at)"),
+        ("ix_action_logs_device_created", "action_logs (device_id, created_at)"),
+        # Chat screenshot replies look up the message that created a task
+        ("ix_chat_messages_task_id", "chat_messages (task_id) WHERE task_id IS NOT NULL"),
+    ):
+        await create_index_concurrently(conn, name, definition)
+
+
+@migration(4, "partition_tasks_and_action_logs")
+async def _partition_tasks_and_action_logs(conn: AsyncConnection) -> None:
+    # Range-partition both tables by month on created_at (see app.partitions).
+    # Existing rows are not copied: the old table becomes one legacy partition
+    # covering everything before the first monthly partition.
+    # Foreign keys cannot reference tasks(id) once the primary key includes
+    # created_at, so action_logs/chat_messages keep task_id without one
+    for (constraint, table) in (await conn.execute(text("""
+        SELECT conname, conrelid::regclass::text FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = to_regclass('tasks')
+    """))).all():
+        await conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"'))
+
+    now = month_start(datetime.now(timezone.utc).replace(tzinfo=None))
+    for table in PARTITIONED_TABLES:
+        if await conn.scalar(text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"
+        ), {"t": table}):
+            continue
+        legacy = f"{table}_legacy"
+        await _drop_row_triggers(conn, table)
+        await conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        # Free the index names for the partitioned parent
+        indexes = (await conn.execute(text("""
+            SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = to_regclass(:t)
+        """), {"t": legacy})).all()
+        for index, _, primary in indexes:
+            renamed = f"{index[:56]}_legacy"
+            if primary:
+                await conn.execute(text(
+                    f'ALTER TABLE {legacy} RENAME CONSTRAINT "{index}" TO "{renamed}"'))
+            else:
+                await conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{renamed}"'))
+        # Serial sequences must outlive the legacy partition
+        sequences = (await conn.execute(text("""
+            SELECT s.relname, a.attname FROM pg_depend d
+            JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+            JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE d.refobjid = to_regclass(:t) AND d.deptype = 'a'
+        """), {"t": legacy})).all()
+        for sequence, _ in sequences:
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+        await conn.execute(text(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (created_at)"))
+        await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL"))
+        await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)"))
+        # The definitions were read before the renames, so they carry the
+        # original index names and only the table has to be swapped
+        for index, definition, primary in indexes:
+            if not primary:
+                await conn.execute(text(
+                    definition.replace(f".{legacy} ", f".{table} ", 1)))
+        for sequence, column in sequences:
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{column}"))
+
+        newest = await conn.scalar(text(f"SELECT max(created_at) FROM {legacy}"))
+        if newest is None:
+            await conn.execute(text(f"DROP TABLE {legacy}"))
+            first_month = now
+        else:
+            if newest.tzinfo is not None:
+                newest = newest.astimezone(timezone.utc).replace(tzinfo=None)
+            first_month = add_months(month_start(max(newest, now)), 1)
+            await conn.execute(text(
+                f"UPDATE {legacy} SET created_at = now() WHERE created_at IS NULL"))
+            await conn.execute(text(
+                f"ALTER TABLE {legacy} ALTER COLUMN created_at SET NOT NULL"))
+            # Partitions need the parent's primary key
+            for index, _, primary in indexes:
+                if primary:
+                    await conn.execute(text(
+                        f'ALTER TABLE {legacy} DROP CONSTRAINT "{index[:56]}_legacy"'))
+            await conn.execute(text(
+                f"ALTER TABLE {legacy} ADD CONSTRAINT {legacy}_pkey PRIMARY KEY (id, created_at)"))
+            await conn.execute(text(
+                f"ALTER TABLE {table} ATTACH PARTITION {legacy} "
+                f"FOR VALUES FROM (MINVALUE) TO ({bound_literal(first_month)})"))
+        await conn.execute(text(
+            f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+        await ensure_partitions(conn, table, settings.partition_months_ahead, now=now)
+    await install_rollup_triggers(conn)
+
+
+async def _drop_row_triggers(conn: AsyncConnection, table: str) -> None:
+    for (trigger,) in (await conn.execute(text(
+        "SELECT tgname FROM pg_trigger WHERE tgrelid = to_regclass(:t) AND NOT tgisinternal"
+    ), {"t": table})).all():
+        await conn.execute(text(f'DROP TRIGGER "{trigger}" ON {table}'))
+
+
+_CHAT_COUNTER_TRIGGERS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION chat_session_counters_insert() RETURNS trigger AS $$
+    BEGIN
+        UPDATE chat_sessions s SET
+            message_count = s.message_count + n.count,
+            last_message_at = GREATEST(s.last_message_at, n.last_at)
+        FROM (SELECT session_id, count(*) AS count, max(created_at) AS last_at
+              FROM inserted GROUP BY session_id) n
+        WHERE s.id = n.session_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION chat_session_counters_delete() RETURNS trigger AS $$
+    BEGIN
+        UPDATE chat_sessions s SET
+            message_count = GREATEST(s.message_count - n.count, 0),
+            last_message_at = (SELECT max(m.created_at) FROM chat_messages m
+                               WHERE m.session_id = s.id)
+        FROM (SELECT session_id, count(*) AS count
+              FROM deleted GROUP BY session_id) n
+        WHERE s.id = n.session_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER chat_messages_counters_insert
+    AFTER INSERT ON chat_messages REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_session_counters_insert()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER chat_messages_counters_delete
+    AFTER DELETE ON chat_messages REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_session_counters_delete()
+    """,
+]
+
+
+@migration(5, "chat_session_counters")
+async def _chat_session_counters(conn: AsyncConnection) -> None:
+    # message_count/last_message_at on chat_sessions, kept by statement-level
+    # triggers so every writer of chat_messages is covered and bulk inserts
+    # update each session once
+    await conn.execute(text("""
+        ALTER TABLE chat_sessions
+            ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP
+    """))
+    for statement in _CHAT_COUNTER_TRIGGERS_DDL:
+        await conn.execute(text(statement))
+    await conn.execute(text("""
+        UPDATE chat_sessions s SET message_count = c.count, last_message_at = c.last_at
+        FROM (SELECT session_id, count(*) AS count, max(created_at) AS last_at
+              FROM chat_messages GROUP BY session_id) c
+        WHERE s.id = c.session_id
+    """))
+
+
+@migration(6, "chat_message_search", transactional=False)
+async def _chat_message_search(conn: AsyncConnection) -> None:
+    # Full-text search over chat messages (GET /v1/chat/search). The column
+    # is Postgres-only and not mapped on ChatMessage; adding it rewrites
+    # chat_messages once, the GIN index is then built without blocking writes
+    await conn.execute(text(f"""
+        ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('{CHAT_SEARCH_CONFIG}', content)) STORED
+    """))
+    await create_index_concurrently(
+        conn, "ix_chat_messages_content_tsv", "chat_messages USING gin (content_tsv)")
+
+
+_ARTIFACT_REF_TRIGGERS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION artifact_ref_counts_insert() RETURNS trigger AS $$
+    BEGIN
+        UPDATE artifacts a SET ref_count = a.ref_count + n.count
+        FROM (SELECT sha256, count(*) AS count FROM inserted GROUP BY sha256) n
+        WHERE a.sha256 = n.sha256;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION artifact_ref_counts_delete() RETURNS trigger AS $$
+    BEGIN
+        UPDATE artifacts a SET ref_count = GREATEST(a.ref_count - n.count, 0)
+        FROM (SELECT sha256, count(*) AS count FROM deleted GROUP BY sha256) n
+        WHERE a.sha256 = n.sha256;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER artifact_refs_counts_insert
+    AFTER INSERT ON artifact_refs REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION artifact_ref_counts_insert()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER artifact_refs_counts_delete
+    AFTER DELETE ON artifact_refs REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT EXECUTE FUNCTION artifact_ref_counts_delete()
+    """,
+]
+
+
+@migration(7, "content_addressed_artifacts")
+async def _content_addressed_artifacts(conn: AsyncConnection) -> None:
+    # artifacts (one row per SHA-256) and artifact_refs (task -> artifact);
+    # ref_count is kept by statement-level triggers like the chat counters
+    await conn.run_sync(Base.metadata.create_all, tables=[
+        models.Artifact.__table__, models.ArtifactRef.__table__])
+    for statement in _ARTIFACT_REF_TRIGGERS_DDL:
+        await conn.execute(text(statement))
+
+
+@migration(8, "rollup_utc_hours_and_deletes")
+async def _rollup_utc_hours_and_deletes(conn: AsyncConnection) -> None:
+    # Hours were truncated in the session time zone; action log deletes are
+    # now retracted. Existing rows only differ on non-UTC servers, where
+    # `python -m app.rollups` rebuilds them.
+    await install_rollup_triggers(conn)
+
+
+@migration(9, "task_dependents_cleanup")
+async def _task_dependents_cleanup(conn: AsyncConnection) -> None:
+    # Stands in for the ON DELETE CASCADE/SET NULL foreign keys to tasks(id)
+    # that migration 4 dropped
+    for statement in TASK_DEPENDENTS_DDL:
+        await conn.execute(text(statement))
+
+
+HEAD = max(m.version for m in MIGRATIONS)
+
+
+async def current_version(conn: AsyncConnection) -> int:
+    if await conn.scalar(text("SELECT to_regclass('schema_migrations')")) is None:
+        return 0
+    return await conn.scalar(text("SELECT max(version) FROM schema_migrations")) or 0
+
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    """Bring the schema to HEAD; returns the number of migrations applied"""
+    async with engine.connect() as conn:
+        if await current_version(conn) >= HEAD:
+            return 0
+
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY})
+        try:
+            await lock_conn.execute(text(_SCHEMA_MIGRATIONS_DDL))
+            # Another worker may have migrated while we waited for the lock
+            version = await current_version(lock_conn)
+            pending = sorted(
+                (m for m in MIGRATIONS if m.version > version), key=lambda m: m.version)
+            for m in pending:
+                logger.info(f"Applying migration {m.version} ({m.name})")
+                if m.transactional:
+                    async with engine.begin() as conn:
+                        await m.apply(conn)
+                        await _record(conn, m)
+                else:
+                    await m.apply(lock_conn)
+                    await _record(lock_conn, m)
+            return len(pending)
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+
+async def _record(conn: AsyncConnection, m: Migration) -> None:
+    await conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {"version": m.version, "name": m.name},
+    )
+
+
+async def _main(status_only: bool) -> None:
+    from app.db import engine
+
+    if not status_only:
+        applied = await run_migrations(engine)
+        print(f"Applied {applied} migration(s)")
+    async with engine.connect() as conn:
+        print(f"Schema version {await current_version(conn)} (head {HEAD})")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true",
+                        help="Only print the current and head versions")
+    args = parser.parse_args()
+    asyncio.run(_main(args.status))
@@ -4,10 +4,11 @@ import uuid
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import JSON, Boolean, DateTime, ForeignKey, String, Text, Integer
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import JSON, BigInteger, Boolean, DateTime, Float, ForeignKey, String, Text, Integer
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint, text
 
 from app.db import Base
 
@@ -18,6 +19,8 @@ def utcnow() -> datetime:
 
 class User(Base):
     __tablename__ = "users"
+    # Keyset pagination order (see app.pagination)
+    __table_args__ = (Index("ix_users_created_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -57,6 +60,8 @@ class RefreshToken(Base):
 
 class Device(Base):
     __tablename__ = "devices"
+    # Keyset pagination order (see app.pagination)
+    __table_args__ = (Index("ix_devices_created_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -112,7 +117,21 @@ class TaskStatus(str, Enum):
 
 
 class Task(Base):
+    """Partitioned by month on created_at (app.partitions); the database
+    primary key is (id, created_at)"""
+
     __tablename__ = "tasks"
+    # Keyset pagination order (see app.pagination) and hot-path lookups;
+    # existing databases get these from app.migrations
+    __table_args__ = (
+        Index("ix_tasks_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_tasks_created_id", "created_at", "id"),
+        Index("ix_tasks_device_created", "device_id", "created_at"),
+        Index("ix_tasks_device_pending", "device_id", "created_at",
+              postgresql_where=text("status IN ('queued', 'assigned')")),
+        Index("ix_tasks_user_awaiting", "user_id", "created_at",
+              postgresql_where=text("status = 'awaiting_confirmation'")),
+    )
 
     # Using string PK to allow human-friendly IDs if desired; default to UUID text
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
@@ -188,24 +207,80 @@ class ScheduledTask(Base):
 
 
 class ActionLog(Base):
+    """Partitioned by month on created_at (app.partitions)"""
+
     __tablename__ = "action_logs"
+    # Keyset pagination order (see app.pagination) and per-device history
+    __table_args__ = (
+        Index("ix_action_logs_created_id", "created_at", "id"),
+        Index("ix_action_logs_device_created", "device_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, autoincrement=True)
-    task_id: Mapped[str] = mapped_column(
-        String(64), ForeignKey("tasks.id", ondelete="CASCADE"), index=True
-    )
+    # No foreign key: tasks is partitioned and its primary key includes created_at
+    task_id: Mapped[str] = mapped_column(String(64), index=True)
     device_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("devices.id", ondelete="CASCADE")
     )
-    action: Mapped[dict] = mapped_column(JSON)
-    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # JSONB on Postgres so analytics can aggregate on action->>'type'
+    action: Mapped[dict] = mapped_column(JSON().with_variant(JSONB(), "postgresql"))
+    result: Mapped[dict | None] = mapped_column(
+        JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     actor: Mapped[str] = mapped_column(String(64))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
 
 
+class TaskHourlyRollup(Base):
+    """Task counts per (user, device, creation hour, status).
+
+    Maintained by database triggers on `tasks` (see app/rollups.py).
+    Durations (updated_at - created_at) are summed for finished tasks only.
+    """
+    __tablename__ = "task_rollups_hourly"
+    __table_args__ = (Index("ix_task_rollups_user_hour", "user_id", "hour"),)
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    device_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    status: Mapped[str] = mapped_column(String(32), primary_key=True)
+    task_count: Mapped[int] = mapped_column(Integer, default=0)
+    duration_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    duration_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ActionHourlyRollup(Base):
+    """Action executions per (user, device, hour, action type, outcome).
+
+    Maintained by a database trigger on `action_logs` (see app/rollups.py).
+    """
+    __tablename__ = "action_rollups_hourly"
+    __table_args__ = (Index("ix_action_rollups_user_hour", "user_id", "hour"),)
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    device_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    action_type: Mapped[str] = mapped_column(String(64), primary_key=True)
+    outcome: Mapped[str] = mapped_column(String(16), primary_key=True)  # success, failure, other
+    action_count: Mapped[int] = mapped_column(Integer, default=0)
+    duration_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    duration_count: Mapped[int] = mapped_column(Integer, default=0)
+    duration_min: Mapped[float | None] = mapped_column(Float, nullable=True)
+    duration_max: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    # Keyset pagination order (see app.pagination)
+    __table_args__ = (Index("ix_chat_sessions_user_updated_id", "user_id", "updated_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -221,11 +296,18 @@ class ChatSession(Base):
         DateTime, default=utcnow, onupdate=utcnow)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     meta_data: Mapped[dict] = mapped_column(JSON, default=dict)
+    # Maintained by triggers on chat_messages (migration 5 in app.migrations),
+    # on other databases by the ChatMessage mapper events below
+    message_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0")
+    last_message_at: Mapped[datetime | None] = mapped_column(
+        DateTime, nullable=True)
 
     user: Mapped[User] = relationship()
     device: Mapped[Device | None] = relationship()
+    # Messages are removed by ON DELETE CASCADE, never loaded for a delete
     messages: Mapped[list["ChatMessage"]] = relationship(
-        back_populates="session", cascade="all, delete-orphan")
+        back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class MessageRole(str, Enum):
@@ -236,6 +318,12 @@ class MessageRole(str, Enum):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    # Keyset pagination order (see app.pagination) and task -> message lookup
+    __table_args__ = (
+        Index("ix_chat_messages_session_created_id", "session_id", "created_at", "id"),
+        Index("ix_chat_messages_task_id", "task_id",
+              postgresql_where=text("task_id IS NOT NULL")),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -248,9 +336,76 @@ class ChatMessage(Base):
     meta_data: Mapped[dict] = mapped_column(JSON, default=dict)
 
     # Связь с задачами, если сообщение привело к созданию задачи
-    task_id: Mapped[str | None] = mapped_column(
-        String(64), ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True
-    )
+    # (без внешнего ключа: таблица tasks партиционирована)
+    task_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     session: Mapped[ChatSession] = relationship(back_populates="messages")
-    task: Mapped[Task | None] = relationship()
+    task: Mapped[Task | None] = relationship(
+        primaryjoin="foreign(ChatMessage.task_id) == Task.id")
+
+
+@event.listens_for(ChatMessage, "after_insert")
+def _count_inserted_message(mapper, connection, message: ChatMessage) -> None:
+    if connection.dialect.name == "postgresql":
+        return  # chat_messages_counters_insert trigger
+    sessions = ChatSession.__table__
+    connection.execute(
+        update(sessions)
+        .where(sessions.c.id == message.session_id)
+        .values(
+            message_count=sessions.c.message_count + 1,
+            last_message_at=case(
+                (sessions.c.last_message_at > message.created_at,
+                 sessions.c.last_message_at),
+                else_=message.created_at,
+            ),
+        )
+    )
+
+
+@event.listens_for(ChatMessage, "after_delete")
+def _count_deleted_message(mapper, connection, message: ChatMessage) -> None:
+    if connection.dialect.name == "postgresql":
+        return  # chat_messages_counters_delete trigger
+    sessions, messages = ChatSession.__table__, ChatMessage.__table__
+    connection.execute(
+        update(sessions)
+        .where(sessions.c.id == message.session_id)
+        .values(
+            message_count=case(
+                (sessions.c.message_count > 0, sessions.c.message_count - 1), else_=0),
+            last_message_at=select(func.max(messages.c.created_at))
+            .where(messages.c.session_id == sessions.c.id)
+            .scalar_subquery(),
+        )
+    )
+
+
+class Artifact(Base):
+    """Artifact stored once under its SHA-256 (app.content_store)"""
+    __tablename__ = "artifacts"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    s3_key: Mapped[str] = mapped_column(String(255))
+    size: Mapped[int] = mapped_column(BigInteger)
+    content_type: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    # Maintained by triggers on artifact_refs (migration 7 in app.migrations)
+    ref_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    # Set once the object is known to be in the bucket; until then a
+    # presign checks the bucket
+    stored_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class ArtifactRef(Base):
+    """One task referencing a content-addressed artifact"""
+    __tablename__ = "artifact_refs"
+    __table_args__ = (Index("ix_artifact_refs_sha256", "sha256"),)
+
+    # No foreign key: tasks is partitioned and its primary key includes created_at
+    task_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    sha256: Mapped[str] = mapped_column(
+        String(64), ForeignKey("artifacts.sha256", ondelete="CASCADE"), primary_key=True
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
@@ -0,0 +1,104 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by a timestamp column with the primary key as tie
+breaker. The opaque cursor encodes the (timestamp, id) of the last row of a
+page and the next page starts strictly after it, so with a matching
+composite index every page costs the same as the first one. List endpoints
+return the cursor for the next page in the `X-Next-Cursor` response header
+(absent on the last page); `offset` keeps working for older clients.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode(values: list[Any]) -> str:
+    raw = json.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list[Any]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+def encode_cursor(sort_value: datetime, row_id: Any) -> str:
+    return _encode([sort_value.isoformat(), str(row_id)])
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        sort_raw, row_id = _decode(cursor)
+        sort_value = datetime.fromisoformat(sort_raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if sort_value.tzinfo is not None:
+        # Timestamps are bound as naive UTC, like the rest of the app writes them
+        sort_value = sort_value.astimezone(timezone.utc).replace(tzinfo=None)
+    return sort_value, row_id
+
+
+def encode_score_cursor(score: float, row_id: Any) -> str:
+    """Cursor for result lists ordered by a computed score (e.g. search rank)"""
+    return _encode([score, str(row_id)])
+
+
+def decode_score_cursor(cursor: str) -> tuple[float, str]:
+    try:
+        score, row_id = _decode(cursor)
+        return float(score), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    query: Select,
+    sort_column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    limit: int,
+    cursor: str | None = None,
+    offset: int = 0,
+    descending: bool = True,
+) -> Select:
+    """Order `query` by (sort_column, id_column) and select one page"""
+    if cursor:
+        sort_value, raw_id = decode_cursor(cursor)
+        try:
+            row_id = id_column.type.python_type(raw_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        key = tuple_(sort_column, id_column)
+        query = query.where(
+            key < (sort_value, row_id) if descending else key > (sort_value, row_id))
+    elif offset:
+        query = query.offset(offset)
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    return query.limit(limit)
+
+
+def set_next_cursor(
+    response: Response,
+    rows: Sequence[Any],
+    limit: int,
+    sort_attr: str = "created_at",
+) -> None:
+    """Advertise the cursor after the last row if the page was full"""
+    if rows and len(rows) >= limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_attr), last.id)
@@ -0,0 +1,311 @@
+"""
+Monthly range partitions for `tasks` and `action_logs`.
+
+Both tables are partitioned by `created_at` (migration 4 in app.migrations
+converts existing tables in place: the old table is attached as a single
+`<table>_legacy` partition holding all history up to the conversion month).
+`partition_maintainer` runs daily and
+
+- creates the partitions for the current month and PARTITION_MONTHS_AHEAD
+  months ahead, so inserts never land in the `<table>_default` catch-all;
+- drops partitions that ended more than TASKS_RETENTION_MONTHS /
+  ACTION_LOGS_RETENTION_MONTHS ago (unset keeps history forever). Dropping a
+  partition is a metadata operation, unlike DELETE it leaves nothing to
+  vacuum. Each partition is first exported as gzipped CSV to
+  PARTITION_ARCHIVE_BUCKET (S3/MinIO) or PARTITION_ARCHIVE_DIR when one is
+  configured; a failed export keeps the partition.
+
+Hourly analytics rollups are not touched by drops, so aggregate history
+outlives the raw rows.
+
+The primary key of `tasks` is (id, created_at), so no foreign key can point
+at tasks(id) any more and there is no ON DELETE CASCADE. Its effect is
+reproduced by hand: a row trigger on `tasks` (TASK_DEPENDENTS_DDL, installed
+by app.migrations) handles deleted tasks, and dropping a `tasks` partition
+does the same for all of its tasks. Action logs and artifact references of a
+task are deleted and chat messages lose their `task_id`, unless another task
+with the same id still exists. Maintenance holds a Postgres advisory lock,
+so only one replica runs it at a time.
+
+Usage:
+    python -m app.partitions [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import os
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import settings
+from app.db import engine
+
+
+# action_logs first: with equal retention its rows are gone by the time the
+# tasks partition is dropped, leaving no orphaned logs to delete one by one
+PARTITIONED_TABLES = ("action_logs", "tasks")
+MAINTENANCE_INTERVAL_SECONDS = 24 * 3600
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+_LOCK_KEY = 724_310_039
+
+# What the dropped ON DELETE foreign keys to tasks(id) did, for the rows
+# matched by {orphaned}: logs and artifact references go with the task,
+# chat messages only lose the link
+_DEPENDENT_CLEANUP = (
+    "DELETE FROM action_logs d WHERE {orphaned}",
+    "DELETE FROM artifact_refs d WHERE {orphaned}",
+    "UPDATE chat_messages d SET task_id = NULL WHERE {orphaned}",
+)
+
+
+def _orphaned(task_ids: str) -> str:
+    # tasks.id is not unique across partitions; keep rows another task owns
+    return (
+        f"d.task_id IN ({task_ids}) "
+        f"AND NOT EXISTS (SELECT 1 FROM tasks t WHERE t.id = d.task_id)"
+    )
+
+
+_ROW_CLEANUP = "".join(
+    f"\n        {statement.format(orphaned=_orphaned('OLD.id'))};"
+    for statement in _DEPENDENT_CLEANUP
+)
+
+TASK_DEPENDENTS_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION tasks_delete_dependents() RETURNS trigger AS $$
+    BEGIN{_ROW_CLEANUP}
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER tasks_delete_dependents
+    AFTER DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION tasks_delete_dependents()
+    """,
+]
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    upper: datetime | None  # None for the default partition
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def bound_literal(value: datetime) -> str:
+    # Explicit UTC offset: bounds must not depend on the session TimeZone
+    return f"'{value:%Y-%m-%d %H:%M:%S}+00'"
+
+
+def retention_months(table: str) -> int | None:
+    return {
+        "tasks": settings.tasks_retention_months,
+        "action_logs": settings.action_logs_retention_months,
+    }[table]
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> list[Partition]:
+    rows = await conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {"table": table})
+    partitions = []
+    for name, bound in rows:
+        match = _UPPER_BOUND.search(bound or "")
+        upper = None
+        if match:
+            upper = datetime.fromisoformat(match.group(1))
+            if upper.tzinfo is not None:
+                upper = upper.astimezone(timezone.utc).replace(tzinfo=None)
+        partitions.append(Partition(name, upper))
+    return sorted(partitions, key=lambda p: (p.upper is None, p.upper or datetime.min))
+
+
+async def ensure_partitions(
+    conn: AsyncConnection, table: str, months_ahead: int, now: datetime | None = None
+) -> list[str]:
+    """Create monthly partitions from the end of the existing ones through
+    `months_ahead` months after the current one; returns the created names"""
+    now = month_start(now or datetime.now(timezone.utc).replace(tzinfo=None))
+    bounded = [p.upper for p in await list_partitions(conn, table) if p.upper]
+    month = max(bounded) if bounded else now
+    created = []
+    while month <= add_months(now, months_ahead):
+        name = partition_name(table, month)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ({bound_literal(month)}) "
+            f"TO ({bound_literal(add_months(month, 1))})"
+        ))
+        created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+async def export_partition(conn: AsyncConnection, table: str, name: str) -> str | None:
+    """Write partition `name` as gzipped CSV to the configured archive;
+    returns its location, or None when no archive is configured"""
+    if not settings.partition_archive_bucket and not settings.partition_archive_dir:
+        return None
+    raw = (await conn.get_raw_connection()).driver_connection
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, f"{name}.csv")
+        await raw.copy_from_table(name, output=csv_path, format="csv", header=True)
+        gz_path = f"{csv_path}.gz"
+        await asyncio.to_thread(_gzip, csv_path, gz_path)
+
+        if settings.partition_archive_bucket:
+            from app.clients import get_s3_client
+
+            s3 = get_s3_client()
+            if s3 is None:
+                raise RuntimeError("PARTITION_ARCHIVE_BUCKET is set but S3 is not configured")
+            key = f"archive/{table}/{name}.csv.gz"
+            await asyncio.to_thread(
+                s3.upload_file, gz_path, settings.partition_archive_bucket, key)
+            return f"s3://{settings.partition_archive_bucket}/{key}"
+
+        os.makedirs(os.path.join(settings.partition_archive_dir, table), exist_ok=True)
+        target = os.path.join(settings.partition_archive_dir, table, f"{name}.csv.gz")
+        await asyncio.to_thread(shutil.move, gz_path, target)
+        return target
+
+
+def _gzip(source: str, target: str) -> None:
+    with open(source, "rb") as src, gzip.open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def expired_partitions(
+    partitions: list[Partition], months: int, now: datetime
+) -> list[Partition]:
+    """Partitions whose range ended more than `months` whole months before
+    the month of `now`; the default partition never expires"""
+    cutoff = add_months(month_start(now), -months)
+    return [p for p in partitions if p.upper is not None and p.upper <= cutoff]
+
+
+async def drop_expired_partitions(
+    table: str, months: int, now: datetime | None = None, dry_run: bool = False
+) -> list[str]:
+    """Archive and drop partitions that ended more than `months` months ago"""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    async with engine.connect() as conn:
+        expired = expired_partitions(await list_partitions(conn, table), months, now)
+    dropped = []
+    for partition in expired:
+        if dry_run:
+            dropped.append(partition.name)
+            continue
+        async with engine.connect() as conn:
+            try:
+                location = await export_partition(conn, table, partition.name)
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Archiving {partition.name} failed, keeping it: {e}")
+                continue
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}"))
+            if table == "tasks":
+                # Detached first, so action log deletes find no task and
+                # leave the rollups alone
+                orphaned = _orphaned(f"SELECT id FROM {partition.name}")
+                for statement in _DEPENDENT_CLEANUP:
+                    await conn.execute(text(statement.format(orphaned=orphaned)))
+            await conn.execute(text(f"DROP TABLE {partition.name}"))
+        logger.info(f"Dropped partition {partition.name}"
+                    + (f" (archived to {location})" if location else ""))
+        dropped.append(partition.name)
+    return dropped
+
+
+async def maintain_partitions(dry_run: bool = False) -> dict[str, dict[str, list[str]]]:
+    """Create and drop partitions of every table; does nothing (empty report)
+    while another process holds the maintenance lock"""
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await lock_conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}):
+            logger.info("Partition maintenance is running in another process, skipping")
+            return {}
+        try:
+            return await _maintain_partitions(dry_run)
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+
+async def _maintain_partitions(dry_run: bool) -> dict[str, dict[str, list[str]]]:
+    report: dict[str, dict[str, list[str]]] = {}
+    for table in PARTITIONED_TABLES:
+        created: list[str] = []
+        if not dry_run:
+            async with engine.begin() as conn:
+                created = await ensure_partitions(
+                    conn, table, settings.partition_months_ahead)
+        months = retention_months(table)
+        dropped = (
+            await drop_expired_partitions(table, months, dry_run=dry_run)
+            if months else []
+        )
+        report[table] = {"created": created, "dropped": dropped}
+    return report
+
+
+class PartitionMaintainer:
+    """Runs `maintain_partitions` once a day"""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.running = False
+
+    async def start(self) -> None:
+        self.running = True
+        while self.running:
+            try:
+                await maintain_partitions()
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Partition maintenance error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stop(self) -> None:
+        self.running = False
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create upcoming partitions and apply retention")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only list the partitions retention would drop")
+    args = parser.parse_args()
+    print(asyncio.run(maintain_partitions(args.dry_run)))
@@ -0,0 +1,154 @@
+"""
+Versioned Redis cache for read-heavy analytics and statistics responses.
+
+Entries are keyed by (endpoint, user, data version, params). Each user has
+a version counter that `bump_cache_version` increments whenever the user's
+tasks or devices change, so stale entries are never read again and simply
+expire. Concurrent misses for the same key are coalesced: within a process
+they share one in-flight computation, across processes a short Redis lock
+lets one worker compute while the others wait for its result.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from app.clients import get_redis
+from app.config import settings
+from app.metrics import response_cache_requests_total
+
+
+_VERSION_KEY = "cache:ver:user:{user_id}"
+_ENTRY_KEY = "cache:resp:{endpoint}:{user_id}:{version}:{params}"
+_LOCK_POLL_SECONDS = 0.05
+
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def _params_digest(params: dict[str, Any] | None) -> str:
+    raw = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+async def bump_cache_version(user_id: Any) -> None:
+    """Invalidate cached responses for `user_id`"""
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.incr(_VERSION_KEY.format(user_id=user_id))
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to bump cache version for {user_id}: {e}")
+
+
+async def cached_response(
+    endpoint: str,
+    compute: Callable[[], Awaitable[Any]],
+    user_id: Any,
+    params: dict[str, Any] | None = None,
+    ttl: int | None = None,
+) -> Any:
+    """Return the cached JSON-compatible result of `compute`, computing it on a miss"""
+    redis = get_redis()
+    if redis is None or not settings.response_cache_enabled:
+        response_cache_requests_total.labels(endpoint, "bypass").inc()
+        return jsonable_encoder(await compute())
+
+    try:
+        version = await redis.get(_VERSION_KEY.format(user_id=user_id)) or "0"
+        key = _ENTRY_KEY.format(
+            endpoint=endpoint, user_id=user_id, version=version,
+            params=_params_digest(params),
+        )
+        cached = await redis.get(key)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Response cache unavailable for {endpoint}: {e}")
+        response_cache_requests_total.labels(endpoint, "bypass").inc()
+        return jsonable_encoder(await compute())
+    if cached is not None:
+        response_cache_requests_total.labels(endpoint, "hit").inc()
+        return json.loads(cached)
+
+    # Singleflight within this process
+    while (inflight := _inflight.get(key)) is not None:
+        response_cache_requests_total.labels(endpoint, "coalesced").inc()
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            # Only the owner was cancelled (e.g. its client went away); the
+            # first waiter to wake up takes over the computation
+            if not inflight.cancelled() or asyncio.current_task().cancelling():
+                raise
+
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _fill(redis, key, endpoint, compute,
+                            ttl or settings.response_cache_ttl_seconds)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark retrieved so waiter-less failures are not logged as unhandled
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _fill(
+    redis: Any,
+    key: str,
+    endpoint: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int,
+) -> Any:
+    lock_key = f"{key}:lock"
+    lock_seconds = settings.response_cache_lock_seconds
+    try:
+        acquired = await redis.set(lock_key, "1", nx=True, px=int(lock_seconds * 1000))
+    except Exception:  # noqa: BLE001
+        acquired = True
+    if not acquired:
+        # Another worker is computing; wait for its result, then give up waiting
+        deadline = asyncio.get_running_loop().time() + lock_seconds
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(_LOCK_POLL_SECONDS)
+            try:
+                cached = await redis.get(key)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Response cache unavailable for {endpoint}: {e}")
+                break
+            if cached is not None:
+                response_cache_requests_total.labels(endpoint, "coalesced").inc()
+                return json.loads(cached)
+
+    response_cache_requests_total.labels(endpoint, "miss").inc()
+    try:
+        value = jsonable_encoder(await compute())
+    except (Exception, asyncio.CancelledError):
+        # Let other workers compute now instead of waiting out the lock
+        if acquired:
+            try:
+                await redis.delete(lock_key)
+            except Exception:  # noqa: BLE001
+                pass
+        raise
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(key, json.dumps(value), ex=ttl)
+        if acquired:
+            pipe.delete(lock_key)
+        await pipe.execute()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to store cached response for {endpoint}: {e}")
+    return value
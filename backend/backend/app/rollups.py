@@ -0,0 +1,270 @@
+"""
+Hourly analytics rollups.
+
+`task_rollups_hourly` and `action_rollups_hourly` are kept up to date by
+Postgres triggers, so every writer of `tasks`/`action_logs` (API, WebSocket
+ingestion, approvals, scheduler) is covered without touching call sites.
+Deleted action logs are subtracted from their rollup row, except for
+`duration_min`/`duration_max`, which keep the extremes seen until the hour is
+rebuilt. `backfill_rollups` rebuilds them from the raw tables, e.g. after the
+triggers are first installed or to tighten those bounds.
+
+Usage:
+    python -m app.rollups [--days N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db import engine
+
+
+# Result statuses counted as success/failure by action analytics
+ACTION_SUCCESS_STATUSES = ("done", "ok", "success", "completed")
+ACTION_FAILURE_STATUSES = ("failed", "error")
+# result->>'duration' values that can be cast to float
+DURATION_PATTERN = r"^-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?$"
+
+_FINISHED = "('completed', 'failed')"
+_NUMERIC = f"'{DURATION_PATTERN}'"
+
+
+def _utc_hour(column: str, aware: bool) -> str:
+    # Rollup hours are naive UTC. tasks.created_at is timestamptz and must be
+    # converted explicitly; action_logs.created_at is already naive UTC
+    if aware:
+        return f"date_trunc('hour', {column} AT TIME ZONE 'UTC')"
+    return f"date_trunc('hour', {column})"
+
+
+def _task_duration(row: str) -> str:
+    return (
+        f"CASE WHEN {row}.status IN {_FINISHED} "
+        f"THEN EXTRACT(EPOCH FROM {row}.updated_at - {row}.created_at) ELSE 0 END"
+    )
+
+
+def _task_finished(row: str) -> str:
+    return f"CASE WHEN {row}.status IN {_FINISHED} THEN 1 ELSE 0 END"
+
+
+def _action_outcome(row: str) -> str:
+    success = ", ".join(f"'{s}'" for s in ACTION_SUCCESS_STATUSES)
+    failure = ", ".join(f"'{s}'" for s in ACTION_FAILURE_STATUSES)
+    return (
+        f"CASE WHEN {row}.result->>'status' IN ({success}) THEN 'success' "
+        f"WHEN {row}.result->>'status' IN ({failure}) THEN 'failure' ELSE 'other' END"
+    )
+
+
+def _action_duration(row: str) -> str:
+    return (
+        f"CASE WHEN {row}.result->>'duration' ~ {_NUMERIC} "
+        f"THEN ({row}.result->>'duration')::float END"
+    )
+
+
+ROLLUP_TRIGGERS_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION task_rollups_apply() RETURNS trigger AS $$
+    BEGIN
+        -- Checked here rather than in a WHEN clause so the trigger does not
+        -- pin the column types (init_models alters created_at/updated_at)
+        IF TG_OP = 'UPDATE'
+           AND OLD.status IS NOT DISTINCT FROM NEW.status
+           AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+           AND OLD.updated_at IS NOT DISTINCT FROM NEW.updated_at THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE task_rollups_hourly SET
+                task_count = task_count - 1,
+                duration_sum = duration_sum - {_task_duration("OLD")},
+                duration_count = duration_count - {_task_finished("OLD")}
+            WHERE user_id = OLD.user_id AND device_id = OLD.device_id
+              AND hour = {_utc_hour("OLD.created_at", True)}
+              AND status = OLD.status;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO task_rollups_hourly AS r
+                (user_id, device_id, hour, status, task_count, duration_sum, duration_count)
+            VALUES (
+                NEW.user_id, NEW.device_id, {_utc_hour("NEW.created_at", True)},
+                NEW.status, 1, {_task_duration("NEW")}, {_task_finished("NEW")}
+            )
+            ON CONFLICT (user_id, device_id, hour, status) DO UPDATE SET
+                task_count = r.task_count + 1,
+                duration_sum = r.duration_sum + EXCLUDED.duration_sum,
+                duration_count = r.duration_count + EXCLUDED.duration_count;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER tasks_rollup
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION task_rollups_apply()
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION action_rollups_apply() RETURNS trigger AS $$
+    DECLARE
+        owner UUID;
+        duration FLOAT;
+    BEGIN
+        SELECT user_id INTO owner FROM tasks WHERE id = NEW.task_id;
+        IF owner IS NULL THEN
+            RETURN NULL;
+        END IF;
+        duration := {_action_duration("NEW")};
+        INSERT INTO action_rollups_hourly AS r
+            (user_id, device_id, hour, action_type, outcome, action_count,
+             duration_sum, duration_count, duration_min, duration_max)
+        VALUES (
+            owner, NEW.device_id, {_utc_hour("NEW.created_at", False)},
+            left(COALESCE(NEW.action->>'type', 'unknown'), 64), {_action_outcome("NEW")}, 1,
+            COALESCE(duration, 0), CASE WHEN duration IS NULL THEN 0 ELSE 1 END,
+            duration, duration
+        )
+        ON CONFLICT (user_id, device_id, hour, action_type, outcome) DO UPDATE SET
+            action_count = r.action_count + 1,
+            duration_sum = r.duration_sum + EXCLUDED.duration_sum,
+            duration_count = r.duration_count + EXCLUDED.duration_count,
+            duration_min = LEAST(r.duration_min, EXCLUDED.duration_min),
+            duration_max = GREATEST(r.duration_max, EXCLUDED.duration_max);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER action_logs_rollup_insert
+    AFTER INSERT ON action_logs
+    FOR EACH ROW EXECUTE FUNCTION action_rollups_apply()
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION action_rollups_retract() RETURNS trigger AS $$
+    DECLARE
+        owner UUID;
+        duration FLOAT;
+    BEGIN
+        SELECT user_id INTO owner FROM tasks WHERE id = OLD.task_id;
+        IF owner IS NULL THEN
+            RETURN NULL;
+        END IF;
+        duration := {_action_duration("OLD")};
+        -- min/max cannot be retracted; backfill_rollups recomputes them
+        UPDATE action_rollups_hourly SET
+            action_count = action_count - 1,
+            duration_sum = duration_sum - COALESCE(duration, 0),
+            duration_count = duration_count - CASE WHEN duration IS NULL THEN 0 ELSE 1 END
+        WHERE user_id = owner AND device_id = OLD.device_id
+          AND hour = {_utc_hour("OLD.created_at", False)}
+          AND action_type = left(COALESCE(OLD.action->>'type', 'unknown'), 64)
+          AND outcome = {_action_outcome("OLD")};
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER action_logs_rollup_delete
+    AFTER DELETE ON action_logs
+    FOR EACH ROW EXECUTE FUNCTION action_rollups_retract()
+    """,
+]
+
+
+async def install_rollup_triggers(conn: AsyncConnection) -> None:
+    """Create or replace the rollup trigger functions (Postgres only)"""
+    for statement in ROLLUP_TRIGGERS_DDL:
+        await conn.execute(text(statement))
+
+
+async def _rebuild_rollups(conn: AsyncConnection, since_hour: datetime) -> dict[str, Any]:
+    params = {"since": since_hour}
+    await conn.execute(
+        text("DELETE FROM task_rollups_hourly WHERE hour >= :since"), params)
+    await conn.execute(
+        text("DELETE FROM action_rollups_hourly WHERE hour >= :since"), params)
+    tasks = await conn.execute(
+        text(f"""
+            INSERT INTO task_rollups_hourly
+                (user_id, device_id, hour, status, task_count, duration_sum, duration_count)
+            SELECT t.user_id, t.device_id, {_utc_hour("t.created_at", True)},
+                   t.status, COUNT(*), SUM({_task_duration("t")}), SUM({_task_finished("t")})
+            FROM tasks t
+            WHERE t.created_at >= :since
+            GROUP BY 1, 2, 3, 4
+        """),
+        params,
+    )
+    actions = await conn.execute(
+        text(f"""
+            INSERT INTO action_rollups_hourly
+                (user_id, device_id, hour, action_type, outcome, action_count,
+                 duration_sum, duration_count, duration_min, duration_max)
+            SELECT t.user_id, a.device_id, {_utc_hour("a.created_at", False)},
+                   left(COALESCE(a.action->>'type', 'unknown'), 64),
+                   {_action_outcome("a")}, COUNT(*),
+                   COALESCE(SUM({_action_duration("a")}), 0),
+                   COUNT({_action_duration("a")}),
+                   MIN({_action_duration("a")}), MAX({_action_duration("a")})
+            FROM action_logs a
+            JOIN tasks t ON t.id = a.task_id
+            WHERE a.created_at >= :since
+            GROUP BY 1, 2, 3, 4, 5
+        """),
+        params,
+    )
+    return {
+        "since": since_hour.isoformat(),
+        "task_rollup_rows": tasks.rowcount,
+        "action_rollup_rows": actions.rowcount,
+    }
+
+
+async def populate_rollups_if_empty(conn: AsyncConnection) -> None:
+    """Initial fill when the triggers are installed on a database with history"""
+    has_rollups = await conn.scalar(
+        text("SELECT EXISTS (SELECT 1 FROM task_rollups_hourly)"))
+    has_tasks = await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM tasks)"))
+    if has_tasks and not has_rollups:
+        result = await _rebuild_rollups(conn, datetime(1970, 1, 1))
+        logger.info(f"Analytics rollups populated: {result}")
+
+
+async def backfill_rollups(since: datetime | None = None) -> dict[str, Any]:
+    """Rebuild rollups from raw rows created at or after `since` (all history if None).
+
+    Runs in one transaction holding SHARE locks on the raw tables, so concurrent
+    writers wait until the rebuilt hours are consistent with the triggers.
+    """
+    since_hour = (
+        since.astimezone(timezone.utc).replace(
+            tzinfo=None, minute=0, second=0, microsecond=0)
+        if since is not None else datetime(1970, 1, 1)
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text("LOCK TABLE tasks, action_logs IN SHARE MODE"))
+        result = await _rebuild_rollups(conn, since_hour)
+    logger.info(f"Analytics rollups backfilled: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild hourly analytics rollups")
+    parser.add_argument("--days", type=int, default=None,
+                        help="Only rebuild the last N days (default: all history)")
+    args = parser.parse_args()
+    since = (
+        datetime.now(timezone.utc) - timedelta(days=args.days)
+        if args.days is not None else None
+    )
+    asyncio.run(backfill_rollups(since))
@@ -3,13 +3,15 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from typing import Annotated, Dict, Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import get_db
 from app.deps import require_admin
 from app.models import Device, Task, ActionLog, User
+from app.pagination import paginate, set_next_cursor
+from app.system_stats import system_stats
 
 
 router = APIRouter()
@@ -17,12 +19,15 @@ router = APIRouter()
 
 @router.get("/users", response_model=List[Dict[str, Any]])
 async def list_users(
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db)],
     admin: Annotated[User, Depends(require_admin)],
     limit: int = Query(default=50, le=200),
+    cursor: str | None = Query(default=None),
 ) -> List[Dict[str, Any]]:
-    q = select(User).order_by(desc(User.created_at)).limit(limit)
+    q = paginate(select(User), User.created_at, User.id, limit, cursor)
     rows = (await db.execute(q)).scalars().all()
+    set_next_cursor(response, rows, limit)
     return [
         {
             "id": str(u.id),
@@ -37,12 +42,15 @@ async def list_users(
 
 @router.get("/devices", response_model=List[Dict[str, Any]])
 async def list_devices(
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db)],
     admin: Annotated[User, Depends(require_admin)],
     limit: int = Query(default=100, le=500),
+    cursor: str | None = Query(default=None),
 ) -> List[Dict[str, Any]]:
-    q = select(Device).order_by(desc(Device.created_at)).limit(limit)
+    q = paginate(select(Device), Device.created_at, Device.id, limit, cursor)
     rows = (await db.execute(q)).scalars().all()
+    set_next_cursor(response, rows, limit)
     return [
         {
             "id": str(d.id),
@@ -59,15 +67,19 @@ async def list_devices(
 
 @router.get("/tasks", response_model=List[Dict[str, Any]])
 async def list_tasks_admin(
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db)],
     admin: Annotated[User, Depends(require_admin)],
     status: Optional[str] = Query(default=None),
     limit: int = Query(default=100, le=500),
+    cursor: str | None = Query(default=None),
 ) -> List[Dict[str, Any]]:
-    q = select(Task).order_by(desc(Task.created_at)).limit(limit)
+    q = select(Task)
     if status:
         q = q.where(Task.status == status)
+    q = paginate(q, Task.created_at, Task.id, limit, cursor)
     rows = (await db.execute(q)).scalars().all()
+    set_next_cursor(response, rows, limit)
     return [
         {
             "id": t.id,
@@ -164,38 +176,20 @@ async def promote_user_to_admin(
 
 @router.get("/system/statistics")
 async def get_system_statistics(
-    db: Annotated[AsyncSession, Depends(get_db)],
     admin: Annotated[User, Depends(require_admin)],
 ) -> Dict[str, Any]:
     """Get system-wide statistics"""
 
-    # Count total users
-    total_users = await db.execute(select(func.count(User.id)))
-    active_users = await db.execute(select(func.count(User.id)).where(User.is_active == True))
-
-    # Count total devices
-    total_devices = await db.execute(select(func.count(Device.id)))
-
-    # Count total tasks
-    total_tasks = await db.execute(select(func.count(Task.id)))
-    pending_tasks = await db.execute(select(func.count(Task.id)).where(Task.status == "pending"))
-    completed_tasks = await db.execute(select(func.count(Task.id)).where(Task.status == "completed"))
-
-    # Recent activity (last 24 hours)
-    recent_cutoff = datetime.now(timezone.utc).replace(
-        tzinfo=None) - timedelta(hours=24)
-    recent_tasks = await db.execute(
-        select(func.count(Task.id)).where(Task.created_at >= recent_cutoff)
-    )
-
+    stats = await system_stats.get()
     return {
-        "total_users": total_users.scalar(),
-        "active_users": active_users.scalar(),
-        "total_devices": total_devices.scalar(),
-        "total_tasks": total_tasks.scalar(),
-        "pending_tasks": pending_tasks.scalar(),
-        "completed_tasks": completed_tasks.scalar(),
-        "recent_tasks_24h": recent_tasks.scalar(),
+        "total_users": stats["users"],
+        "active_users": stats["active_users"],
+        "total_devices": stats["devices"],
+        "total_tasks": stats["tasks"],
+        "pending_tasks": stats["tasks_by_status"].get("pending", 0),
+        "completed_tasks": stats["tasks_by_status"].get("completed", 0),
+        "recent_tasks_24h": stats["recent_tasks_24h"],
+        "snapshot_at": stats["snapshot_at"],
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
@@ -263,12 +257,15 @@ async def get_system_health(
 
 @router.get("/logs", response_model=List[Dict[str, Any]])
 async def list_logs_admin(
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db)],
     admin: Annotated[User, Depends(require_admin)],
     limit: int = Query(default=100, le=500),
+    cursor: str | None = Query(default=None),
 ) -> List[Dict[str, Any]]:
-    q = select(ActionLog).order_by(desc(ActionLog.created_at)).limit(limit)
+    q = paginate(select(ActionLog), ActionLog.created_at, ActionLog.id, limit, cursor)
     rows = (await db.execute(q)).scalars().all()
+    set_next_cursor(response, rows, limit)
     return [
         {
             "id": log.id,
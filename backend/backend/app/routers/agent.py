@@ -1,19 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import uuid
 import json
-from typing import Annotated
-from datetime import datetime
+from dataclasses import dataclass
+from typing import Annotated, Any
+from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.config import settings
+from app.db import AsyncSessionLocal, get_db
 from app.deps import get_current_user
-from app.models import User, ChatSession, ChatMessage, Device, Task
+from app.models import ActionLog, User, ChatSession, ChatMessage, Device, Task
 from app.schemas import AgentChatRequest, AgentChatResponse, ChatMessageResponse
-from app.clients import publish_event
+from app.routers.chat import extract_screenshot_url
+from app.thumbnails import preview_url
+from app.routing import publish_task_envelope
+from app.security import sign_message_hmac
+from app.task_events import emit_task_event
+from app.task_latency import envelope_time
+from app.task_watch import TERMINAL_STATUSES, task_status_hub
 from loguru import logger
 
 router = APIRouter()
@@ -145,13 +156,45 @@ class SimpleAgent:
             return "Я обработал ваше сообщение. Если это была команда для выполнения действий на устройстве, я создам соответствующую задачу. Иначе, уточните, пожалуйста, что именно вы хотите сделать."
 
 
-@router.post("/chat", response_model=AgentChatResponse)
-async def agent_chat(
-    payload: AgentChatRequest,
-    current_user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[AsyncSession, Depends(get_db)],
-) -> AgentChatResponse:
-    """Основной endpoint для общения с AI агентом"""
+@dataclass
+class AgentTurn:
+    """Persisted messages (and task) of one agent chat turn"""
+
+    session_id: uuid.UUID
+    user_message: ChatMessage
+    assistant_message: ChatMessage
+    task: Task | None = None
+
+    def response(self) -> AgentChatResponse:
+        return AgentChatResponse(
+            session_id=self.session_id,
+            message=ChatMessageResponse(
+                id=self.user_message.id,
+                session_id=self.user_message.session_id,
+                role=self.user_message.role,
+                content=self.user_message.content,
+                created_at=self.user_message.created_at,
+                metadata=self.user_message.meta_data,
+                task_id=self.user_message.task_id,
+            ),
+            assistant_message=ChatMessageResponse(
+                id=self.assistant_message.id,
+                session_id=self.assistant_message.session_id,
+                role=self.assistant_message.role,
+                content=self.assistant_message.content,
+                created_at=self.assistant_message.created_at,
+                metadata=self.assistant_message.meta_data,
+                task_id=None,
+            ),
+            task_created=self.task is not None,
+            task_id=self.task.id if self.task is not None else None,
+        )
+
+
+async def _start_turn(
+    payload: AgentChatRequest, current_user: User, db: AsyncSession
+) -> AgentTurn:
+    """Сохраняет сообщения и создает задачу; отправка задачи - `_deliver_task`"""
 
     session_id = payload.session_id
     device_id = payload.device_id
@@ -208,8 +251,7 @@ async def agent_chat(
     # Определяем, нужно ли создавать задачу
     agent = SimpleAgent()
     should_create_task = agent.should_create_task(payload.message)
-    task_created = False
-    task_id = None
+    task = None
 
     if should_create_task and device_id:
         try:
@@ -217,9 +259,8 @@ async def agent_chat(
             task_data = agent.parse_task_from_message(
                 payload.message, device_id)
 
-            task_id = f"task_{uuid.uuid4().hex[:8]}"
             task = Task(
-                id=task_id,
+                id=f"task_{uuid.uuid4().hex[:8]}",
                 user_id=current_user.id,
                 device_id=device_id,
                 title=task_data["title"],
@@ -234,29 +275,17 @@ async def agent_chat(
             await db.flush()
 
             # Связываем сообщение с задачей
-            user_message.task_id = task_id
-            task_created = True
-
-            # Публикуем событие для выполнения задачи
-            try:
-                await publish_event(f"deliver:task:{device_id}", {
-                    "task_id": task_id,
-                    "device_id": str(device_id),
-                    "user_id": str(current_user.id)
-                })
-                logger.info(f"Published task {task_id} for device {device_id}")
-            except Exception as e:
-                logger.warning(f"Failed to publish task event: {e}")
+            user_message.task_id = task.id
 
         except Exception as e:
             logger.error(f"Failed to create task: {e}")
-            should_create_task = False
+            task = None
 
     # Генерируем ответ агента
     assistant_response = agent.generate_response(
         payload.message,
-        task_created=task_created,
-        task_id=task_id
+        task_created=task is not None,
+        task_id=task.id if task is not None else None
     )
 
     # Сохраняем ответ агента
@@ -265,8 +294,8 @@ async def agent_chat(
         role="assistant",
         content=assistant_response,
         metadata={
-            "task_created": task_created,
-            "task_id": task_id,
+            "task_created": task is not None,
+            "task_id": task.id if task is not None else None,
             "generated_by": "simple_agent"
         }
     )
@@ -278,29 +307,124 @@ async def agent_chat(
     await db.commit()
     await db.refresh(user_message)
     await db.refresh(assistant_message)
+    if task is not None:
+        await db.refresh(task)
+        await emit_task_event("created", task)
 
-    return AgentChatResponse(
-        session_id=session_id,
-        message=ChatMessageResponse(
-            id=user_message.id,
-            session_id=user_message.session_id,
-            role=user_message.role,
-            content=user_message.content,
-            created_at=user_message.created_at,
-            metadata=user_message.meta_data,
-            task_id=user_message.task_id,
-        ),
-        assistant_message=ChatMessageResponse(
-            id=assistant_message.id,
-            session_id=assistant_message.session_id,
-            role=assistant_message.role,
-            content=assistant_message.content,
-            created_at=assistant_message.created_at,
-            metadata=assistant_message.meta_data,
-            task_id=None,
-        ),
-        task_created=task_created,
-        task_id=task_id,
+    return AgentTurn(session_id, user_message, assistant_message, task)
+
+
+async def _deliver_task(task: Task) -> None:
+    """Отправляет задачу на устройство (после commit, чтобы результат не обогнал ее)"""
+    envelope = {
+        "type": "task.exec",
+        "task_id": str(task.id),
+        "queued_at": envelope_time(task.created_at),
+        "issued_at": datetime.now(timezone.utc).isoformat(),
+        "actions": task.payload.get("actions", []),
+    }
+    envelope["signature"] = sign_message_hmac(envelope)
+    try:
+        await publish_task_envelope(str(task.device_id), envelope)
+        logger.info(f"Published task {task.id} for device {task.device_id}")
+    except Exception as e:
+        logger.warning(f"Failed to publish task event: {e}")
+
+
+@router.post("/chat", response_model=AgentChatResponse)
+async def agent_chat(
+    payload: AgentChatRequest,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+) -> AgentChatResponse:
+    """Основной endpoint для общения с AI агентом"""
+    turn = await _start_turn(payload, current_user, db)
+    if turn.task is not None:
+        await _deliver_task(turn.task)
+    return turn.response()
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.post("/chat/stream")
+async def agent_chat_stream(
+    payload: AgentChatRequest,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+) -> StreamingResponse:
+    """Потоковый вариант /chat: события хода по мере выполнения задачи (SSE)"""
+    turn = await _start_turn(payload, current_user, db)
+    response = turn.response()
+    task = turn.task
+    watch = None
+    if task is not None:
+        # Подписываемся до отправки, чтобы не пропустить быстрый результат
+        watch = task_status_hub.subscribe(task.id)
+        await _deliver_task(task)
+    # Соединение с БД не держим, пока ждем устройство
+    await db.close()
+
+    async def stream():
+        try:
+            yield _sse("accepted", {
+                "session_id": response.session_id, "message": response.message})
+            if watch is None:
+                yield _sse("answer", response)
+                return
+            status = task.status
+            yield _sse("task", {"task_id": task.id, "status": status})
+
+            finished = None
+            delivered = False
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.task_wait_max_seconds
+            while finished is None and (remaining := deadline - loop.time()) > 0:
+                event = await watch.next(
+                    min(remaining, settings.task_events_keepalive_seconds))
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["event"] == "delivered":
+                    # Задача может уйти на устройство несколькими путями
+                    if not delivered:
+                        delivered = True
+                        yield _sse("delivered", {"task_id": task.id})
+                elif event["event"] == "progress":
+                    yield _sse("progress", {
+                        "task_id": task.id,
+                        "action_id": event.get("action_id"),
+                        "status": event.get("action_status"),
+                    })
+                if event.get("status") in TERMINAL_STATUSES:
+                    finished = event
+
+            if finished is not None:
+                status = finished["status"]
+                async with AsyncSessionLocal() as session:
+                    results = (await session.execute(
+                        select(ActionLog.result).where(ActionLog.task_id == task.id)
+                    )).scalars().all()
+                for result in results:
+                    yield _sse("action", {
+                        "task_id": task.id,
+                        "action_id": (result or {}).get("action_id"),
+                        "status": (result or {}).get("status"),
+                    })
+                url = extract_screenshot_url(results)
+                if url:
+                    yield _sse("screenshot", {
+                        "task_id": task.id, "url": url, "preview_url": await preview_url(url)})
+            yield _sse("answer", {**response.model_dump(), "task_status": status})
+        finally:
+            if watch is not None:
+                watch.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+import uuid
 from typing import Annotated, Dict, Any
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import get_db
 from app.deps import get_current_user, require_admin
 from app.models import User
 from app.analytics import AdvancedAnalytics
+from app.response_cache import cached_response
 
 
 router = APIRouter()
@@ -24,17 +26,21 @@ async def get_performance_analytics(
 ) -> Dict[str, Any]:
     """Get comprehensive performance analytics for current user"""
 
-    performance_data = await AdvancedAnalytics.get_user_performance_summary(
-        db, str(user.id), days
-    )
+    async def compute() -> Dict[str, Any]:
+        performance_data = await AdvancedAnalytics.get_user_performance_summary(
+            db, str(user.id), days
+        )
 
-    # Add expected fields for test compatibility
-    performance_data["average_execution_time"] = performance_data.get(
-        "avg_duration_minutes", 0.0)
-    performance_data["tasks_per_day"] = performance_data.get(
-        "total_tasks", 0) / max(days, 1)
+        # Add expected fields for test compatibility
+        performance_data["average_execution_time"] = performance_data.get(
+            "avg_duration_minutes", 0.0)
+        performance_data["tasks_per_day"] = performance_data.get(
+            "total_tasks", 0) / max(days, 1)
 
-    return performance_data
+        return performance_data
+
+    return await cached_response(
+        "analytics.performance", compute, user_id=user.id, params={"days": days})
 
 
 @router.get("/devices")
@@ -58,6 +64,7 @@ async def get_device_analytics(
             "success_rate": da.success_rate,
             "avg_duration_seconds": da.avg_duration,
             "avg_duration_minutes": round(da.avg_duration / 60, 2),
+            "task_share": da.task_share,
             "last_active": da.last_active.isoformat() if da.last_active else None,
             "health_score": da.health_score,
             "health_status": (
@@ -99,37 +106,40 @@ async def get_device_specific_analytics(
 ) -> Dict[str, Any]:
     """Get analytics for a specific device"""
 
-    # Get all device analytics and filter for the specific device
-    all_devices = await AdvancedAnalytics.get_device_analytics(db, str(user.id), days)
-
-    device_data = None
-    for da in all_devices:
-        if da.device_id == device_id:
-            device_data = {
-                "device_id": da.device_id,
-                "device_name": da.device_name,
-                "total_tasks": da.total_tasks,
-                "success_rate": da.success_rate,
-                "avg_duration_seconds": da.avg_duration,
-                "avg_duration_minutes": round(da.avg_duration / 60, 2),
-                # Added expected field
-                "average_execution_time": round(da.avg_duration / 60, 2),
-                "last_active": da.last_active.isoformat() if da.last_active else None,
-                "health_score": da.health_score,
-                "health_status": (
-                    "excellent" if da.health_score >= 90
-                    else "good" if da.health_score >= 75
-                    else "warning" if da.health_score >= 50
-                    else "critical"
-                )
-            }
-            break
+    try:
+        uuid.UUID(device_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=404, detail="Device not found or no data available")
 
-    if not device_data:
-        from fastapi import HTTPException
+    analytics = await AdvancedAnalytics.get_device_analytics(
+        db, str(user.id), days, device_id=device_id
+    )
+    if not analytics:
         raise HTTPException(
             status_code=404, detail="Device not found or no data available")
 
+    da = analytics[0]
+    device_data = {
+        "device_id": da.device_id,
+        "device_name": da.device_name,
+        "total_tasks": da.total_tasks,
+        "success_rate": da.success_rate,
+        "avg_duration_seconds": da.avg_duration,
+        "avg_duration_minutes": round(da.avg_duration / 60, 2),
+        # Added expected field
+        "average_execution_time": round(da.avg_duration / 60, 2),
+        "task_share": da.task_share,
+        "last_active": da.last_active.isoformat() if da.last_active else None,
+        "health_score": da.health_score,
+        "health_status": (
+            "excellent" if da.health_score >= 90
+            else "good" if da.health_score >= 75
+            else "warning" if da.health_score >= 50
+            else "critical"
+        )
+    }
+
     return device_data
 
 
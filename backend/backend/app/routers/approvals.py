@@ -13,6 +13,8 @@ from app.db import get_db
 from app.deps import get_current_user
 from app.models import Task, User, TaskStatus
 from app.routers.notifications import notification_manager
+from app.task_events import emit_task_event
+from app.task_latency import envelope_time
 
 
 router = APIRouter()
@@ -112,6 +114,7 @@ async def create_approval_request(
     db.add(task)
     await db.commit()
     await db.refresh(task)
+    await emit_task_event("created", task)
 
     return {
         "id": task.id,
@@ -181,6 +184,7 @@ async def approve_task(
         )
     )
     await db.commit()
+    await emit_task_event("approved", task, status=TaskStatus.QUEUED.value)
 
     # Trigger task delivery
     from app.routing import publish_task_envelope
@@ -189,6 +193,8 @@ async def approve_task(
     envelope = {
         "type": "task.exec",
         "task_id": task_id,
+        # Queue wait starts at approval, not while awaiting confirmation
+        "queued_at": envelope_time(),
         "issued_at": datetime.now(timezone.utc).isoformat(),
         "actions": task.payload.get("actions", []),
     }
@@ -233,6 +239,7 @@ async def reject_task(
         )
     )
     await db.commit()
+    await emit_task_event("cancelled", task, status=TaskStatus.CANCELLED.value)
 
     # Notify user
     await notification_manager.notify_task_update(
@@ -275,6 +282,9 @@ async def cleanup_expired_approvals():
 
         if expired_tasks:
             await db.commit()
+            for task in expired_tasks:
+                await emit_task_event(
+                    "cancelled", task, status=TaskStatus.CANCELLED.value)
             from loguru import logger
             logger.info(
                 f"Auto-cancelled {len(expired_tasks)} expired approval requests")
@@ -1,46 +1,62 @@
 from __future__ import annotations
 
-import uuid
 import asyncio
+import hmac
+import time
+import uuid
 from datetime import timedelta, datetime, timezone
 from typing import Annotated
-from functools import partial
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File, Form
 
 from app.deps import get_current_user
 from app.models import User
-from app.config import settings
-from app.clients import get_s3_client
 from app.db import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.schemas import ArtifactPresignRequest
+from app.schemas import ArtifactCommitRequest, ArtifactPresignRequest
 from app.models import Task
+from app.content_store import (
+    add_ref,
+    cas_key,
+    commit_upload,
+    count_dedup,
+    file_sha256,
+    is_stored,
+    record_artifact,
+    referenced_by,
+    require_content_store,
+)
+from app.storage import (
+    ArtifactStorage,
+    ObjectNotFound,
+    get_storage,
+    require_storage,
+    upload_signature,
+)
+from app.thumbnails import (
+    DERIVED_CONTENT_TYPE,
+    VARIANTS,
+    cache_control,
+    derivative_etag,
+    get_derivative,
+    is_image,
+    schedule_derivatives,
+)
 from sqlalchemy import select
 
 
 router = APIRouter()
 
 
-async def run_s3_operation(func_or_partial):
-    """Run S3 operation in thread pool to avoid blocking the event loop"""
-    from loguru import logger
-    loop = asyncio.get_event_loop()
+async def _ensure_artifacts_bucket(storage: ArtifactStorage) -> None:
+    """Bucket (or directory) check, cached per process"""
     try:
-        logger.info("Starting S3 operation")
-        result = await asyncio.wait_for(
-            loop.run_in_executor(None, func_or_partial),
-            timeout=30.0  # 30 second timeout
-        )
-        logger.info("S3 operation completed successfully")
-        return result
-    except asyncio.TimeoutError as exc:
-        logger.error("S3 operation timed out after 30 seconds")
-        raise HTTPException(
-            status_code=504, detail="S3 operation timed out") from exc
-    except Exception as exc:
-        logger.error(f"S3 operation failed: {exc}")
-        raise
+        await storage.ensure()
+    except HTTPException:
+        raise  # Re-raise timeout errors
+    except Exception:
+        # Let the upload itself report a missing bucket
+        pass
 
 
 @router.post("/create-bucket")
@@ -49,32 +65,19 @@ async def create_bucket(
 ) -> dict:
     """Create the artifacts bucket if it doesn't exist"""
     _ = current_user
-    if settings.artifacts_bucket is None:
-        raise HTTPException(
-            status_code=500, detail="Artifacts bucket not configured")
-
-    # Use internal MinIO endpoint for bucket operations
-    s3 = get_s3_client()
-    if s3 is None:
-        raise HTTPException(
-            status_code=500, detail="S3 client not available")
+    storage = require_storage()
 
-    # Check if bucket exists
     try:
-        await run_s3_operation(partial(s3.head_bucket, Bucket=settings.artifacts_bucket))
-        return {"message": f"Bucket {settings.artifacts_bucket} already exists"}
+        created = await storage.ensure()
     except HTTPException:
         raise  # Re-raise timeout errors
-    except Exception:
-        # Bucket doesn't exist, create it
-        try:
-            await run_s3_operation(partial(s3.create_bucket, Bucket=settings.artifacts_bucket))
-            return {"message": f"Bucket {settings.artifacts_bucket} created successfully"}
-        except HTTPException:
-            raise  # Re-raise timeout errors
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to create bucket: {str(e)}") from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to create bucket: {str(e)}") from e
+    name = getattr(storage, "bucket", None) or "Local artifact store"
+    if created:
+        return {"message": f"Bucket {name} created successfully"}
+    return {"message": f"Bucket {name} already exists"}
 
 
 @router.post("/presign")
@@ -92,135 +95,165 @@ async def presign_artifact(
     ).scalar_one_or_none()
     if t is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    if settings.artifacts_bucket is None:
-        raise HTTPException(
-            status_code=500, detail="Artifacts bucket not configured")
+    if request.sha256:
+        require_content_store(db)
+    storage = require_storage()
+    await _ensure_artifacts_bucket(storage)
 
-    # Use internal MinIO endpoint for bucket operations
-    s3_internal = get_s3_client()
-    if s3_internal is None:
-        raise HTTPException(
-            status_code=500, detail="S3 client not available")
-
-    # Ensure bucket exists using internal client
-    try:
-        await run_s3_operation(partial(s3_internal.head_bucket, Bucket=settings.artifacts_bucket))
-    except HTTPException:
-        raise  # Re-raise timeout errors
-    except Exception:
-        # Bucket doesn't exist, create it
-        try:
-            await run_s3_operation(partial(s3_internal.create_bucket, Bucket=settings.artifacts_bucket))
-        except HTTPException:
-            raise  # Re-raise timeout errors
-        except Exception:
-            # Ignore if bucket already exists
-            pass
-
-    # Use external MinIO endpoint for presigned URLs if available
-    if settings.minio_external_endpoint:
-        # Create S3 client with external endpoint for presigned URLs
-        import boto3
-        from botocore.config import Config
-
-        s3_external = boto3.client(
-            's3',
-            endpoint_url=settings.minio_external_endpoint,
-            aws_access_key_id=settings.minio_access_key,
-            aws_secret_access_key=settings.minio_secret_key,
-            config=Config(signature_version='s3v4')
+    expires_in = 300
+    if request.sha256:
+        # Content-addressed: skip the upload if the user's tasks already
+        # reference the content, otherwise the task references it once the
+        # upload is committed (/commit)
+        object_key = cas_key(request.sha256)
+        exists = (
+            await referenced_by(db, request.sha256, current_user.id)
+            and await is_stored(db, storage, request.sha256)
         )
+        await record_artifact(
+            db, request.sha256, request.size, request.content_type, stored=exists)
+        if exists:
+            await add_ref(db, request.sha256, request.task_id)
+        await db.commit()
+        if exists:
+            count_dedup(request.size)
+            return {
+                "upload_url": None,
+                "exists": True,
+                "sha256": request.sha256,
+                "s3_url": storage.uri(object_key),
+                "expires_at": None,
+            }
     else:
-        s3_external = s3_internal
+        object_key = f"tasks/{request.task_id}/{uuid.uuid4().hex}/{request.filename}"
 
-    object_key = f"tasks/{request.task_id}/{uuid.uuid4().hex}/{request.filename}"
-    expires_in = 300
-    url = await run_s3_operation(
-        partial(
-            s3_external.generate_presigned_url,
-            ClientMethod="put_object",
-            Params={
-                "Bucket": settings.artifacts_bucket,
-                "Key": object_key,
-                "ContentLength": request.size,
-            },
-            ExpiresIn=expires_in,
-        )
-    )
+    url, upload_headers = storage.presign_put(
+        object_key, request.size, request.content_type, request.sha256, expires_in)
 
-    return {
+    response = {
         "upload_url": url,
-        "s3_url": f"s3://{settings.artifacts_bucket}/{object_key}",
+        "s3_url": storage.uri(object_key),
         "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).isoformat(),
     }
+    if request.sha256:
+        response.update(
+            exists=False,
+            sha256=request.sha256,
+            upload_headers=upload_headers,
+        )
+    return response
 
 
-@router.post("/upload")
-async def upload_artifact(
+@router.post("/commit")
+async def commit_artifact(
+    request: ArtifactCommitRequest,
     current_user: Annotated[User, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    filename: str = Form(...),
-    content_type: str = Form(...),
+    db: Annotated[AsyncSession, Depends(get_db)],
 ) -> dict:
-    """Direct upload endpoint for artifacts like screenshots"""
-    if settings.artifacts_bucket is None:
-        raise HTTPException(
-            status_code=500, detail="Artifacts bucket not configured")
-
-    # Use internal MinIO endpoint for upload
-    s3 = get_s3_client()
-    if s3 is None:
-        raise HTTPException(
-            status_code=500, detail="S3 client not available")
-
-    # Ensure bucket exists
-    try:
-        await run_s3_operation(partial(s3.head_bucket, Bucket=settings.artifacts_bucket))
-    except HTTPException:
-        raise  # Re-raise timeout errors
-    except Exception:
-        # Bucket doesn't exist, create it
-        try:
-            await run_s3_operation(partial(s3.create_bucket, Bucket=settings.artifacts_bucket))
-        except HTTPException:
-            raise  # Re-raise timeout errors
-        except Exception:
-            pass
+    """Reference a content-addressed upload from the task once its presigned
+    PUT finished; `etag` is the ETag header of the PUT response"""
+    require_content_store(db)
+    task = (
+        await db.execute(
+            select(Task.id).where(Task.id == request.task_id,
+                                  Task.user_id == current_user.id)
+        )
+    ).scalar_one_or_none()
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    storage = require_storage()
 
-    # Generate object key
-    object_key = filename
+    if not await commit_upload(db, storage, request.sha256, request.etag):
+        raise HTTPException(status_code=409, detail="Upload not found")
+    await add_ref(db, request.sha256, request.task_id)
+    await db.commit()
+    return {"sha256": request.sha256, "s3_url": storage.uri(cas_key(request.sha256))}
 
-    # Read file content
-    file_content = await file.read()
 
-    # Upload to S3
+async def _stream_to_bucket(
+    storage: ArtifactStorage, object_key: str, file: UploadFile, content_type: str
+) -> int:
+    # Streamed part by part (app.uploads on S3), never holding the whole file
     try:
-        await run_s3_operation(
-            partial(
-                s3.put_object,
-                Bucket=settings.artifacts_bucket,
-                Key=object_key,
-                Body=file_content,
-                ContentType=content_type
-            )
-        )
+        return await storage.save(object_key, file.read, content_type)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to upload file: {str(e)}") from e
 
-    # Generate public URL
-    if settings.minio_external_endpoint:
-        public_url = f"{settings.minio_external_endpoint.rstrip('/')}/{settings.artifacts_bucket}/{object_key}"
+
+async def _store_upload(
+    db: AsyncSession,
+    file: UploadFile,
+    filename: str,
+    content_type: str,
+    content_addressed: bool = False,
+    user_id: uuid.UUID | None = None,
+    task_id: str | None = None,
+) -> dict:
+    if content_addressed:
+        require_content_store(db)
+    storage = require_storage()
+    await _ensure_artifacts_bucket(storage)
+
+    if not content_addressed:
+        size = await _stream_to_bucket(storage, filename, file, content_type)
+        if is_image(filename, content_type):
+            schedule_derivatives(storage, filename)
+        return {"s3_key": filename, "size": size}
+
+    # The form body is already spooled; hash it before sending anything
+    sha256 = await asyncio.to_thread(file_sha256, file.file)
+    object_key = cas_key(sha256)
+    deduplicated = (
+        await referenced_by(db, sha256, user_id)
+        and await is_stored(db, storage, sha256)
+    )
+    if deduplicated:
+        size = file.size or 0
+        count_dedup(size)
     else:
-        public_url = f"{settings.minio_endpoint.rstrip('/')}/{settings.artifacts_bucket}/{object_key}"
+        size = await _stream_to_bucket(storage, object_key, file, content_type)
+        if is_image(object_key, content_type):
+            schedule_derivatives(storage, object_key)
+    await record_artifact(db, sha256, size, content_type, stored=True)
+    if task_id is not None:
+        await add_ref(db, sha256, task_id)
+    await db.commit()
+    return {"s3_key": object_key, "size": size, "sha256": sha256, "deduplicated": deduplicated}
+
+
+@router.post("/upload")
+async def upload_artifact(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    file: UploadFile = File(...),
+    filename: str = Form(...),
+    content_type: str = Form(...),
+    content_addressed: bool = Form(False),
+    task_id: str | None = Form(None),
+) -> dict:
+    """Direct upload endpoint for artifacts like screenshots. With
+    `content_addressed` (implied by `task_id`) the file is stored under its
+    SHA-256 and identical content is stored only once"""
+    if task_id is not None:
+        content_addressed = True
+        task = (
+            await db.execute(
+                select(Task.id).where(Task.id == task_id,
+                                      Task.user_id == current_user.id)
+            )
+        ).scalar_one_or_none()
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
 
+    stored = await _store_upload(
+        db, file, filename, content_type, content_addressed, current_user.id, task_id)
     return {
         "success": True,
-        "url": public_url,
-        "s3_key": object_key,
-        "size": len(file_content)
+        "url": require_storage().public_url(stored["s3_key"]),
+        **stored,
     }
 
 
@@ -230,85 +263,128 @@ async def view_artifact(
     current_user: Annotated[User, Depends(get_current_user)]
 ) -> dict:
     """Get public URL for viewing an artifact"""
-    if settings.artifacts_bucket is None:
-        raise HTTPException(
-            status_code=500, detail="Artifacts bucket not configured")
-    
-    # Generate public URL for viewing
-    if settings.minio_external_endpoint:
-        public_url = f"{settings.minio_external_endpoint.rstrip('/')}/{settings.artifacts_bucket}/{object_key}"
-    else:
-        public_url = f"{settings.minio_endpoint.rstrip('/')}/{settings.artifacts_bucket}/{object_key}"
-    
+    storage = require_storage()
     return {
-        "public_url": public_url,
-        "s3_url": f"s3://{settings.artifacts_bucket}/{object_key}",
+        "public_url": storage.public_url(object_key),
+        "s3_url": storage.uri(object_key),
     }
 
 
+@router.get("/derived/{variant}/{object_key:path}")
+async def get_artifact_derivative(
+    variant: str,
+    object_key: str,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> Response:
+    """WebP thumbnail (`thumb`) or preview (`preview`) of an image artifact,
+    rendered on first request and cached in the bucket (app.thumbnails)"""
+    from PIL import Image, UnidentifiedImageError
+
+    if variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    storage = require_storage()
+
+    headers = {"Cache-Control": cache_control(object_key)}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = await derivative_etag(storage, object_key, variant)
+        if etag and (if_none_match.strip() == "*" or etag in if_none_match):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    try:
+        data, etag = await get_derivative(storage, object_key, variant)
+    except HTTPException:
+        raise
+    except ObjectNotFound as e:
+        raise HTTPException(status_code=404, detail="Artifact not found") from e
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise HTTPException(status_code=415, detail="Not an image") from e
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    return Response(
+        content=data, media_type=DERIVED_CONTENT_TYPE, headers={**headers, "ETag": etag})
+
+
 @router.post("/upload-temp")
 async def upload_artifact_temp(
+    db: Annotated[AsyncSession, Depends(get_db)],
     file: UploadFile = File(...),
     filename: str = Form(...),
     content_type: str = Form(...),
 ) -> dict:
     """Temporary upload endpoint without auth for testing screenshots"""
-    if settings.artifacts_bucket is None:
-        raise HTTPException(
-            status_code=500, detail="Artifacts bucket not configured")
+    stored = await _store_upload(db, file, filename, content_type)
 
-    # Use internal MinIO endpoint for upload
-    s3 = get_s3_client()
-    if s3 is None:
-        raise HTTPException(
-            status_code=500, detail="S3 client not available")
+    return {
+        "success": True,
+        "url": require_storage().public_url(stored["s3_key"]),
+        **stored,
+    }
 
-    # Ensure bucket exists
-    try:
-        await run_s3_operation(partial(s3.head_bucket, Bucket=settings.artifacts_bucket))
-    except HTTPException:
-        raise  # Re-raise timeout errors
-    except Exception:
-        # Bucket doesn't exist, create it
-        try:
-            await run_s3_operation(partial(s3.create_bucket, Bucket=settings.artifacts_bucket))
-        except HTTPException:
-            raise  # Re-raise timeout errors
-        except Exception:
-            pass
 
-    # Generate object key
-    object_key = filename
+def _local_storage() -> ArtifactStorage:
+    storage = get_storage()
+    if storage is None or storage.kind != "local":
+        raise HTTPException(status_code=404, detail="Not found")
+    return storage
 
-    # Read file content
-    file_content = await file.read()
 
-    # Upload to S3
-    try:
-        await run_s3_operation(
-            partial(
-                s3.put_object,
-                Bucket=settings.artifacts_bucket,
-                Key=object_key,
-                Body=file_content,
-                ContentType=content_type
-            )
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to upload file: {str(e)}") from e
+@router.put("/files/{object_key:path}")
+async def put_local_artifact(
+    object_key: str,
+    request: Request,
+    expires: int,
+    size: int,
+    signature: str,
+    content_type: str | None = None,
+    sha256: str | None = None,
+) -> Response:
+    """Upload target of presigned URLs of the local backend (app.storage);
+    the signature stands in for auth"""
+    storage = _local_storage()
+    expected = upload_signature(object_key, expires, size, content_type, sha256)
+    if not hmac.compare_digest(expected, signature):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    if expires < time.time():
+        raise HTTPException(status_code=403, detail="Upload URL expired")
+    length = request.headers.get("content-length")
+    if length is not None:
+        try:
+            matches = int(length) == size
+        except ValueError:
+            matches = False
+        if not matches:
+            raise HTTPException(status_code=400, detail="Content-Length does not match")
 
-    # Generate public URL using external endpoint
-    if settings.minio_external_endpoint:
-        public_url = f"{settings.minio_external_endpoint.rstrip('/')}/{settings.artifacts_bucket}/{object_key}"
-    else:
-        public_url = f"{settings.minio_endpoint.rstrip('/')}/{settings.artifacts_bucket}/{object_key}"
+    chunks = request.stream()
+    received = 0
 
-    return {
-        "success": True,
-        "url": public_url,
-        "s3_key": object_key,
-        "size": len(file_content)
-    }
+    async def read(_: int) -> bytes:
+        nonlocal received
+        try:
+            chunk = await anext(chunks)
+        except StopAsyncIteration:
+            return b""
+        received += len(chunk)
+        if received > size:
+            raise ValueError("Body is larger than presigned")
+        return chunk
+
+    await _ensure_artifacts_bucket(storage)
+    try:
+        stored = await storage.save(object_key, read, content_type, sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if stored != size:
+        await storage.delete([object_key])
+        raise HTTPException(status_code=400, detail="Body is smaller than presigned")
+    return Response(status_code=200, headers={"ETag": await storage.etag(object_key) or ""})
+
+
+@router.api_route("/files/{object_key:path}", methods=["GET", "HEAD"])
+async def get_local_artifact(object_key: str, request: Request) -> Response:
+    """Public artifact URL of the local backend, like a public bucket:
+    Range, If-None-Match and If-Modified-Since are supported"""
+    storage = _local_storage()
+    return await storage.response(object_key, request)
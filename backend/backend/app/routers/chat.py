@@ -6,27 +6,50 @@ import re
 from typing import Annotated, List
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app.config import settings
 from app.db import get_db
 from app.deps import get_current_user
-from app.models import User, ChatSession, ChatMessage, Device
+from app.models import ActionLog, User, ChatSession, ChatMessage, Device
 from app.schemas import (
     ChatSessionCreate,
     ChatSessionResponse,
     ChatMessageCreate,
     ChatMessageResponse,
+    ChatSearchHit,
     ChatSessionWithMessages,
 )
+from app.pagination import (
+    NEXT_CURSOR_HEADER,
+    encode_score_cursor,
+    paginate,
+    set_next_cursor,
+)
 from app.routing import publish_task_envelope
+from app.search import search_chat_messages
 from app.security import sign_message_hmac
+from app.task_events import emit_task_event
+from app.task_latency import envelope_time
+from app.task_watch import task_status_hub
+from app.thumbnails import preview_url
 
 router = APIRouter()
 
 
+def extract_screenshot_url(results: list[dict | None]) -> str | None:
+    """Публичный URL скриншота из результатов действий задачи"""
+    for result in results:
+        output = (result or {}).get("result") or {}
+        for key in ("screenshot_path", "screenshot_url", "public_url", "url"):
+            value = output.get(key)
+            if isinstance(value, str) and value.startswith("http"):
+                return value
+    return None
+
+
 @router.post("/sessions", response_model=ChatSessionResponse, status_code=201)
 async def create_chat_session(
     payload: ChatSessionCreate,
@@ -78,27 +101,28 @@ async def create_chat_session(
 
 @router.get("/sessions", response_model=List[ChatSessionResponse])
 async def list_chat_sessions(
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db)],
     limit: int = Query(default=50, le=100),
     offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
     active_only: bool = Query(default=True),
 ) -> List[ChatSessionResponse]:
     """Получение списка чат-сессий пользователя"""
 
-    query = select(ChatSession, func.count(ChatMessage.id).label("message_count")).outerjoin(
-        ChatMessage, ChatSession.id == ChatMessage.session_id
-    ).where(ChatSession.user_id == current_user.id)
+    query = select(ChatSession).where(ChatSession.user_id == current_user.id)
 
     if active_only:
         query = query.where(ChatSession.is_active == True)
 
-    query = query.group_by(ChatSession.id).order_by(
-        desc(ChatSession.updated_at)
-    ).limit(limit).offset(offset)
+    query = paginate(
+        query, ChatSession.updated_at, ChatSession.id, limit, cursor, offset,
+    )
 
     result = await db.execute(query)
-    sessions_with_counts = result.all()
+    sessions = result.scalars().all()
+    set_next_cursor(response, sessions, limit, sort_attr="updated_at")
 
     return [
         ChatSessionResponse(
@@ -110,24 +134,26 @@ async def list_chat_sessions(
             updated_at=session.updated_at,
             is_active=session.is_active,
             metadata=session.meta_data,
-            message_count=message_count,
+            message_count=session.message_count,
+            last_message_at=session.last_message_at,
         )
-        for session, message_count in sessions_with_counts
+        for session in sessions
     ]
 
 
 @router.get("/sessions/{session_id}", response_model=ChatSessionWithMessages)
 async def get_chat_session(
     session_id: uuid.UUID,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db)],
+    limit: int = Query(default=50, le=500),
+    cursor: str | None = Query(default=None),
 ) -> ChatSessionWithMessages:
-    """Получение чат-сессии с сообщениями"""
+    """Получение чат-сессии с последними сообщениями"""
 
     result = await db.execute(
-        select(ChatSession)
-        .options(selectinload(ChatSession.messages))
-        .where(
+        select(ChatSession).where(
             ChatSession.id == session_id,
             ChatSession.user_id == current_user.id
         )
@@ -137,8 +163,14 @@ async def get_chat_session(
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
 
-    # Сортируем сообщения по времени создания
-    messages = sorted(session.messages, key=lambda m: m.created_at)
+    # Хвост сессии: последние `limit` сообщений, курсор ведет к более старым
+    messages_result = await db.execute(paginate(
+        select(ChatMessage).where(ChatMessage.session_id == session_id),
+        ChatMessage.created_at, ChatMessage.id, limit, cursor,
+    ))
+    page = messages_result.scalars().all()
+    set_next_cursor(response, page, limit)
+    messages = list(reversed(page))
 
     return ChatSessionWithMessages(
         id=session.id,
@@ -149,6 +181,8 @@ async def get_chat_session(
         updated_at=session.updated_at,
         is_active=session.is_active,
         metadata=session.meta_data,
+        message_count=session.message_count,
+        last_message_at=session.last_message_at,
         messages=[
             ChatMessageResponse(
                 id=msg.id,
@@ -249,13 +283,6 @@ async def update_chat_session(
     await db.commit()
     await db.refresh(session)
 
-    # Получаем количество сообщений
-    message_count_result = await db.execute(
-        select(func.count(ChatMessage.id)).where(
-            ChatMessage.session_id == session_id)
-    )
-    message_count = message_count_result.scalar() or 0
-
     return ChatSessionResponse(
         id=session.id,
         user_id=session.user_id,
@@ -265,7 +292,8 @@ async def update_chat_session(
         updated_at=session.updated_at,
         is_active=session.is_active,
         metadata=session.meta_data,
-        message_count=message_count,
+        message_count=session.message_count,
+        last_message_at=session.last_message_at,
     )
 
 
@@ -297,10 +325,12 @@ async def delete_chat_session(
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
 async def list_messages(
     session_id: uuid.UUID,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db)],
     limit: int = Query(default=100, le=500),
     offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
 ) -> List[ChatMessageResponse]:
     """Получение сообщений чата с пагинацией"""
 
@@ -317,14 +347,13 @@ async def list_messages(
         raise HTTPException(status_code=404, detail="Chat session not found")
 
     # Получаем сообщения
-    messages_result = await db.execute(
-        select(ChatMessage)
-        .where(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at)
-        .limit(limit)
-        .offset(offset)
-    )
+    messages_result = await db.execute(paginate(
+        select(ChatMessage).where(ChatMessage.session_id == session_id),
+        ChatMessage.created_at, ChatMessage.id, limit, cursor, offset,
+        descending=False,
+    ))
     messages = messages_result.scalars().all()
+    set_next_cursor(response, messages, limit)
 
     return [
         ChatMessageResponse(
@@ -340,6 +369,40 @@ async def list_messages(
     ]
 
 
+@router.get("/search", response_model=List[ChatSearchHit])
+async def search_messages(
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    q: str = Query(min_length=1, max_length=256),
+    session_id: uuid.UUID | None = Query(default=None),
+    limit: int = Query(default=20, le=100),
+    cursor: str | None = Query(default=None),
+) -> List[ChatSearchHit]:
+    """Полнотекстовый поиск по сообщениям пользователя, лучшие совпадения первыми"""
+
+    rows = await search_chat_messages(
+        db, current_user.id, q, limit, session_id=session_id, cursor=cursor)
+    if len(rows) >= limit:
+        last, _, rank, _ = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_score_cursor(rank, last.id)
+
+    return [
+        ChatSearchHit(
+            id=msg.id,
+            session_id=msg.session_id,
+            session_title=title,
+            role=msg.role,
+            content=msg.content,
+            snippet=snippet,
+            rank=rank,
+            created_at=msg.created_at,
+            task_id=msg.task_id,
+        )
+        for msg, title, rank, snippet in rows
+    ]
+
+
 class AgentChatRequest(BaseModel):
     message: str
     session_id: uuid.UUID | None = None
@@ -412,40 +475,46 @@ async def chat_with_agent(
                 db.add(task)
                 await db.commit()
                 await db.refresh(task)
+                await emit_task_event("created", task)
 
                 # Отправляем задачу на устройство
                 envelope = {
                     "type": "task.exec",
                     "task_id": str(task.id),
+                    "queued_at": envelope_time(task.created_at),
                     "issued_at": datetime.now(timezone.utc).isoformat(),
                     "actions": task.payload.get("actions", []),
                 }
                 envelope["signature"] = sign_message_hmac(envelope)
-                await publish_task_envelope(str(request.device_id), envelope)
-
-                task_created = True
-                task_id = str(task.id)
-                response_content = "📸 Делаю скриншот экрана..."
-                
-                # Ждем немного для обработки задачи и пытаемся получить screenshot URL
-                import asyncio
-                await asyncio.sleep(3)  # Даем время агенту обработать задачу
-                
-                # Проверяем результат задачи
-                await db.refresh(task)
-                if task.status == "completed" and task.result:
-                    # Извлекаем screenshot_path из результата
-                    results = task.result.get("results", [])
-                    for result in results:
-                        if result.get("action_type") == "screenshot" and result.get("result"):
-                            screenshot_path = result["result"].get("screenshot_path")
-                            if screenshot_path and screenshot_path.startswith("http"):
-                                screenshot_url = screenshot_path
-                                response_content = f"✅ Скриншот готов!\n\n![Screenshot]({screenshot_url})"
-                                break
-                    
-                    if not screenshot_url:
+                # Подписываемся до отправки, чтобы не пропустить быстрый результат
+                with task_status_hub.subscribe(task.id) as watch:
+                    await publish_task_envelope(str(request.device_id), envelope)
+
+                    task_created = True
+                    task_id = str(task.id)
+                    response_content = "📸 Делаю скриншот экрана..."
+
+                    # Ждем результата от устройства: ответ уходит сразу после task.result
+                    finished = await watch.wait_finished(
+                        settings.chat_screenshot_wait_seconds)
+
+                if finished is not None and finished.get("status") == "completed":
+                    # Результаты действий хранятся в action_logs
+                    results = (await db.execute(
+                        select(ActionLog.result).where(ActionLog.task_id == task.id)
+                    )).scalars().all()
+                    screenshot_url = extract_screenshot_url(results)
+                    if screenshot_url:
+                        # Превью WebP вместо полноразмерного PNG, ссылка ведет на оригинал
+                        preview = await preview_url(screenshot_url)
+                        image = f"![Screenshot]({preview or screenshot_url})"
+                        if preview:
+                            image = f"[{image}]({screenshot_url})"
+                        response_content = f"✅ Скриншот готов!\n\n{image}"
+                    else:
                         response_content = "✅ Скриншот выполнен, но изображение недоступно"
+                elif finished is not None:
+                    response_content = "⚠️ Не удалось сделать скриншот"
 
         else:
             response_content = "⚠️ Для скриншота нужно подключить устройство"
@@ -492,11 +561,13 @@ async def chat_with_agent(
                 db.add(task)
                 await db.commit()
                 await db.refresh(task)
+                await emit_task_event("created", task)
 
                 # Отправляем задачу на устройство
                 envelope = {
                     "type": "task.exec",
                     "task_id": str(task.id),
+                    "queued_at": envelope_time(task.created_at),
                     "issued_at": datetime.now(timezone.utc).isoformat(),
                     "actions": task.payload.get("actions", []),
                 }
@@ -14,7 +14,7 @@ import sys
 from datetime import datetime, timedelta, timezone
 from typing import Annotated, Dict, Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy import select, func, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -22,6 +22,8 @@ from app.db import get_db
 from app.deps import get_current_user
 from app.models import Device, Task, ActionLog, User, TaskStatus
 from app.clients import get_redis
+from app.pagination import paginate, set_next_cursor
+from app.system_stats import system_stats
 from app.config import settings
 from app.routers.ws import clear_all_blocks
 
@@ -129,20 +131,20 @@ async def get_database_status(
 
 @router.get("/logs", response_model=List[Dict[str, Any]])
 async def get_logs(
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
     limit: int = Query(default=50, le=200),
+    cursor: str | None = Query(default=None),
 ) -> List[Dict[str, Any]]:
     """Get recent action logs."""
 
-    query = (
-        select(ActionLog)
-        .order_by(desc(ActionLog.created_at))
-        .limit(limit)
-    )
+    query = paginate(
+        select(ActionLog), ActionLog.created_at, ActionLog.id, limit, cursor)
 
     result = await db.execute(query)
     logs = result.scalars().all()
+    set_next_cursor(response, logs, limit)
 
     return [
         {
@@ -298,34 +300,12 @@ async def list_tasks_debug(
 
 @router.get("/system/stats", response_model=Dict[str, Any])
 async def get_system_stats(
-    db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> Dict[str, Any]:
     """Get system statistics."""
 
-    # Count entities
-    users_count = await db.scalar(select(func.count(User.id)))
-    devices_count = await db.scalar(select(func.count(Device.id)))
-    tasks_count = await db.scalar(select(func.count(Task.id)))
-
-    # Task status breakdown
-    status_counts = {}
-    for status in TaskStatus:
-        count = await db.scalar(select(func.count(Task.id)).where(Task.status == status.value))
-        status_counts[status.value] = count or 0
-
-    # Recent activity (last 24 hours)
-    yesterday = datetime.now(timezone.utc) - timedelta(hours=24)
-
-    recent_tasks = await db.scalar(
-        select(func.count(Task.id)).where(
-            Task.created_at >= yesterday.replace(tzinfo=None))
-    )
-
-    recent_devices = await db.scalar(
-        select(func.count(Device.id)).where(
-            Device.created_at >= yesterday.replace(tzinfo=None))
-    )
+    # Database counts come from the background snapshot; Redis is live
+    stats = await system_stats.get()
 
     # Redis stats
     redis_stats = {}
@@ -349,15 +329,19 @@ async def get_system_stats(
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "environment": settings.environment,
         "node_id": settings.node_id,
+        "snapshot_at": stats["snapshot_at"],
         "counts": {
-            "users": users_count or 0,
-            "devices": devices_count or 0,
-            "tasks": tasks_count or 0,
+            "users": stats["users"],
+            "devices": stats["devices"],
+            "tasks": stats["tasks"],
+        },
+        "task_status_breakdown": {
+            status.value: stats["tasks_by_status"].get(status.value, 0)
+            for status in TaskStatus
         },
-        "task_status_breakdown": status_counts,
         "recent_activity_24h": {
-            "new_tasks": recent_tasks or 0,
-            "new_devices": recent_devices or 0,
+            "new_tasks": stats["recent_tasks_24h"],
+            "new_devices": stats["recent_devices_24h"],
         },
         "redis": redis_stats,
     }
@@ -454,20 +438,20 @@ async def get_online_devices(
 
 @router.get("/logs/recent", response_model=List[Dict[str, Any]])
 async def get_recent_logs(
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
     limit: int = Query(default=50, le=200),
+    cursor: str | None = Query(default=None),
 ) -> List[Dict[str, Any]]:
     """Get recent action logs for debugging."""
 
-    query = (
-        select(ActionLog)
-        .order_by(desc(ActionLog.created_at))
-        .limit(limit)
-    )
+    query = paginate(
+        select(ActionLog), ActionLog.created_at, ActionLog.id, limit, cursor)
 
     result = await db.execute(query)
     logs = result.scalars().all()
+    set_next_cursor(response, logs, limit)
 
     return [
         {
@@ -16,6 +16,7 @@ from app.config import settings
 from app.db import get_db
 from app.deps import get_current_user
 from app.models import Device, IdempotencyKey, User
+from app.response_cache import bump_cache_version
 from app.schemas import (
     DeviceEnrollRequest,
     DeviceEnrollResponse,
@@ -104,6 +105,7 @@ async def enroll_device(
         else:
             await db.commit()
 
+    await bump_cache_version(device.user_id)
     token, jti, kid = create_device_token(str(device.id))
     await store_active_device_token(str(device.id), jti)
     expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
@@ -175,6 +177,7 @@ async def create_device(
     )
     db.add(device)
     await db.commit()
+    await bump_cache_version(device.user_id)
 
     return {
         "id": device.id,
@@ -264,3 +267,43 @@ async def get_device(
         "connection_status": d.connection_status,
         "presence": presence,
     }
+
+
+@router.get("/{device_id}/health/history", response_model=dict)
+async def get_device_health_history(
+    device_id: uuid.UUID,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    hours: int = Query(default=24, ge=1, le=168),
+    bucket_minutes: int = Query(default=15, ge=1, le=1440),
+):
+    """Downsampled health trend for a device (min/max/avg per bucket)"""
+    res = await db.execute(
+        select(Device.id).where(Device.id == device_id,
+                                Device.user_id == current_user.id)
+    )
+    if res.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    from app.clients import get_redis
+    from app.device_health import downsample_health_history, health_history_key
+
+    until = datetime.now(timezone.utc)
+    since = until - timedelta(hours=hours)
+    redis = get_redis()
+    samples = []
+    if redis is not None:
+        try:
+            samples = await redis.xrange(
+                health_history_key(str(device_id)),
+                min=str(int(since.timestamp() * 1000)),
+                max="+",
+            )
+        except Exception:
+            samples = []
+    return {
+        "device_id": device_id,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "bucket_minutes": bucket_minutes,
+        "buckets": downsample_health_history(samples, since, bucket_minutes * 60),
+    }
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.responses import FileResponse
 from typing import Annotated
 import os
@@ -6,12 +6,15 @@ from urllib.parse import unquote
 
 from app.deps import get_current_user
 from app.models import User
+from app.thumbnails import local_derivative
 
 router = APIRouter()
 
 @router.get("/screenshot")
 async def serve_screenshot(
+    request: Request,
     path: str = Query(..., description="Absolute path to screenshot file"),
+    variant: str | None = Query(None, description="thumb или preview: WebP вместо оригинала"),
     current_user: Annotated[User, Depends(get_current_user)] = None
 ):
     """Отдает скриншот по абсолютному пути (только для разработки)"""
@@ -31,6 +34,10 @@ async def serve_screenshot(
     if not file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
         raise HTTPException(status_code=400, detail="Not an image file")
     
+    if variant:
+        return await local_derivative(
+            file_path, variant, request.headers.get("if-none-match"))
+
     return FileResponse(
         file_path, 
         media_type="image/png",
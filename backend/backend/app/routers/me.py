@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import get_db
 from app.deps import get_current_user
 from app.models import Device, Task, ActionLog, User
+from app.response_cache import cached_response
 
 
 router = APIRouter()
@@ -171,34 +172,37 @@ async def my_statistics(
     db: Annotated[AsyncSession, Depends(get_db)],
     user: Annotated[User, Depends(get_current_user)],
 ) -> Dict[str, Any]:
-    # Get total counts
-    total_devices = await db.scalar(select(func.count(Device.id)).where(Device.user_id == user.id))
-    total_tasks = await db.scalar(select(func.count(Task.id)).where(Task.user_id == user.id))
-
-    # Get successful tasks count
-    successful_tasks = await db.scalar(
-        select(func.count(Task.id)).where(
-            and_(Task.user_id == user.id, Task.status == "completed")
+    async def compute() -> Dict[str, Any]:
+        # Get total counts
+        total_devices = await db.scalar(select(func.count(Device.id)).where(Device.user_id == user.id))
+        total_tasks = await db.scalar(select(func.count(Task.id)).where(Task.user_id == user.id))
+
+        # Get successful tasks count
+        successful_tasks = await db.scalar(
+            select(func.count(Task.id)).where(
+                and_(Task.user_id == user.id, Task.status == "completed")
+            )
         )
-    )
-
-    # Calculate success rate
-    success_rate = 0.0
-    if total_tasks and total_tasks > 0:
-        success_rate = (successful_tasks or 0) / total_tasks
-
-    # Get tasks in last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_tasks = await db.scalar(
-        select(func.count(Task.id)).where(
-            and_(Task.user_id == user.id, Task.created_at >= thirty_days_ago)
+
+        # Calculate success rate
+        success_rate = 0.0
+        if total_tasks and total_tasks > 0:
+            success_rate = (successful_tasks or 0) / total_tasks
+
+        # Get tasks in last 30 days
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        recent_tasks = await db.scalar(
+            select(func.count(Task.id)).where(
+                and_(Task.user_id == user.id, Task.created_at >= thirty_days_ago)
+            )
         )
-    )
 
-    return {
-        "total_devices": total_devices or 0,
-        "total_tasks": total_tasks or 0,
-        "success_rate": round(success_rate, 2),
-        "successful_tasks": successful_tasks or 0,
-        "recent_tasks_30d": recent_tasks or 0,
-    }
+        return {
+            "total_devices": total_devices or 0,
+            "total_tasks": total_tasks or 0,
+            "success_rate": round(success_rate, 2),
+            "successful_tasks": successful_tasks or 0,
+            "recent_tasks_30d": recent_tasks or 0,
+        }
+
+    return await cached_response("me.statistics", compute, user_id=user.id)
@@ -1,43 +1,86 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import Annotated
+import asyncio
 import os
-from pathlib import Path
+from mimetypes import guess_type
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
 from app.deps import get_current_user
-from app.models import User
+from app.models import Task, User
+from app.storage import ObjectNotFound, require_storage
+from app.thumbnails import DERIVED_CONTENT_TYPE, VARIANTS, derived_key, get_derivative
 
 router = APIRouter()
 
-# Временное хранилище путей к скриншотам
-screenshot_storage = {}
+
+def _screenshot_key(task_id: str) -> str:
+    # Одна запись на задачу, как раньше; хранится в app.storage и переживает рестарт
+    return f"screenshots/{task_id}"
+
+
+async def _own_task(db: AsyncSession, task_id: str, user: User) -> None:
+    task = (
+        await db.execute(
+            select(Task.id).where(Task.id == task_id, Task.user_id == user.id)
+        )
+    ).scalar_one_or_none()
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
 
 @router.post("/store")
 async def store_screenshot_path(
     task_id: str,
     screenshot_path: str,
-    current_user: Annotated[User, Depends(get_current_user)]
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
 ):
-    """Сохраняет путь к скриншоту для задачи"""
-    screenshot_storage[task_id] = screenshot_path
+    """Сохраняет скриншот задачи в хранилище артефактов"""
+    await _own_task(db, task_id, current_user)
+    if not os.path.isfile(screenshot_path):
+        raise HTTPException(status_code=404, detail="Screenshot file not found")
+
+    storage = require_storage()
+    await storage.ensure()
+    with open(screenshot_path, "rb") as f:
+        async def read(size: int) -> bytes:
+            return await asyncio.to_thread(f.read, size)
+
+        await storage.save(
+            _screenshot_key(task_id), read,
+            guess_type(screenshot_path)[0] or "image/png")
+    # Превью прошлого скриншота больше не актуальны
+    await storage.delete([derived_key(_screenshot_key(task_id), v) for v in VARIANTS])
     return {"status": "stored", "task_id": task_id}
 
 @router.get("/{task_id}")
 async def get_screenshot(
     task_id: str,
-    current_user: Annotated[User, Depends(get_current_user)]
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    variant: str | None = Query(None, description="thumb или preview: WebP вместо оригинала"),
 ):
     """Возвращает скриншот по task_id"""
-    screenshot_path = screenshot_storage.get(task_id)
-    
-    if not screenshot_path:
+    storage = require_storage()
+    key = _screenshot_key(task_id)
+
+    if variant:
+        if variant not in VARIANTS:
+            raise HTTPException(status_code=404, detail="Unknown variant")
+        try:
+            data, etag = await get_derivative(storage, key, variant)
+        except ObjectNotFound as e:
+            raise HTTPException(status_code=404, detail="Screenshot not found") from e
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+            return Response(status_code=304, headers=headers)
+        return Response(content=data, media_type=DERIVED_CONTENT_TYPE, headers=headers)
+
+    if not await storage.exists(key):
         raise HTTPException(status_code=404, detail="Screenshot not found")
-    
-    if not os.path.exists(screenshot_path):
-        raise HTTPException(status_code=404, detail="Screenshot file not found")
-    
-    return FileResponse(
-        screenshot_path, 
-        media_type="image/png",
-        filename=f"screenshot_{task_id}.png"
-    )
+    # Скриншот задачи перезаписывается, поэтому кэш всегда перепроверяется
+    return await storage.response(key, request, {"Cache-Control": "private, no-cache"})
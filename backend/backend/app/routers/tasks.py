@@ -1,28 +1,60 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import uuid
 from datetime import datetime, timezone
+from types import SimpleNamespace
 import asyncio
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from sqlalchemy import Select, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from sqlalchemy import Select, delete, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.db import get_db
 from app.deps import get_current_user
 from app.models import IdempotencyKey, Task, Device
-from app.schemas import TaskCreateRequest, TaskResponse
-from app.clients import publish_event, get_kafka_producer
+from app.schemas import (
+    TaskBatchCreateRequest,
+    TaskBatchResponse,
+    TaskCreateRequest,
+    TaskResponse,
+)
+from app.clients import get_redis, publish_event, get_kafka_producer
+from app.idempotency import claim_idempotency_key
+from app.task_events import emit_task_event, emit_task_events
+from app.task_latency import envelope_time
+from app.task_watch import TERMINAL_STATUSES, task_status_hub
 from app.security import sign_message_hmac
-from app.routing import publish_task_envelope
+from app.routing import publish_task_envelope, publish_task_envelopes
 from app.metrics import tasks_created_total
+from app.pagination import paginate, set_next_cursor
 from app.ai_safety import SafetyPolicy, RiskLevel
 from app.routers.notifications import notification_manager
 
 
 router = APIRouter()
 
+BATCH_ENDPOINT = "/v1/tasks/batch"
+
+
+def _request_body_hash(payload: TaskCreateRequest, **extra) -> str:
+    hash_payload = {
+        "device_id": str(payload.device_id),
+        "title": payload.title,
+        "description": payload.description,
+        "metadata": payload.metadata or {},
+        **extra,
+    }
+    return uuid.uuid5(
+        uuid.NAMESPACE_OID, json.dumps(
+            hash_payload, sort_keys=True, default=str)
+    ).hex
+
 
 @router.post("/", response_model=TaskResponse, status_code=201)
 async def create_task(
@@ -36,6 +68,29 @@ async def create_task(
         raise HTTPException(
             status_code=400, detail="Idempotency-Key header required")
 
+    # Duplicates are answered from Redis; Postgres stays the durable record
+    request_body_hash = _request_body_hash(payload)
+    claim = await claim_idempotency_key(
+        "/v1/tasks", user.id, idempotency_key, request_body_hash)
+    if claim.response is not None:
+        return TaskResponse(**claim.response)
+    try:
+        response = await _create_task(
+            payload, db, user, idempotency_key, request_body_hash)
+    except BaseException:
+        await claim.release()
+        raise
+    await claim.complete(response)
+    return response
+
+
+async def _create_task(
+    payload: TaskCreateRequest,
+    db: AsyncSession,
+    user,
+    idempotency_key: str,
+    request_body_hash: str,
+) -> TaskResponse:
     # Validate device exists and belongs to user
     device_query = select(Device).where(
         Device.id == payload.device_id, Device.user_id == user.id)
@@ -44,17 +99,7 @@ async def create_task(
         raise HTTPException(
             status_code=404, detail="Device not found or access denied")
 
-    # Strong idempotency: claim key (ensure JSON-serializable payload)
-    hash_payload = {
-        "device_id": str(payload.device_id),
-        "title": payload.title,
-        "description": payload.description,
-        "metadata": payload.metadata or {},
-    }
-    request_body_hash = uuid.uuid5(
-        uuid.NAMESPACE_OID, json.dumps(
-            hash_payload, sort_keys=True, default=str)
-    ).hex
+    # Strong idempotency: claim key
     # Check if idempotency key already exists
     q: Select[IdempotencyKey] = select(IdempotencyKey).where(
         IdempotencyKey.user_id == user.id,
@@ -256,6 +301,7 @@ async def create_task(
     )
     await db.commit()
     tasks_created_total.inc()
+    await emit_task_event("created", task)
 
     # publish task.created (Redis and Kafka)
     evt = {
@@ -281,6 +327,7 @@ async def create_task(
     envelope = {
         "type": "task.exec",
         "task_id": task_id,
+        "queued_at": envelope_time(task.created_at),
         "issued_at": datetime.now(timezone.utc).isoformat(),
         "actions": task.payload.get("actions", []),
     }
@@ -317,11 +364,244 @@ async def create_task(
     )
 
 
-@router.get("/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: str, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/batch", response_model=TaskBatchResponse, status_code=201)
+async def create_tasks_batch(
+    payload: TaskBatchCreateRequest,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+    idempotency_key: str | None = Header(
+        default=None, alias="Idempotency-Key"),
+):
+    """Create up to 1000 tasks in one transaction.
+
+    Every task gets an idempotency claim under the batch key (hashed with its
+    position), so retrying the same batch returns the tasks created first.
+    """
+    if not idempotency_key:
+        raise HTTPException(
+            status_code=400, detail="Idempotency-Key header required")
+    user_id = user.id
+    hashes = [_request_body_hash(item, batch_index=i)
+              for i, item in enumerate(payload.tasks)]
+
+    claim = await claim_idempotency_key(
+        BATCH_ENDPOINT, user_id, idempotency_key,
+        hashlib.sha1("".join(hashes).encode()).hexdigest())
+    if claim.response is not None:
+        return TaskBatchResponse(**claim.response)
+    try:
+        response = await _create_tasks_batch(
+            payload, db, user_id, idempotency_key, hashes)
+    except BaseException:
+        await claim.release()
+        raise
+    await claim.complete(response)
+    return response
+
+
+async def _create_tasks_batch(
+    payload: TaskBatchCreateRequest,
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    idempotency_key: str,
+    hashes: list[str],
+) -> TaskBatchResponse:
+    items = payload.tasks
+    replay = await _replay_batch(db, user_id, idempotency_key, hashes)
+    if replay is not None and None not in replay:
+        return TaskBatchResponse(tasks=replay)
+    # Items whose claimed task is gone (deleted, or dropped with its
+    # partition) are created again under fresh claims
+    stale = [h for h, task in zip(hashes, replay) if task is None] if replay else []
+    replay = replay or [None] * len(items)
+    todo = [index for index, task in enumerate(replay) if task is None]
+
+    # Validate all devices in one query
+    device_ids = {items[index].device_id for index in todo}
+    owned = set((await db.execute(
+        select(Device.id).where(
+            Device.id.in_(device_ids), Device.user_id == user_id)
+    )).scalars())
+    if owned != device_ids:
+        raise HTTPException(
+            status_code=404, detail="Device not found or access denied")
+
+    # AI Safety Analysis, once per distinct action list
+    analyses: dict[str, tuple[RiskLevel, list[str], bool]] = {}
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = []
+    for index in todo:
+        item = items[index]
+        actions = (item.metadata or {}).get("actions", [])
+        actions_key = json.dumps(actions, sort_keys=True, default=str)
+        if actions_key not in analyses:
+            risk_level, risk_reasons = SafetyPolicy.analyze_actions(actions)
+            if SafetyPolicy.should_block(risk_level):
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Task {index}: action blocked due to critical risk: "
+                           f"{'; '.join(risk_reasons)}"
+                )
+            analyses[actions_key] = (
+                risk_level, risk_reasons, SafetyPolicy.requires_approval(risk_level))
+        risk_level, risk_reasons, requires_approval = analyses[actions_key]
+        rows.append({
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "device_id": item.device_id,
+            "status": "awaiting_confirmation" if requires_approval else "queued",
+            "title": item.title,
+            "description": item.description,
+            "payload": {
+                "actions": actions,
+                "risk_analysis": {
+                    "risk_level": risk_level.value,
+                    "reasons": risk_reasons,
+                    "requires_approval": requires_approval
+                }
+            },
+            "idempotency_key": idempotency_key,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    # Tasks and their claims in one transaction
+    try:
+        if stale:
+            await db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.endpoint == BATCH_ENDPOINT,
+                IdempotencyKey.idem_key == idempotency_key,
+                IdempotencyKey.request_body_hash.in_(stale),
+            ))
+        await db.execute(insert(Task), rows)
+        await db.execute(insert(IdempotencyKey), [
+            {
+                "user_id": user_id,
+                "endpoint": BATCH_ENDPOINT,
+                "idem_key": idempotency_key,
+                "resource_type": "task",
+                "resource_id": row["id"],
+                "request_body_hash": hashes[index],
+            }
+            for row, index in zip(rows, todo)
+        ])
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request with the same key committed first
+        await db.rollback()
+        replay = await _replay_batch(db, user_id, idempotency_key, hashes)
+        if replay is None or None in replay:
+            raise HTTPException(
+                status_code=409, detail="Concurrent request detected. Please retry.")
+        return TaskBatchResponse(tasks=replay)
+
+    tasks_created_total.inc(len(rows))
+    tasks = [SimpleNamespace(**row) for row in rows]
+    await emit_task_events("created", tasks)
+    await _dispatch_batch(tasks)
+
+    created = iter(tasks)
+    return TaskBatchResponse(tasks=[
+        task or TaskResponse.model_validate(next(created), from_attributes=True)
+        for task in replay
+    ])
+
+
+async def _replay_batch(
+    db: AsyncSession, user_id: uuid.UUID, idempotency_key: str, hashes: list[str]
+) -> list[TaskResponse | None] | None:
+    """Tasks of an already committed batch, in request order; None for an
+    item whose task no longer exists"""
+    claims = dict((await db.execute(
+        select(IdempotencyKey.request_body_hash, IdempotencyKey.resource_id).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.endpoint == BATCH_ENDPOINT,
+            IdempotencyKey.idem_key == idempotency_key,
+        )
+    )).all())
+    if not claims:
+        return None
+    if len(claims) != len(hashes) or any(h not in claims for h in hashes):
+        raise HTTPException(
+            status_code=409,
+            detail="Idempotency-Key already used for a different batch")
+    tasks = {
+        t.id: t for t in (await db.execute(
+            select(Task).where(Task.id.in_(claims.values()))
+        )).scalars()
+    }
+    return [
+        TaskResponse.model_validate(tasks[claims[h]], from_attributes=True)
+        if claims[h] in tasks else None
+        for h in hashes
+    ]
+
+
+async def _dispatch_batch(tasks: list[SimpleNamespace]) -> None:
+    """Publish task.created events and deliver queued tasks, pipelined"""
+    at = datetime.now(timezone.utc).isoformat()
+    events = [
+        {
+            "type": "task.created",
+            "task_id": task.id,
+            "device_id": str(task.device_id),
+            "user_id": str(task.user_id),
+            "actions": task.payload.get("actions", []),
+            "at": at,
+        }
+        for task in tasks
+    ]
+    redis = get_redis()
+    if redis is not None:
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for evt in events:
+                pipe.publish("task.events", json.dumps(evt))
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to publish batch task events: {e}")
+    prod = await get_kafka_producer()
+    if prod is not None:
+        try:
+            # Enqueue everything, then wait for all acks together
+            acks = [await prod.send("task.created", json.dumps(evt).encode())
+                    for evt in events]
+            await asyncio.wait_for(asyncio.gather(*acks), timeout=2.0)
+        except Exception:
+            # Do not block API path on broker issues
+            pass
+
+    deliveries = []
+    for task in tasks:
+        if task.status == "awaiting_confirmation":
+            await notification_manager.notify_approval_needed(
+                str(task.user_id), task.id, task.title,
+                task.payload["risk_analysis"]["reasons"]
+            )
+            continue
+        envelope = {
+            "type": "task.exec",
+            "task_id": task.id,
+            "queued_at": envelope_time(task.created_at),
+            "issued_at": datetime.now(timezone.utc).isoformat(),
+            "actions": task.payload.get("actions", []),
+        }
+        envelope["signature"] = sign_message_hmac(envelope)
+        deliveries.append((str(task.device_id), envelope))
+    if deliveries:
+        await publish_task_envelopes(deliveries)
+    logger.info(f"Created batch of {len(tasks)} tasks ({len(deliveries)} queued)")
+
+
+async def _get_user_task(db: AsyncSession, task_id: str, user) -> Task:
     task = (await db.execute(select(Task).where(Task.id == task_id, Task.user_id == user.id))).scalar_one_or_none()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+def _task_response(task: Task) -> TaskResponse:
     return TaskResponse(
         id=task.id,
         user_id=task.user_id,
@@ -335,17 +615,88 @@ async def get_task(task_id: str, db: AsyncSession = Depends(get_db), user=Depend
     )
 
 
+@router.get("/{task_id}", response_model=TaskResponse)
+async def get_task(task_id: str, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+    return _task_response(await _get_user_task(db, task_id, user))
+
+
+@router.get("/{task_id}/wait", response_model=TaskResponse)
+async def wait_for_task(
+    task_id: str,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+    timeout: float = Query(default=30.0, gt=0, le=settings.task_wait_max_seconds),
+):
+    """Long-poll: return the task once it is completed, failed or cancelled,
+    or its current state after `timeout` seconds"""
+    with task_status_hub.subscribe(task_id) as watch:
+        task = await _get_user_task(db, task_id, user)
+        if task.status in TERMINAL_STATUSES:
+            return _task_response(task)
+        # Don't hold a pooled connection while waiting
+        await db.close()
+        await watch.wait_finished(timeout)
+        return _task_response(await _get_user_task(db, task_id, user))
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+) -> StreamingResponse:
+    """Server-sent events: the current status, then every status change
+    until the task finishes"""
+    watch = task_status_hub.subscribe(task_id)
+    try:
+        task = await _get_user_task(db, task_id, user)
+    except BaseException:
+        watch.close()
+        raise
+    current = {
+        "task_id": str(task.id),
+        "status": task.status,
+        "event": "current",
+        "at": envelope_time(task.updated_at),
+    }
+    await db.close()
+
+    async def stream():
+        try:
+            yield f"data: {json.dumps(current)}\n\n"
+            status = current["status"]
+            while status not in TERMINAL_STATUSES:
+                if await request.is_disconnected():
+                    return
+                event = await watch.next(settings.task_events_keepalive_seconds)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                status = event.get("status", status)
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            watch.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/")
 async def list_tasks(
+    response: Response,
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
     status: str | None = Query(default=None),
     device_id: str | None = Query(default=None),
     limit: int = Query(default=20, le=100),
     offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
 ) -> list[dict]:
-    q = select(Task).where(Task.user_id == user.id).order_by(
-        Task.created_at.desc())
+    q = select(Task).where(Task.user_id == user.id)
     if status:
         q = q.where(Task.status == status)
     if device_id:
@@ -354,8 +705,9 @@ async def list_tasks(
             q = q.where(Task.device_id == dev_uuid)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid device_id")
-    q = q.limit(limit).offset(offset)
+    q = paginate(q, Task.created_at, Task.id, limit, cursor, offset)
     rows = (await db.execute(q)).scalars().all()
+    set_next_cursor(response, rows, limit)
     return [
         {
             "id": t.id,
@@ -386,4 +738,5 @@ async def cancel_task(task_id: str, db: AsyncSession = Depends(get_db), user=Dep
                                                               updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
     )
     await db.commit()
+    await emit_task_event("cancelled", t, status="cancelled")
     return {"status": "cancelled", "task_id": t.id}
@@ -17,9 +17,18 @@ from app.db import AsyncSessionLocal
 from app.models import Device, Task
 from app.conn import register_connection, remove_connection, get_connection
 from app.routing import set_route, clear_route
+from app.task_events import emit_task_event
+from app.task_watch import task_progress_event, task_status_hub
+from app.task_latency import (
+    envelope_time,
+    observe_delivery,
+    observe_execution,
+    observe_queue_wait,
+)
 from sqlalchemy import select
 from loguru import logger
 from app.metrics import (
+    task_result_persist_seconds,
     ws_connections_total,
     ws_connections_current,
     ws_heartbeats_total,
@@ -336,7 +345,7 @@ async def agent_ws(websocket: WebSocket) -> None:
                     select(Task).where(
                         (Task.device_id == uuid.UUID(dev_id))
                         & (Task.status.in_(["queued", "assigned"]))
-                    )
+                    ).order_by(Task.created_at)
                 )
                 tasks = res.scalars().all()
                 logger.info(
@@ -356,6 +365,9 @@ async def agent_ws(websocket: WebSocket) -> None:
                         "issued_at": datetime.now(timezone.utc).isoformat(),
                         "actions": t.payload.get("actions", []),
                     }
+                    if t.status == "queued":
+                        # Redelivered (assigned) tasks already counted their queue wait
+                        envelope["queued_at"] = envelope_time(t.updated_at)
                     envelope["signature"] = sign_message_hmac(envelope)
                     try:
                         # Check if WebSocket is still connected before sending
@@ -366,8 +378,11 @@ async def agent_ws(websocket: WebSocket) -> None:
 
                         logger.info(f"Sending task {t.id} to device {dev_id}")
                         await ws.send_text(json.dumps(envelope))
+                        observe_queue_wait(envelope)
+                        observe_delivery(envelope)
                         logger.info(
                             f"Successfully sent task {t.id} to device {dev_id}")
+                        await emit_task_event("delivered", t, status="assigned")
                         if t.status == "queued":
                             await session.execute(
                                 Task.__table__.update()
@@ -432,7 +447,7 @@ async def agent_ws(websocket: WebSocket) -> None:
                     select(Task).where(
                         (Task.device_id == uuid.UUID(device_id))
                         & (Task.status.in_(["queued", "assigned"]))
-                    )
+                    ).order_by(Task.created_at)
                 )
                 tasks = res.scalars().all()
                 logger.info(
@@ -451,6 +466,9 @@ async def agent_ws(websocket: WebSocket) -> None:
                         "issued_at": datetime.now(timezone.utc).isoformat(),
                         "actions": t.payload.get("actions", []),
                     }
+                    if t.status == "queued":
+                        # Redelivered (assigned) tasks already counted their queue wait
+                        envelope["queued_at"] = envelope_time(t.updated_at)
                     envelope["signature"] = sign_message_hmac(envelope)
                     try:
                         # Check if WebSocket is still connected before sending
@@ -462,8 +480,11 @@ async def agent_ws(websocket: WebSocket) -> None:
                         logger.info(
                             f"Sending task {t.id} to device {device_id}")
                         await websocket.send_text(json.dumps(envelope))
+                        observe_queue_wait(envelope)
+                        observe_delivery(envelope)
                         logger.info(
                             f"Successfully sent task {t.id} to device {device_id}")
+                        await emit_task_event("delivered", t, status="assigned")
                         if t.status == "queued":
                             await session.execute(
                                 Task.__table__.update()
@@ -530,6 +551,8 @@ async def agent_ws(websocket: WebSocket) -> None:
                     async with AsyncSessionLocal() as session:
                         task_id = str(msg.get("task_id"))
                         results = msg.get("results") or []
+                        action_type = observe_execution(task_id, results)
+                        persist_started = time.perf_counter()
                         status_val = (
                             "completed"
                             if all(
@@ -557,7 +580,7 @@ async def agent_ws(websocket: WebSocket) -> None:
                                 )
                             except Exception:
                                 pass
-                        await session.execute(
+                        finished = (await session.execute(
                             Task.__table__.update()
                             .where(Task.id == task_id)
                             .values(
@@ -565,8 +588,16 @@ async def agent_ws(websocket: WebSocket) -> None:
                                 updated_at=datetime.now(
                                     timezone.utc).replace(tzinfo=None),
                             )
-                        )
+                            .returning(Task.id, Task.user_id, Task.device_id,
+                                       Task.status, Task.created_at)
+                        )).first()
                         await session.commit()
+                        task_result_persist_seconds.labels(
+                            action_type, settings.node_id
+                        ).observe(time.perf_counter() - persist_started)
+                        if finished is not None:
+                            await emit_task_event(
+                                status_val, finished, results=results)
 
                         # Create chat message with screenshot if available
                         try:
@@ -607,6 +638,14 @@ async def agent_ws(websocket: WebSocket) -> None:
                         except Exception:
                             # Best-effort; do not fail WS handling on chat enrichment issues
                             pass
+                elif mtype == "task.progress":
+                    # per-action progress, only relayed to task watchers
+                    if msg.get("task_id") and msg.get("action_id"):
+                        await task_status_hub.publish(task_progress_event(
+                            msg["task_id"], "progress",
+                            action_id=str(msg["action_id"]),
+                            action_status=msg.get("status"),
+                        ))
                 else:
                     # ignore unknown types
                     pass
@@ -10,6 +10,8 @@ from loguru import logger
 from app.clients import get_redis
 from app.config import settings
 from app.conn import get_connection
+from app.task_latency import observe_delivery, observe_queue_wait
+from app.task_watch import task_progress_event, task_status_hub
 
 
 ROUTE_TTL_SECONDS = 120
@@ -58,17 +60,45 @@ async def publish_task_envelope(device_id: str, envelope: dict[str, Any]) -> Non
     if redis is None:
         logger.warning("Redis not available for task delivery")
         return
+    observe_queue_wait(envelope)
     channel = f"deliver:task:{device_id}"
     logger.info(f"Publishing task {envelope.get('task_id')} to channel {channel}")
     await redis.publish(channel, json.dumps(envelope))
-    
+    await _deliver_direct(device_id, envelope)
+
+
+async def publish_task_envelopes(deliveries: list[tuple[str, dict[str, Any]]]) -> None:
+    """Publish many (device_id, envelope) pairs in one pipelined Redis round trip"""
+    redis = get_redis()
+    if redis is None:
+        logger.warning("Redis not available for task delivery")
+        return
+    pipe = redis.pipeline(transaction=False)
+    for device_id, envelope in deliveries:
+        observe_queue_wait(envelope)
+        pipe.publish(f"deliver:task:{device_id}", json.dumps(envelope))
+    await pipe.execute()
+    logger.info(f"Published {len(deliveries)} task envelopes")
+    for device_id, envelope in deliveries:
+        await _deliver_direct(device_id, envelope)
+
+
+async def _delivered(envelope: dict[str, Any]) -> None:
+    observe_delivery(envelope)
+    # Live deliveries leave the task queued (replayed on reconnect until the
+    # result arrives), so watchers get a delivery notice without a status
+    await task_status_hub.publish(
+        task_progress_event(envelope.get("task_id"), "delivered"))
+
+
+async def _deliver_direct(device_id: str, envelope: dict[str, Any]) -> None:
     # Fallback: try direct delivery if device is connected on this node
     try:
         ws = await get_connection(device_id)
         if ws is not None:
             logger.info(f"Attempting direct delivery of task {envelope.get('task_id')} to device {device_id}")
-            import json as json_lib
-            await ws.send_text(json_lib.dumps(envelope))
+            await ws.send_text(json.dumps(envelope))
+            await _delivered(envelope)
             logger.info(f"Successfully delivered task {envelope.get('task_id')} directly to device {device_id}")
     except Exception as e:
         logger.warning(f"Direct delivery failed for task {envelope.get('task_id')} to device {device_id}: {e}")
@@ -116,6 +146,7 @@ async def start_delivery_subscriber() -> None:
                         try:
                             logger.info(f"Direct delivery attempt for task {envelope.get('task_id')} to device {device_id}")
                             await ws.send_text(json.dumps(envelope))
+                            await _delivered(envelope)
                             logger.info(f"Direct delivery successful for task {envelope.get('task_id')} to device {device_id}")
                             continue
                         except Exception as e:
@@ -130,6 +161,7 @@ async def start_delivery_subscriber() -> None:
                 try:
                     logger.info(f"Delivering task {envelope.get('task_id')} to device {device_id}")
                     await ws.send_text(json.dumps(envelope))
+                    await _delivered(envelope)
                 except Exception as e:
                     logger.warning(f"Failed to deliver task to device {device_id}: {e}")
                     # Remove dead connection
@@ -11,6 +11,7 @@ from app.db import AsyncSessionLocal
 from app.models import ScheduledTask, Task, Device
 from app.ai_safety import SafetyPolicy
 from app.routers.notifications import notification_manager
+from app.task_events import emit_task_event
 
 
 class TaskScheduler:
@@ -136,6 +137,7 @@ class TaskScheduler:
             scheduled_task.cron_expression)
 
         await db.commit()
+        await emit_task_event("created", task)
 
         # Publish task for delivery
         from app.routing import publish_task_envelope
@@ -144,6 +146,7 @@ class TaskScheduler:
         envelope = {
             "type": "task.exec",
             "task_id": task_id,
+            "queued_at": now.isoformat(),
             "issued_at": now.isoformat(),
             "actions": actions,
         }
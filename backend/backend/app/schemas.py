@@ -127,10 +127,21 @@ class TaskResponse(BaseModel):
     updated_at: datetime
 
 
+class TaskBatchCreateRequest(BaseModel):
+    tasks: list[TaskCreateRequest] = Field(min_length=1, max_length=1000)
+
+
+class TaskBatchResponse(BaseModel):
+    tasks: list[TaskResponse]
+
+
 class ArtifactPresignRequest(BaseModel):
     task_id: str
     filename: str
     size: int = Field(gt=0, description="File size must be positive")
+    # Hex SHA-256 of the content: store content-addressed (app.content_store)
+    sha256: str | None = None
+    content_type: str | None = Field(default=None, max_length=128)
 
     @field_validator("filename")
     @classmethod
@@ -139,6 +150,28 @@ class ArtifactPresignRequest(BaseModel):
             raise ValueError("Filename cannot be empty")
         return v
 
+    @field_validator("sha256")
+    @classmethod
+    def validate_sha256(cls, v):
+        if v is None:
+            return v
+        v = v.lower()
+        if len(v) != 64 or any(c not in "0123456789abcdef" for c in v):
+            raise ValueError("sha256 must be 64 hex characters")
+        return v
+
+
+class ArtifactCommitRequest(BaseModel):
+    task_id: str
+    sha256: str
+    # ETag header of the presigned PUT response
+    etag: str = Field(min_length=1, max_length=128)
+
+    @field_validator("sha256")
+    @classmethod
+    def validate_sha256(cls, v):
+        return ArtifactPresignRequest.validate_sha256(v)
+
 
 # Chat Schemas
 class ChatSessionCreate(BaseModel):
@@ -157,6 +190,7 @@ class ChatSessionResponse(BaseModel):
     is_active: bool
     metadata: dict[str, Any] = Field(alias="meta_data")
     message_count: int = 0
+    last_message_at: datetime | None = None
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -188,11 +222,27 @@ class ChatSessionWithMessages(BaseModel):
     updated_at: datetime
     is_active: bool
     metadata: dict[str, Any] = Field(alias="meta_data")
+    message_count: int = 0
+    last_message_at: datetime | None = None
+    # Newest messages, oldest first; X-Next-Cursor pages further back
     messages: list[ChatMessageResponse]
 
     model_config = ConfigDict(populate_by_name=True)
 
 
+class ChatSearchHit(BaseModel):
+    id: _uuid.UUID
+    session_id: _uuid.UUID
+    session_title: str
+    role: Literal["user", "assistant", "system"]
+    content: str
+    # Matched fragments as escaped HTML, terms wrapped in <b>...</b>
+    snippet: str
+    rank: float
+    created_at: datetime
+    task_id: str | None = None
+
+
 # Agent API Schemas
 class AgentChatRequest(BaseModel):
     message: str = Field(min_length=1)
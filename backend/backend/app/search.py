@@ -0,0 +1,159 @@
+"""
+Full-text search over chat messages.
+
+`chat_messages.content_tsv` is a stored generated tsvector column with a GIN
+index (migration 6 in app.migrations). The `simple` configuration is used
+because chats mix Russian and English: words are lower-cased but not
+stemmed, and there are no stop words. Queries use `websearch_to_tsquery`
+syntax ("quoted phrases", `or`, `-exclude`). Results are ordered by
+`ts_rank_cd` with the message id as tie breaker and paged with a score
+cursor (app.pagination). Snippets are only built for the returned page.
+They are HTML: the message text is escaped and only the <b> highlight tags
+are markup.
+
+Other databases (SQLite) have no content_tsv; there every word of the query
+must occur in the message (case-insensitive substring match) and `-word`
+must not, all hits rank equally and the whole message is the snippet.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+import uuid
+from typing import Any, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import func, literal_column, not_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ChatMessage, ChatSession
+from app.pagination import decode_score_cursor
+
+
+CHAT_SEARCH_CONFIG = "simple"
+# ts_headline marks matches with these control characters, which are
+# removed from the message first; the snippet is escaped before they are
+# swapped for <b> tags
+_START_SEL, _STOP_SEL = "\x02", "\x03"
+SNIPPET_OPTIONS = (
+    f"StartSel={_START_SEL}, StopSel={_STOP_SEL}, MaxWords=30, MinWords=10, MaxFragments=2")
+
+
+def _snippet_html(headline: str) -> str:
+    """HTML snippet from a ts_headline result made with SNIPPET_OPTIONS"""
+    return html.escape(headline).replace(_START_SEL, "<b>").replace(_STOP_SEL, "</b>")
+
+
+def _query_terms(q: str) -> tuple[list[str], list[str]]:
+    """Words that must and must not (`-word`) occur; `or` is not supported"""
+    words = [w for w in q.replace('"', " ").split() if w.lower() != "or"]
+    required = [w for w in words if not w.startswith("-")]
+    excluded = [w[1:] for w in words if w.startswith("-") and len(w) > 1]
+    return required, excluded
+
+
+def _highlight(content: str, terms: list[str]) -> str:
+    content = content.replace(_START_SEL, "").replace(_STOP_SEL, "")
+    pattern = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE)
+    return _snippet_html(pattern.sub(lambda m: f"{_START_SEL}{m.group(0)}{_STOP_SEL}", content))
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_chat_messages(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    q: str,
+    limit: int,
+    session_id: uuid.UUID | None = None,
+    cursor: str | None = None,
+) -> Sequence[Any]:
+    """One page of the user's messages matching `q`, best match first.
+
+    Rows are (ChatMessage, session title, rank, snippet)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return await _search_substring(db, user_id, q, limit, session_id, cursor)
+
+    tsv = literal_column("chat_messages.content_tsv")
+    query = func.websearch_to_tsquery(CHAT_SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(tsv, query)
+
+    hits = (
+        select(ChatMessage.id.label("id"), rank.label("rank"))
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatSession.user_id == user_id, tsv.op("@@")(query))
+    )
+    if session_id is not None:
+        hits = hits.where(ChatMessage.session_id == session_id)
+    if cursor:
+        score, raw_id = decode_score_cursor(cursor)
+        try:
+            row_id = uuid.UUID(raw_id)
+        except (TypeError, ValueError, AttributeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        hits = hits.where(tuple_(rank, ChatMessage.id) < (score, row_id))
+    hits = hits.order_by(rank.desc(), ChatMessage.id.desc()).limit(limit).subquery()
+
+    page = (
+        select(
+            ChatMessage,
+            ChatSession.title,
+            hits.c.rank,
+            func.ts_headline(
+                CHAT_SEARCH_CONFIG,
+                func.translate(ChatMessage.content, _START_SEL + _STOP_SEL, ""),
+                query,
+                SNIPPET_OPTIONS,
+            ),
+        )
+        .join(hits, hits.c.id == ChatMessage.id)
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .order_by(hits.c.rank.desc(), ChatMessage.id.desc())
+    )
+    return [
+        (msg, title, rank, _snippet_html(headline))
+        for msg, title, rank, headline in (await db.execute(page)).all()
+    ]
+
+
+async def _search_substring(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    q: str,
+    limit: int,
+    session_id: uuid.UUID | None,
+    cursor: str | None,
+) -> Sequence[Any]:
+    terms, excluded = _query_terms(q)
+    if not terms:
+        return []
+
+    def contains(term: str):
+        return ChatMessage.content.ilike(f"%{_escape_like(term)}%", escape="\\")
+
+    page = (
+        select(ChatMessage, ChatSession.title)
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(
+            ChatSession.user_id == user_id,
+            *(contains(term) for term in terms),
+            *(not_(contains(term)) for term in excluded),
+        )
+    )
+    if session_id is not None:
+        page = page.where(ChatMessage.session_id == session_id)
+    if cursor:
+        _, raw_id = decode_score_cursor(cursor)
+        try:
+            row_id = uuid.UUID(raw_id)
+        except (TypeError, ValueError, AttributeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page = page.where(ChatMessage.id < row_id)
+    page = page.order_by(ChatMessage.id.desc()).limit(limit)
+    return [
+        (msg, title, 0.0, _highlight(msg.content, terms))
+        for msg, title in (await db.execute(page)).all()
+    ]
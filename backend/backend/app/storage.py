@@ -0,0 +1,533 @@
+"""
+Artifact storage backends.
+
+`get_storage()` returns the configured backend, None when artifacts are not
+configured:
+
+- `S3Storage` (ARTIFACT_STORAGE=s3, the default): ARTIFACTS_BUCKET on
+  MinIO/S3 through app.clients and app.uploads.
+- `LocalStorage` (ARTIFACT_STORAGE=local): files under ARTIFACT_LOCAL_DIR, for
+  small and air-gapped deployments without an object store.
+
+Both keep objects by key with the same semantics, so the artifacts router,
+app.thumbnails, app.content_store and app.artifact_gc work with either.
+
+Local layout: the object for `key` is `objects/<h[:2]>/<h[2:4]>/<h>` with h
+the SHA-1 of the key, so no directory grows past a few hundred entries and
+any key is a safe file name. `<h>.json` next to it keeps the key, content
+type, Cache-Control and ETag (MD5 of the body, as S3 reports it). Writes go
+to `tmp/` and are renamed into place, so a reader never sees a partial file.
+Objects are served by `FileResponse` (Range requests; sendfile where the
+server supports the ASGI pathsend extension) after conditional requests are
+answered from the sidecar. Presigned uploads are HMAC-signed URLs for
+PUT /v1/artifacts/files/{key}.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable
+from urllib.parse import quote, urlencode
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from loguru import logger
+
+from app.clients import ensure_bucket, get_s3_client, get_s3_presign_client, run_s3_operation
+from app.config import settings
+
+
+LIST_PAGE = 1000  # S3 limit for list_objects_v2 and delete_objects
+READ_CHUNK = 1024 * 1024
+LOCAL_FILES_PATH = "/v1/artifacts/files"
+
+_storage: ArtifactStorage | None = None
+
+
+class ObjectNotFound(Exception):
+    """No object under the key"""
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    key: str
+    last_modified: datetime
+    size: int
+
+
+def not_modified(request: Request, etag: str | None, last_modified: float | None) -> bool:
+    """Whether the request's validators match (RFC 9110 13.1.1-13.1.3)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and (
+            if_none_match.strip() == "*" or etag in if_none_match)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+class ArtifactStorage(ABC):
+    """Interface of the artifact backends; a backend missing a method fails
+    at construction"""
+
+    kind: str
+
+    @abstractmethod
+    async def ensure(self) -> bool:
+        """Prepare the store; True if it had to be created"""
+
+    @abstractmethod
+    async def save(
+        self,
+        key: str,
+        read: Callable[[int], Awaitable[bytes]],
+        content_type: str | None = None,
+        sha256: str | None = None,
+    ) -> int:
+        """Store the stream behind `read` (e.g. `UploadFile.read`) under
+        `key`; returns its size. With `sha256`, a body with another digest is
+        rejected with ValueError"""
+
+    @abstractmethod
+    async def put_bytes(
+        self, key: str, data: bytes, content_type: str | None = None,
+        cache_control: str | None = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    async def get_bytes(self, key: str, max_bytes: int | None = None) -> tuple[bytes, str]:
+        """Body and ETag; ObjectNotFound if missing, ValueError if larger than
+        `max_bytes`"""
+
+    @abstractmethod
+    async def etag(self, key: str) -> str | None:
+        """ETag of the object, None if it does not exist"""
+
+    async def exists(self, key: str) -> bool:
+        return await self.etag(key) is not None
+
+    @abstractmethod
+    async def delete(self, keys: list[str]) -> int:
+        """Delete up to LIST_PAGE keys; returns how many were deleted"""
+
+    @abstractmethod
+    def list_pages(self, prefix: str = "") -> AsyncIterator[list[ObjectInfo]]:
+        """Objects under `prefix`, up to LIST_PAGE at a time"""
+
+    @abstractmethod
+    def public_url(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def key_from_url(self, url: str) -> str | None:
+        """Key of one of our public URLs, else None"""
+
+    @abstractmethod
+    def presign_put(
+        self, key: str, size: int, content_type: str | None, sha256: str | None,
+        expires_in: int,
+    ) -> tuple[str, dict[str, str]]:
+        """URL for uploading `key` with PUT and the headers it needs"""
+
+    @abstractmethod
+    async def response(self, key: str, request: Request, headers: dict | None = None) -> Response:
+        """Serve the object"""
+
+
+def _missing(exc: Exception) -> bool:
+    code = getattr(exc, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Storage(ArtifactStorage):
+    kind = "s3"
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    @property
+    def s3(self) -> Any:
+        s3 = get_s3_client()
+        if s3 is None:
+            raise HTTPException(status_code=500, detail="S3 client not available")
+        return s3
+
+    async def ensure(self) -> bool:
+        return await ensure_bucket(self.bucket)
+
+    async def save(self, key, read, content_type=None, sha256=None) -> int:
+        from app.uploads import stream_upload
+
+        # sha256 is checked by S3 on presigned uploads (x-amz-checksum-sha256);
+        # direct uploads are hashed by the caller before the key is chosen
+        return await stream_upload(self.s3, self.bucket, key, read, content_type)
+
+    async def put_bytes(self, key, data, content_type=None, cache_control=None) -> None:
+        extra = {}
+        if content_type:
+            extra["ContentType"] = content_type
+        if cache_control:
+            extra["CacheControl"] = cache_control
+        await run_s3_operation(partial(
+            self.s3.put_object, Bucket=self.bucket, Key=key, Body=data, **extra))
+
+    async def get_bytes(self, key, max_bytes=None) -> tuple[bytes, str]:
+        try:
+            stored = await run_s3_operation(partial(
+                self.s3.get_object, Bucket=self.bucket, Key=key))
+        except Exception as exc:
+            if _missing(exc):
+                raise ObjectNotFound(key) from exc
+            raise
+        if max_bytes is not None and stored.get("ContentLength", 0) > max_bytes:
+            stored["Body"].close()
+            raise ValueError(f"{key} is larger than {max_bytes} bytes")
+        return await run_s3_operation(stored["Body"].read), stored["ETag"]
+
+    async def etag(self, key) -> str | None:
+        try:
+            head = await run_s3_operation(partial(
+                self.s3.head_object, Bucket=self.bucket, Key=key))
+        except Exception as exc:
+            if _missing(exc):
+                return None
+            raise
+        return head["ETag"]
+
+    async def delete(self, keys) -> int:
+        if not keys:
+            return 0
+        result = await run_s3_operation(partial(
+            self.s3.delete_objects, Bucket=self.bucket,
+            Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True}))
+        errors = result.get("Errors", [])
+        for error in errors[:5]:
+            logger.warning(f"Could not delete {error.get('Key')}: {error.get('Message')}")
+        return len(keys) - len(errors)
+
+    async def list_pages(self, prefix=""):
+        token = None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": prefix, "MaxKeys": LIST_PAGE}
+            if token:
+                kwargs["ContinuationToken"] = token
+            page = await run_s3_operation(partial(self.s3.list_objects_v2, **kwargs))
+            objects = [
+                ObjectInfo(o["Key"], o["LastModified"], o.get("Size", 0))
+                for o in page.get("Contents", [])
+            ]
+            if objects:
+                yield objects
+            if not page.get("IsTruncated"):
+                return
+            token = page.get("NextContinuationToken")
+
+    def _bases(self) -> list[str]:
+        return [b.rstrip("/") for b in (settings.minio_external_endpoint, settings.minio_endpoint) if b]
+
+    def public_url(self, key) -> str:
+        bases = self._bases()
+        return f"{bases[0] if bases else ''}/{self.bucket}/{key}"
+
+    def uri(self, key) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def key_from_url(self, url) -> str | None:
+        for base in self._bases():
+            prefix = f"{base}/{self.bucket}/"
+            if url.startswith(prefix):
+                return url[len(prefix):].split("?", 1)[0]
+        return None
+
+    def presign_put(self, key, size, content_type, sha256, expires_in):
+        from app.content_store import CHECKSUM_HEADER, checksum_header
+
+        s3 = get_s3_presign_client()
+        if s3 is None:
+            raise HTTPException(status_code=500, detail="S3 client not available")
+        params = {"Bucket": self.bucket, "Key": key, "ContentLength": size}
+        headers = {}
+        if sha256:
+            # S3 rejects a body whose digest differs from the key
+            params["ChecksumSHA256"] = headers[CHECKSUM_HEADER] = checksum_header(sha256)
+        if content_type:
+            params["ContentType"] = content_type
+        # Signed locally, no request to S3
+        url = s3.generate_presigned_url(
+            ClientMethod="put_object", Params=params, ExpiresIn=expires_in)
+        return url, headers
+
+    async def response(self, key, request, headers=None) -> Response:
+        return RedirectResponse(self.public_url(key), status_code=307, headers=headers)
+
+
+class LocalStorage(ArtifactStorage):
+    kind = "local"
+
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.tmp = self.root / "tmp"
+        self._ready = False
+
+    def path(self, key: str) -> Path:
+        h = hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()
+        return self.objects / h[:2] / h[2:4] / h
+
+    @staticmethod
+    def _meta_path(path: Path) -> Path:
+        return path.with_suffix(".json")
+
+    def _read_meta(self, key: str) -> tuple[Path, dict]:
+        path = self.path(key)
+        try:
+            meta = json.loads(self._meta_path(path).read_text())
+        except FileNotFoundError:
+            if not path.exists():
+                raise ObjectNotFound(key) from None
+            meta = {"key": key}
+        except ValueError:
+            meta = {"key": key}
+        return path, meta
+
+    async def ensure(self) -> bool:
+        def make() -> bool:
+            created = not self.objects.exists()
+            self.objects.mkdir(parents=True, exist_ok=True)
+            self.tmp.mkdir(parents=True, exist_ok=True)
+            return created
+        if self._ready:
+            return False
+        created = await asyncio.to_thread(make)
+        self._ready = True
+        return created
+
+    def _temp(self) -> tuple[int, str]:
+        self.tmp.mkdir(parents=True, exist_ok=True)
+        return tempfile.mkstemp(dir=self.tmp)
+
+    def _commit(self, key: str, temp: str, meta: dict) -> None:
+        """Move a finished temp file into place with its sidecar"""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, meta_temp = self._temp()
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # The sidecar goes first so a visible body always has one
+        os.replace(meta_temp, self._meta_path(path))
+        os.replace(temp, path)
+
+    async def save(self, key, read, content_type=None, sha256=None) -> int:
+        fd, temp = await asyncio.to_thread(self._temp)
+        md5 = hashlib.md5(usedforsecurity=False)
+        digest = hashlib.sha256() if sha256 else None
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := await read(READ_CHUNK):
+                    md5.update(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+                await asyncio.to_thread(os.fsync, f.fileno())
+            if digest is not None and digest.hexdigest() != sha256:
+                raise ValueError("Body does not match its SHA-256")
+            meta = {"key": key, "content_type": content_type, "etag": f'"{md5.hexdigest()}"'}
+            await asyncio.to_thread(self._commit, key, temp, meta)
+        except BaseException:
+            await asyncio.to_thread(Path(temp).unlink, True)
+            raise
+        return size
+
+    async def put_bytes(self, key, data, content_type=None, cache_control=None) -> None:
+        def write() -> None:
+            fd, temp = self._temp()
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                meta = {
+                    "key": key, "content_type": content_type, "cache_control": cache_control,
+                    "etag": f'"{hashlib.md5(data, usedforsecurity=False).hexdigest()}"',
+                }
+                self._commit(key, temp, meta)
+            except BaseException:
+                Path(temp).unlink(missing_ok=True)
+                raise
+        await asyncio.to_thread(write)
+
+    def _etag(self, path: Path, meta: dict, stat: os.stat_result) -> str:
+        return meta.get("etag") or f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    async def get_bytes(self, key, max_bytes=None) -> tuple[bytes, str]:
+        def read() -> tuple[bytes, str]:
+            path, meta = self._read_meta(key)
+            try:
+                with path.open("rb") as f:
+                    stat = os.fstat(f.fileno())
+                    if max_bytes is not None and stat.st_size > max_bytes:
+                        raise ValueError(f"{key} is larger than {max_bytes} bytes")
+                    return f.read(), self._etag(path, meta, stat)
+            except FileNotFoundError:
+                raise ObjectNotFound(key) from None
+        return await asyncio.to_thread(read)
+
+    async def etag(self, key) -> str | None:
+        def head() -> str | None:
+            try:
+                path, meta = self._read_meta(key)
+                return self._etag(path, meta, path.stat())
+            except (ObjectNotFound, FileNotFoundError):
+                return None
+        return await asyncio.to_thread(head)
+
+    async def delete(self, keys) -> int:
+        def remove() -> int:
+            deleted = 0
+            for key in keys:
+                path = self.path(key)
+                try:
+                    path.unlink()
+                    deleted += 1
+                except FileNotFoundError:
+                    deleted += 1  # like S3, deleting a missing key succeeds
+                except OSError as e:
+                    logger.warning(f"Could not delete {key}: {e}")
+                    continue
+                self._meta_path(path).unlink(missing_ok=True)
+            return deleted
+        return await asyncio.to_thread(remove)
+
+    def _scan_shard(self, shard: Path, prefix: str) -> list[ObjectInfo]:
+        found = []
+        for entry in os.scandir(shard):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                meta = json.loads(Path(entry.path).read_text())
+                stat = os.stat(entry.path[:-len(".json")])
+            except (OSError, ValueError):
+                continue
+            key = meta.get("key", "")
+            if key.startswith(prefix):
+                found.append(ObjectInfo(
+                    key, datetime.fromtimestamp(stat.st_mtime, timezone.utc), stat.st_size))
+        return found
+
+    async def list_pages(self, prefix=""):
+        # Keys are hashed, so every shard is scanned; pages follow shard order
+        page: list[ObjectInfo] = []
+        if not self.objects.exists():
+            return
+        for top in sorted(await asyncio.to_thread(os.listdir, self.objects)):
+            top_dir = self.objects / top
+            for shard in sorted(await asyncio.to_thread(os.listdir, top_dir)):
+                page.extend(await asyncio.to_thread(self._scan_shard, top_dir / shard, prefix))
+                while len(page) >= LIST_PAGE:
+                    yield page[:LIST_PAGE]
+                    page = page[LIST_PAGE:]
+        if page:
+            yield page
+
+    def _base(self) -> str:
+        return f"{(settings.artifact_local_public_url or '').rstrip('/')}{LOCAL_FILES_PATH}"
+
+    def public_url(self, key) -> str:
+        return f"{self._base()}/{quote(key)}"
+
+    def uri(self, key) -> str:
+        return f"local://{key}"
+
+    def key_from_url(self, url) -> str | None:
+        from urllib.parse import unquote, urlsplit
+
+        path = urlsplit(url).path
+        if not path.startswith(f"{LOCAL_FILES_PATH}/"):
+            return None
+        if settings.artifact_local_public_url and not url.startswith(self._base()):
+            return None
+        return unquote(path[len(LOCAL_FILES_PATH) + 1:])
+
+    def presign_put(self, key, size, content_type, sha256, expires_in):
+        expires = int(time.time()) + expires_in
+        query = {"expires": expires, "size": size}
+        if content_type:
+            query["content_type"] = content_type
+        if sha256:
+            query["sha256"] = sha256
+        query["signature"] = upload_signature(key, expires, size, content_type, sha256)
+        return f"{self.public_url(key)}?{urlencode(query)}", {}
+
+    async def response(self, key, request, headers=None) -> Response:
+        try:
+            path, meta = await asyncio.to_thread(self._read_meta, key)
+            stat = await asyncio.to_thread(os.stat, path)
+        except (ObjectNotFound, FileNotFoundError):
+            raise HTTPException(status_code=404, detail="Artifact not found") from None
+        etag = self._etag(path, meta, stat)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": meta.get("cache_control")
+            or f"public, max-age={settings.thumbnail_cache_seconds}",
+            **(headers or {}),
+        }
+        if not_modified(request, etag, stat.st_mtime):
+            return Response(status_code=304, headers=headers)
+        media_type = (meta.get("content_type") or guess_type(key)[0]
+                      or "application/octet-stream")
+        return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat)
+
+
+def upload_signature(
+    key: str, expires: int, size: int, content_type: str | None, sha256: str | None,
+) -> str:
+    message = "\n".join(["PUT", key, str(expires), str(size), content_type or "", sha256 or ""])
+    return hmac.new(
+        settings.access_token_secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def get_storage() -> ArtifactStorage | None:
+    """The configured backend, None if artifacts are not configured"""
+    global _storage
+    if _storage is not None:
+        return _storage
+    if settings.artifact_storage == "local":
+        _storage = LocalStorage(settings.artifact_local_dir)
+    elif settings.artifacts_bucket and get_s3_client() is not None:
+        _storage = S3Storage(settings.artifacts_bucket)
+    return _storage
+
+
+def require_storage() -> ArtifactStorage:
+    storage = get_storage()
+    if storage is None:
+        raise HTTPException(status_code=500, detail="Artifacts bucket not configured")
+    return storage
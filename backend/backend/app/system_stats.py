@@ -0,0 +1,181 @@
+"""
+System-wide statistics snapshot for the admin and debug dashboards.
+
+`collect_system_stats` gathers every count in two statements (one row of
+entity counts and one GROUP BY over task status). `system_stats` refreshes
+the result in the background every SYSTEM_STATS_INTERVAL_SECONDS and the
+endpoints only read that snapshot, so dashboard traffic never scans the
+tables.
+
+With Redis the snapshot is shared: one replica at a time (a Postgres
+advisory lock) collects it and stores it under SNAPSHOT_KEY, and the other
+replicas adopt it while it is younger than the interval. Without Redis
+every replica refreshes its own snapshot.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException
+from loguru import logger
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.clients import get_redis
+from app.config import settings
+from app.db import AsyncSessionLocal, engine
+from app.models import Device, Task, User
+
+
+SNAPSHOT_KEY = "system_stats:snapshot"
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+_LOCK_KEY = 724_310_042
+
+
+async def collect_system_stats(db: AsyncSession) -> dict[str, Any]:
+    """Count users, devices and tasks (by status) in two queries"""
+    now = datetime.now(timezone.utc)
+    cutoff = now.replace(tzinfo=None) - timedelta(hours=24)
+
+    entities = (await db.execute(
+        select(
+            select(func.count(User.id)).scalar_subquery().label("users"),
+            select(func.count(User.id)).where(User.is_active == True)  # noqa: E712
+            .scalar_subquery().label("active_users"),
+            select(func.count(Device.id)).scalar_subquery().label("devices"),
+            select(func.count(Device.id)).where(Device.created_at >= cutoff)
+            .scalar_subquery().label("recent_devices"),
+        )
+    )).one()
+
+    by_status: dict[str, int] = {}
+    recent_tasks = 0
+    for status, total, recent in (await db.execute(
+        select(
+            Task.status,
+            func.count(),
+            func.count().filter(Task.created_at >= cutoff),
+        ).group_by(Task.status)
+    )).all():
+        by_status[status] = total
+        recent_tasks += recent
+
+    return {
+        "users": entities.users or 0,
+        "active_users": entities.active_users or 0,
+        "devices": entities.devices or 0,
+        "recent_devices_24h": entities.recent_devices or 0,
+        "tasks": sum(by_status.values()),
+        "recent_tasks_24h": recent_tasks,
+        "tasks_by_status": by_status,
+        "snapshot_at": now.isoformat(),
+    }
+
+
+@asynccontextmanager
+async def _collector_lock() -> AsyncIterator[bool]:
+    """Whether this process may collect the shared snapshot right now"""
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await lock_conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+
+class SystemStatsSnapshotter:
+    """Keeps a periodically refreshed system statistics snapshot"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.running = False
+        self._snapshot: dict[str, Any] | None = None
+        self._ready = asyncio.Event()
+
+    async def start(self) -> None:
+        """Refresh the snapshot every `interval` seconds until stopped"""
+        self.running = True
+        while self.running:
+            try:
+                await self.refresh()
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"System stats snapshot error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stop(self) -> None:
+        self.running = False
+
+    async def get(self) -> dict[str, Any]:
+        """Latest snapshot; never queries the database. Before the first
+        refresh has finished, waits for it up to `interval` seconds"""
+        if self._snapshot is None:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.interval)
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=503, detail="System statistics are not available yet")
+        return self._snapshot
+
+    async def refresh(self) -> None:
+        """Adopt the shared snapshot if it is current, otherwise collect and
+        publish one; a replica that loses the lock keeps its snapshot until
+        the next refresh"""
+        redis = get_redis()
+        if redis is None:
+            self._set(await self._collect())
+            return
+        shared = await self._read_shared(redis)
+        if shared is None:
+            async with _collector_lock() as acquired:
+                if not acquired:
+                    return
+                # Another replica may have published while we waited
+                shared = await self._read_shared(redis)
+                if shared is None:
+                    shared = await self._collect()
+                    await self._publish(redis, shared)
+        self._set(shared)
+
+    def _set(self, snapshot: dict[str, Any]) -> None:
+        self._snapshot = snapshot
+        self._ready.set()
+
+    async def _collect(self) -> dict[str, Any]:
+        async with AsyncSessionLocal() as db:
+            return await collect_system_stats(db)
+
+    async def _read_shared(self, redis: Any) -> dict[str, Any] | None:
+        try:
+            raw = await redis.get(SNAPSHOT_KEY)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"System stats snapshot read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        snapshot = json.loads(raw)
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(snapshot["snapshot_at"])
+        return snapshot if age.total_seconds() < self.interval else None
+
+    async def _publish(self, redis: Any, snapshot: dict[str, Any]) -> None:
+        try:
+            await redis.set(SNAPSHOT_KEY, json.dumps(snapshot),
+                            ex=max(1, int(2 * self.interval)))
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"System stats snapshot publish failed: {e}")
+
+
+system_stats = SystemStatsSnapshotter(settings.system_stats_interval_seconds)
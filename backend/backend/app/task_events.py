@@ -0,0 +1,238 @@
+"""
+Task lifecycle events.
+
+Call sites that create a task or change its status report it through
+`emit_task_event`. This invalidates the user's cached analytics responses
+(app.response_cache) and notifies long-poll/SSE watchers of the task
+(app.task_watch). Events are also buffered in-process and written to the
+ClickHouse `task_events` MergeTree table in batches by `task_event_writer`,
+which feeds the ClickHouse analytics backend (ANALYTICS_BACKEND=clickhouse).
+Nothing is buffered when ClickHouse is not configured.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+
+from loguru import logger
+
+from app.clients import get_clickhouse
+from app.config import settings
+from app.response_cache import bump_cache_version
+from app.rollups import ACTION_FAILURE_STATUSES, ACTION_SUCCESS_STATUSES
+from app.task_watch import task_status_event, task_status_hub
+
+
+TASK_EVENTS_TABLE = "task_events"
+TASK_EVENT_COLUMNS = [
+    "ts",
+    "event",
+    "task_id",
+    "user_id",
+    "device_id",
+    "status",
+    "task_created_at",
+    "duration",
+    "action_type",
+    "outcome",
+]
+# One row per lifecycle event (created, assigned, delivered, completed,
+# failed, cancelled), plus one "action" row per executed action.
+# For status events `duration` is seconds since the task was created; for
+# action rows it is the duration reported by the device.
+TASK_EVENTS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {TASK_EVENTS_TABLE} (
+        ts DateTime64(3, 'UTC'),
+        event LowCardinality(String),
+        task_id String,
+        user_id String,
+        device_id String,
+        status LowCardinality(String),
+        task_created_at DateTime64(3, 'UTC'),
+        duration Nullable(Float64),
+        action_type LowCardinality(String),
+        outcome LowCardinality(String)
+    ) ENGINE = MergeTree()
+    PARTITION BY toYYYYMM(task_created_at)
+    ORDER BY (user_id, task_created_at, task_id, ts)
+"""
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _action_outcome(status: Any) -> str:
+    if status in ACTION_SUCCESS_STATUSES:
+        return "success"
+    if status in ACTION_FAILURE_STATUSES:
+        return "failure"
+    return "other"
+
+
+def _action_duration(result: dict) -> float | None:
+    try:
+        return float(result["duration"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def task_event_rows(
+    event: str,
+    task: Any,
+    status: str | None = None,
+    results: Iterable[dict] | None = None,
+    at: datetime | None = None,
+) -> list[tuple]:
+    """Build task_events rows for `task` (anything with id, user_id,
+    device_id, status and created_at, e.g. a Task or a RETURNING row)"""
+    at = _utc(at or datetime.now(timezone.utc))
+    created_at = _utc(task.created_at) if task.created_at else at
+    status = status or task.status
+    base = (str(task.id), str(task.user_id), str(task.device_id))
+    rows = [(
+        at, event, *base, status, created_at,
+        (at - created_at).total_seconds(), "", "",
+    )]
+    for result in results or []:
+        action = result.get("action") or {}
+        rows.append((
+            at, "action", *base, status, created_at,
+            _action_duration(result),
+            str(action.get("type", "unknown"))[:64],
+            _action_outcome(result.get("status")),
+        ))
+    return rows
+
+
+class TaskEventWriter:
+    """Buffers task events and inserts them into ClickHouse in batches"""
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_seconds: float,
+        max_pending: int = 100_000,
+        client_factory: Callable[[], Any] = get_clickhouse,
+    ):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.client_factory = client_factory
+        self.running = False
+        self._available = True
+        self._client: Any = None
+        self._pending: deque[tuple] = deque()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.clickhouse_url is not None and self._available
+
+    def enqueue(self, rows: list[tuple]) -> None:
+        self._pending.extend(rows)
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            # ClickHouse has been unreachable for a while; keep the newest
+            for _ in range(overflow):
+                self._pending.popleft()
+            logger.warning(f"Task event buffer full, dropped {overflow} events")
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Flush batches to ClickHouse until stopped"""
+        self.running = True
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._client is None and not await self._connect():
+                continue
+            await self.flush()
+
+    async def _connect(self) -> bool:
+        try:
+            client = await asyncio.to_thread(self.client_factory)
+            if client is None:
+                # clickhouse-connect not installed; stop buffering
+                self._available = False
+                self._pending.clear()
+                self.running = False
+                return False
+            await asyncio.to_thread(client.command, TASK_EVENTS_DDL)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"ClickHouse unavailable for task events: {e}")
+            return False
+        self._client = client
+        return True
+
+    async def flush(self) -> None:
+        while self._pending and self._client is not None:
+            batch = [
+                self._pending.popleft()
+                for _ in range(min(self.batch_size, len(self._pending)))
+            ]
+            try:
+                await asyncio.to_thread(
+                    self._client.insert, TASK_EVENTS_TABLE, batch,
+                    column_names=TASK_EVENT_COLUMNS,
+                )
+            except Exception as e:  # noqa: BLE001
+                # Keep the batch for the next flush
+                self._pending.extendleft(reversed(batch))
+                logger.warning(f"Failed to write {len(batch)} task events: {e}")
+                return
+
+    async def stop(self) -> None:
+        self.running = False
+        self._wakeup.set()
+        await self.flush()
+
+
+task_event_writer = TaskEventWriter(
+    batch_size=settings.task_events_batch_size,
+    flush_seconds=settings.task_events_flush_seconds,
+)
+
+
+async def emit_task_event(
+    event: str,
+    task: Any,
+    status: str | None = None,
+    results: Iterable[dict] | None = None,
+) -> None:
+    """Record a lifecycle event for `task`; never raises"""
+    try:
+        await bump_cache_version(task.user_id)
+        await task_status_hub.publish(task_status_event(event, task, status))
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to publish task event {event}: {e}")
+    try:
+        if task_event_writer.enabled:
+            task_event_writer.enqueue(task_event_rows(event, task, status, results))
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to record task event {event}: {e}")
+
+
+async def emit_task_events(event: str, tasks: Iterable[Any]) -> None:
+    """Record `event` for many tasks at once (bulk creation); never raises"""
+    tasks = list(tasks)
+    try:
+        for user_id in {task.user_id for task in tasks}:
+            await bump_cache_version(user_id)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to publish task events {event}: {e}")
+    try:
+        if task_event_writer.enabled:
+            task_event_writer.enqueue(
+                [row for task in tasks for row in task_event_rows(event, task)])
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to record task events {event}: {e}")
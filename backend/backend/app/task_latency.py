@@ -0,0 +1,104 @@
+"""
+Task lifecycle latency histograms.
+
+`task.exec` envelopes carry `queued_at` (when the task became deliverable)
+and `issued_at` (when the envelope was built), so every hop can measure its
+stage even when it runs on another node:
+
+- queue wait:  queued_at -> issued_at, observed when the envelope is published
+- delivery:    issued_at -> WebSocket send on the node holding the connection
+- execution:   WebSocket send -> `task.result` received on the same node
+- persistence: writing action logs and the final task status
+
+Send times stay in a bounded node-local map because the device reports its
+result over the connection the task was sent on.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from app.config import settings
+from app.metrics import (
+    task_delivery_latency_seconds,
+    task_execution_seconds,
+    task_queue_wait_seconds,
+)
+
+
+MAX_TRACKED_SENDS = 10_000
+# Action types are client supplied; keep the label set bounded
+_ACTION_LABEL = re.compile(r"^[a-z][a-z0-9_]{0,31}$")
+
+_sent: OrderedDict[str, tuple[datetime, str]] = OrderedDict()
+
+
+def envelope_time(value: datetime | None = None) -> str:
+    """ISO timestamp (UTC) for envelope timing fields; naive values are UTC"""
+    if value is None:
+        value = datetime.now(timezone.utc)
+    elif value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def _parse(value: Any) -> datetime | None:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def action_label(actions: Iterable[Any] | None) -> str:
+    """Histogram label for a task: its first action type"""
+    for action in actions or []:
+        if isinstance(action, dict):
+            action_type = str(action.get("type", "")).lower()
+            return action_type if _ACTION_LABEL.match(action_type) else "other"
+    return "none"
+
+
+def _elapsed(since: datetime | None, now: datetime) -> float | None:
+    if since is None:
+        return None
+    return max((now - since).total_seconds(), 0.0)
+
+
+def observe_queue_wait(envelope: dict[str, Any]) -> None:
+    wait = _elapsed(_parse(envelope.get("queued_at")),
+                    _parse(envelope.get("issued_at")) or datetime.now(timezone.utc))
+    if wait is not None:
+        task_queue_wait_seconds.labels(
+            action_label(envelope.get("actions")), settings.node_id).observe(wait)
+
+
+def observe_delivery(envelope: dict[str, Any]) -> None:
+    """Record that `envelope` was written to the device's WebSocket"""
+    now = datetime.now(timezone.utc)
+    label = action_label(envelope.get("actions"))
+    latency = _elapsed(_parse(envelope.get("issued_at")), now)
+    if latency is not None:
+        task_delivery_latency_seconds.labels(label, settings.node_id).observe(latency)
+    task_id = str(envelope.get("task_id"))
+    _sent.pop(task_id, None)
+    _sent[task_id] = (now, label)
+    while len(_sent) > MAX_TRACKED_SENDS:
+        _sent.popitem(last=False)
+
+
+def observe_execution(task_id: str, results: Iterable[Any] | None = None) -> str:
+    """Observe send -> result time for `task_id`; returns its action label"""
+    sent = _sent.pop(task_id, None)
+    if sent is None:
+        return action_label(
+            r.get("action") for r in results or [] if isinstance(r, dict))
+    sent_at, label = sent
+    task_execution_seconds.labels(label, settings.node_id).observe(
+        _elapsed(sent_at, datetime.now(timezone.utc)) or 0.0)
+    return label
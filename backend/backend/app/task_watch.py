@@ -0,0 +1,163 @@
+"""
+Task status notifications for long-poll and SSE clients.
+
+`emit_task_event` publishes every status change as a small JSON message on
+the Redis `task.status` channel; deliveries and per-action progress reported
+by devices go out on the same channel without a `status`. Each node keeps a
+single subscription to that channel (`task_status_hub.start`) and fans
+messages out to in-process watchers keyed by task id, so a client waiting on
+one node learns about a `task.result` ingested on another node without
+polling Postgres. Without Redis (or while the subscription is down) events
+are dispatched to local watchers only.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any
+
+from loguru import logger
+
+from app.clients import get_redis
+from app.metrics import task_status_watchers
+
+
+TASK_STATUS_CHANNEL = "task.status"
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled"})
+RECONNECT_SECONDS = 1.0
+
+
+def task_status_event(event: str, task: Any, status: str | None = None) -> dict:
+    return {
+        "task_id": str(task.id),
+        "status": status or task.status,
+        "event": event,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def task_progress_event(task_id: Any, event: str, **fields: Any) -> dict:
+    """Event that does not change the task status (delivery, action progress)"""
+    return {
+        "task_id": str(task_id),
+        "event": event,
+        **fields,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class TaskWatch:
+    """Status events of one task, from subscription until `close`"""
+
+    def __init__(self, hub: "TaskStatusHub", task_id: str):
+        self.hub = hub
+        self.task_id = task_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def next(self, timeout: float) -> dict | None:
+        """Next event, or None after `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def wait_finished(self, timeout: float) -> dict | None:
+        """Wait for a terminal status event; None on timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            event = await self.next(remaining)
+            if event is None:
+                return None
+            if event.get("status") in TERMINAL_STATUSES:
+                return event
+        return None
+
+    def close(self) -> None:
+        self.hub._unregister(self)
+
+    def __enter__(self) -> "TaskWatch":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class TaskStatusHub:
+    """Per-node fan-out of task status events to local watchers"""
+
+    def __init__(self):
+        self.running = False
+        self._subscribed = False
+        self._watches: dict[str, set[TaskWatch]] = {}
+
+    def subscribe(self, task_id: str) -> TaskWatch:
+        """Start buffering status events for `task_id`; subscribe before
+        reading the task so no change between the read and the wait is lost"""
+        watch = TaskWatch(self, str(task_id))
+        self._watches.setdefault(watch.task_id, set()).add(watch)
+        task_status_watchers.inc()
+        return watch
+
+    def _unregister(self, watch: TaskWatch) -> None:
+        watches = self._watches.get(watch.task_id)
+        if watches is None or watch not in watches:
+            return
+        watches.discard(watch)
+        if not watches:
+            del self._watches[watch.task_id]
+        task_status_watchers.dec()
+
+    def dispatch(self, event: dict) -> None:
+        for watch in self._watches.get(str(event.get("task_id")), ()):
+            watch.queue.put_nowait(event)
+
+    async def publish(self, event: dict) -> None:
+        redis = get_redis()
+        if redis is not None and self._subscribed:
+            try:
+                await redis.publish(TASK_STATUS_CHANNEL, json.dumps(event))
+                return
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to publish task status event: {e}")
+        self.dispatch(event)
+
+    async def start(self) -> None:
+        """Relay the Redis channel to local watchers until stopped"""
+        redis = get_redis()
+        if redis is None:
+            logger.warning("Redis not configured; task status events stay node-local")
+            return
+        self.running = True
+        while self.running:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(TASK_STATUS_CHANNEL)
+                self._subscribed = True
+                async for msg in pubsub.listen():  # type: ignore[attr-defined]
+                    if msg.get("type") != "message":
+                        continue
+                    try:
+                        self.dispatch(json.loads(msg["data"]))
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"Malformed task status event: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Task status subscription lost: {e}")
+            finally:
+                self._subscribed = False
+                try:
+                    await pubsub.aclose()
+                except Exception:  # noqa: BLE001
+                    pass
+            if self.running:
+                await asyncio.sleep(RECONNECT_SECONDS)
+
+    def stop(self) -> None:
+        self.running = False
+
+
+task_status_hub = TaskStatusHub()
@@ -0,0 +1,219 @@
+"""
+WebP derivatives (thumbnails, previews) of image artifacts.
+
+A derivative of `<key>` is stored next to the originals as
+`derived/<variant>/<key>.webp` (in either app.storage backend), so once
+rendered it is served like any other artifact. Derivatives are rendered on
+ingest (image uploads through /v1/artifacts/upload) and otherwise on first
+request (GET /v1/artifacts/derived/..., chat screenshot replies). Keys
+outside `cas/` can be uploaded again, so ingest always renders them anew.
+Decoding and resizing run in a process pool of THUMBNAIL_WORKERS processes,
+off the event loop and outside the GIL; concurrent requests for the same
+derivative share one render.
+
+ETags are the MD5 of the WebP bytes, which is also what S3 reports for a
+single-part object, so the value does not change between the first render
+and later reads. Derivatives of content-addressed artifacts never change and
+are marked immutable.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from loguru import logger
+from sqlalchemy import select
+
+from app.config import settings
+from app.content_store import CAS_PREFIX
+from app.db import AsyncSessionLocal
+from app.imaging import render
+from app.models import Artifact
+from app.storage import ArtifactStorage, ObjectNotFound
+
+
+# Longest edge in pixels
+VARIANTS = {"thumb": 320, "preview": 1280}
+DERIVED_PREFIX = "derived"
+DERIVED_CONTENT_TYPE = "image/webp"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_pool: ProcessPoolExecutor | None = None
+_inflight: dict[str, asyncio.Task] = {}
+_background: set[asyncio.Task] = set()
+
+
+def derived_key(source_key: str, variant: str) -> str:
+    return f"{DERIVED_PREFIX}/{variant}/{source_key}.webp"
+
+
+def is_image(key: str, content_type: str | None = None) -> bool:
+    if content_type:
+        return content_type.startswith("image/")
+    return key.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def etag_of(data: bytes) -> str:
+    return f'"{hashlib.md5(data, usedforsecurity=False).hexdigest()}"'
+
+
+def cache_control(source_key: str) -> str:
+    if source_key.startswith(f"{CAS_PREFIX}/"):
+        return IMMUTABLE_CACHE_CONTROL
+    # Caller-chosen keys can be overwritten with new content
+    return f"public, max-age={settings.thumbnail_cache_seconds}"
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.thumbnail_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_thumbnail_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def render_variant(data: bytes, variant: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_pool(), render, data, VARIANTS[variant], settings.thumbnail_quality)
+
+
+async def _generate(storage: ArtifactStorage, source_key: str, variant: str) -> tuple[bytes, str]:
+    original, _ = await storage.get_bytes(
+        source_key, max_bytes=settings.thumbnail_max_source_bytes)
+    data = await render_variant(original, variant)
+    await storage.put_bytes(
+        derived_key(source_key, variant), data,
+        content_type=DERIVED_CONTENT_TYPE, cache_control=cache_control(source_key))
+    return data, etag_of(data)
+
+
+async def generate_derivative(
+    storage: ArtifactStorage, source_key: str, variant: str
+) -> tuple[bytes, str]:
+    """Render and store a derivative; concurrent callers share one render,
+    which finishes even if the caller that started it goes away"""
+    key = derived_key(source_key, variant)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_generate(storage, source_key, variant))
+        _inflight[key] = task
+        task.add_done_callback(partial(_render_done, key))
+    return await asyncio.shield(task)
+
+
+def _render_done(key: str, task: asyncio.Task) -> None:
+    _inflight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # mark retrieved; callers that are still waiting re-raise it
+
+
+async def derivative_etag(storage: ArtifactStorage, source_key: str, variant: str) -> str | None:
+    """ETag of the stored derivative, None if it is not rendered yet"""
+    return await storage.etag(derived_key(source_key, variant))
+
+
+async def get_derivative(
+    storage: ArtifactStorage, source_key: str, variant: str
+) -> tuple[bytes, str]:
+    """Derivative bytes and ETag, rendered first if needed"""
+    try:
+        return await storage.get_bytes(derived_key(source_key, variant))
+    except ObjectNotFound:
+        return await generate_derivative(storage, source_key, variant)
+
+
+async def ensure_derivative(storage: ArtifactStorage, source_key: str, variant: str) -> str:
+    """Key of the derivative, rendering it if it is not stored yet"""
+    if await derivative_etag(storage, source_key, variant) is None:
+        await generate_derivative(storage, source_key, variant)
+    return derived_key(source_key, variant)
+
+
+def schedule_derivatives(storage: ArtifactStorage, source_key: str) -> None:
+    """Render every variant of a freshly ingested image in the background.
+    Only content-addressed sources keep derivatives that already exist; any
+    other key may have been overwritten by this upload"""
+    immutable = source_key.startswith(f"{CAS_PREFIX}/")
+
+    async def run() -> None:
+        for variant in VARIANTS:
+            try:
+                if immutable:
+                    await ensure_derivative(storage, source_key, variant)
+                else:
+                    await generate_derivative(storage, source_key, variant)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Rendering {variant} of {source_key} failed: {e}")
+                return
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _artifact_content_type(sha256: str) -> str | None:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(
+            select(Artifact.content_type).where(Artifact.sha256 == sha256))
+
+
+async def _is_image_artifact(source_key: str) -> bool:
+    """Content-addressed keys have no extension; their row has the type"""
+    if not source_key.startswith(f"{CAS_PREFIX}/"):
+        return is_image(source_key)
+    content_type = await _artifact_content_type(source_key.rsplit("/", 1)[-1])
+    return content_type is not None and is_image(source_key, content_type)
+
+
+async def preview_url(url: str) -> str | None:
+    """Public URL of the preview of an artifact URL, None if it is not one of
+    ours or cannot be rendered in time"""
+    from app.storage import get_storage
+
+    storage = get_storage()
+    source_key = storage.key_from_url(url) if storage is not None else None
+    if source_key is None or not await _is_image_artifact(source_key):
+        return None
+    try:
+        key = await asyncio.wait_for(
+            ensure_derivative(storage, source_key, "preview"),
+            timeout=settings.thumbnail_wait_seconds)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"No preview for {source_key}: {e}")
+        return None
+    return storage.public_url(key)
+
+
+async def local_derivative(path: str, variant: str, if_none_match: str | None):
+    """Derivative of a local image file (dev screenshot routes); the ETag
+    follows the file's size and mtime so revalidation skips the render"""
+    import os
+    from fastapi import HTTPException, Response
+
+    if variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    stat = await asyncio.to_thread(os.stat, path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.thumbnail_cache_seconds}"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+        return Response(status_code=304, headers=headers)
+    if stat.st_size > settings.thumbnail_max_source_bytes:
+        raise HTTPException(status_code=413, detail="Image too large")
+    original = await asyncio.to_thread(Path(path).read_bytes)
+    data = await render_variant(original, variant)
+    return Response(content=data, media_type=DERIVED_CONTENT_TYPE, headers=headers)
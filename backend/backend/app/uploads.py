@@ -0,0 +1,133 @@
+"""
+Streaming artifact uploads to S3/MinIO.
+
+Uploaded files are never read into memory whole. The body is read in parts of
+ARTIFACT_UPLOAD_PART_SIZE bytes; a file that fits in one part is stored with a
+single `put_object`, anything larger becomes a multipart upload with up to
+ARTIFACT_UPLOAD_CONCURRENCY parts in flight. Reading the next part waits for a
+free slot, so a slow S3 throttles the client instead of buffering, and peak
+memory per upload is about (concurrency + 1) * part size whatever the file
+size. A failed or cancelled upload is aborted so its parts do not linger; the
+bucket lifecycle rule installed by `ensure_multipart_cleanup` removes parts of
+uploads that never got that far (e.g. the pod was killed).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from app.clients import run_s3_operation
+from app.config import settings
+
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 limit for every part but the last
+MAX_PARTS = 10_000
+ABORT_RULE_ID = "abort-incomplete-multipart-uploads"
+
+
+def part_size() -> int:
+    return max(settings.artifact_upload_part_size, MIN_PART_SIZE)
+
+
+async def read_part(read: Callable[[int], Awaitable[bytes]], size: int) -> bytes:
+    """Read exactly `size` bytes, fewer only at end of stream"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = await read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+async def stream_upload(
+    s3: Any,
+    bucket: str,
+    key: str,
+    read: Callable[[int], Awaitable[bytes]],
+    content_type: str | None = None,
+) -> int:
+    """Copy the stream behind `read` (e.g. `UploadFile.read`) to
+    `bucket/key`; returns the number of bytes stored"""
+    size = part_size()
+    extra = {"ContentType": content_type} if content_type else {}
+    body = await read_part(read, size)
+    if len(body) < size:
+        await run_s3_operation(partial(
+            s3.put_object, Bucket=bucket, Key=key, Body=body, **extra))
+        return len(body)
+
+    upload = await run_s3_operation(partial(
+        s3.create_multipart_upload, Bucket=bucket, Key=key, **extra))
+    upload_id = upload["UploadId"]
+    slots = asyncio.Semaphore(max(settings.artifact_upload_concurrency, 1))
+    etags: dict[int, str] = {}
+    pending: set[asyncio.Task] = set()
+
+    async def put_part(number: int, data: bytes) -> None:
+        try:
+            result = await run_s3_operation(partial(
+                s3.upload_part, Bucket=bucket, Key=key, UploadId=upload_id,
+                PartNumber=number, Body=data))
+            etags[number] = result["ETag"]
+        finally:
+            slots.release()
+
+    total = 0
+    number = 1
+    try:
+        while body:
+            if number > MAX_PARTS:
+                raise ValueError(f"Upload exceeds {MAX_PARTS} parts of {size} bytes")
+            total += len(body)
+            await slots.acquire()
+            pending.add(asyncio.create_task(put_part(number, body)))
+            # Fail fast: surface errors of finished parts before reading on
+            for task in [t for t in pending if t.done()]:
+                pending.discard(task)
+                task.result()
+            body = await read_part(read, size)
+            number += 1
+        await asyncio.gather(*pending)
+        pending.clear()
+        await run_s3_operation(partial(
+            s3.complete_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": [
+                {"ETag": etags[n], "PartNumber": n} for n in sorted(etags)]}))
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        try:
+            await run_s3_operation(partial(
+                s3.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id))
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Failed to abort multipart upload of {key}: {e}")
+        raise
+    return total
+
+
+def ensure_multipart_cleanup(s3: Any, bucket: str) -> None:
+    """Install a lifecycle rule that aborts uploads left incomplete for
+    ARTIFACT_MULTIPART_EXPIRY_DAYS; other rules of the bucket are kept"""
+    try:
+        rules = s3.get_bucket_lifecycle_configuration(Bucket=bucket).get("Rules", [])
+    except Exception:  # noqa: BLE001 - no lifecycle configuration yet
+        rules = []
+    rules = [r for r in rules if r.get("ID") != ABORT_RULE_ID]
+    rules.append({
+        "ID": ABORT_RULE_ID,
+        "Status": "Enabled",
+        "Filter": {"Prefix": ""},
+        "AbortIncompleteMultipartUpload": {
+            "DaysAfterInitiation": settings.artifact_multipart_expiry_days,
+        },
+    })
+    s3.put_bucket_lifecycle_configuration(
+        Bucket=bucket, LifecycleConfiguration={"Rules": rules})
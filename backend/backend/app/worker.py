@@ -69,6 +69,7 @@ async def worker_assigner() -> None:
                     envelope = {
                         "type": "task.exec",
                         "task_id": task_id,
+                        "queued_at": evt.get("at"),
                         "issued_at": datetime.now(timezone.utc).isoformat(),
                         "actions": evt.get("actions", []),
                     }
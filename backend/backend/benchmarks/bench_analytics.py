@@ -0,0 +1,154 @@
+"""
+Benchmark: /v1/analytics/performance aggregation latency against task volume.
+
+Seeds a throwaway user with synthetic tasks (or action logs for --target
+actions) in growing batches and times the matching AdvancedAnalytics call
+at each volume.
+Runs against the database configured in DATABASE_URL (Postgres).
+
+Usage:
+    python -m benchmarks.bench_analytics --volumes 1000 10000 100000
+    python -m benchmarks.bench_analytics --target devices --devices 200
+    ANALYTICS_USE_ROLLUPS=false python -m benchmarks.bench_analytics --target actions
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select, text
+
+from app.analytics import AdvancedAnalytics
+from app.db import AsyncSessionLocal, init_models
+from app.models import ActionLog, Device, Task, TaskStatus, User
+
+
+BATCH_SIZE = 5000
+STATUSES = [s.value for s in TaskStatus]
+ACTION_TYPES = ["click", "type", "scroll", "screenshot", "key", "wait"]
+RESULT_STATUSES = ["done", "done", "done", "failed", "error", "skipped"]
+ACTIONS_PER_TASK = 10
+
+
+async def _seed_tasks(user_id: uuid.UUID, device_ids: list[uuid.UUID], count: int) -> list[dict]:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    seeded = []
+    async with AsyncSessionLocal() as db:
+        for start in range(0, count, BATCH_SIZE):
+            rows = []
+            for _ in range(min(BATCH_SIZE, count - start)):
+                created = now - timedelta(seconds=random.randint(0, 30 * 86400))
+                rows.append({
+                    "id": uuid.uuid4().hex,
+                    "user_id": user_id,
+                    "device_id": random.choice(device_ids),
+                    "status": random.choice(STATUSES),
+                    "title": "bench",
+                    "payload": {"actions": []},
+                    "created_at": created,
+                    "updated_at": created + timedelta(seconds=random.randint(1, 600)),
+                })
+            await db.execute(insert(Task), rows)
+            await db.commit()
+            seeded.extend(rows)
+        await _analyze(db)
+    return seeded
+
+
+async def _seed_action_logs(user_id: uuid.UUID, device_ids: list[uuid.UUID], count: int) -> None:
+    tasks = await _seed_tasks(user_id, device_ids, max(1, count // ACTIONS_PER_TASK))
+    async with AsyncSessionLocal() as db:
+        for start in range(0, count, BATCH_SIZE):
+            rows = []
+            for _ in range(min(BATCH_SIZE, count - start)):
+                task = random.choice(tasks)
+                rows.append({
+                    "task_id": task["id"],
+                    "device_id": task["device_id"],
+                    "action": {"type": random.choice(ACTION_TYPES)},
+                    "result": {
+                        "status": random.choice(RESULT_STATUSES),
+                        "duration": round(random.uniform(0.05, 5), 3),
+                    },
+                    "actor": "device",
+                    "created_at": task["created_at"],
+                })
+            await db.execute(insert(ActionLog), rows)
+            await db.commit()
+        await _analyze(db)
+
+
+async def _analyze(db) -> None:
+    # Fresh planner statistics, as autovacuum would have by now
+    await db.execute(text(
+        "ANALYZE tasks, action_logs, task_rollups_hourly, action_rollups_hourly"))
+    await db.commit()
+
+
+TARGETS = {
+    "summary": AdvancedAnalytics.get_user_performance_summary,
+    "devices": AdvancedAnalytics.get_device_analytics,
+    "actions": AdvancedAnalytics.get_action_performance,
+}
+
+
+async def _time_target(target: str, user_id: str, runs: int) -> list[float]:
+    timings = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(runs):
+            started = time.perf_counter()
+            await TARGETS[target](db, user_id, 30)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def run(target: str, volumes: list[int], runs: int, devices: int) -> None:
+    await init_models()
+    user_id = uuid.uuid4()
+    device_ids = [uuid.uuid4() for _ in range(devices)]
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, email=f"bench_{user_id.hex[:12]}@bench.local",
+                    password_hash="-"))
+        await db.flush()
+        for device_id in device_ids:
+            db.add(Device(id=device_id, user_id=user_id,
+                          device_name="bench", platform="linux", capabilities={}))
+        await db.commit()
+
+    unit = "actions" if target == "actions" else "tasks"
+    print(f"{unit:>10} {'median ms':>10} {'p95 ms':>10}")
+    seeded = 0
+    try:
+        for volume in sorted(volumes):
+            seed = _seed_action_logs if target == "actions" else _seed_tasks
+            await seed(user_id, device_ids, volume - seeded)
+            seeded = volume
+            timings = sorted(await _time_target(target, str(user_id), runs))
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{volume:>10} {statistics.median(timings):>10.1f} {p95:>10.1f}")
+    finally:
+        async with AsyncSessionLocal() as db:
+            # action_logs has no FK to the partitioned tasks table, so no cascade
+            seeded_tasks = select(Task.id).where(Task.user_id == user_id)
+            await db.execute(delete(ActionLog).where(ActionLog.task_id.in_(seeded_tasks)))
+            await db.execute(delete(Task).where(Task.user_id == user_id))
+            await db.execute(delete(Device).where(Device.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", choices=sorted(TARGETS), default="summary")
+    parser.add_argument("--volumes", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.target, args.volumes, args.runs, args.devices))
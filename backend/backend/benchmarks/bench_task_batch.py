@@ -0,0 +1,104 @@
+"""
+Benchmark: task creation throughput, single POST /v1/tasks vs POST /v1/tasks/batch.
+
+Signs up a throwaway user, enrolls --devices devices and creates one task per
+device per round: sequentially, concurrently (--concurrency in flight) and as
+a single batch request. Runs over HTTP against BASE_URL.
+
+Usage:
+    python -m benchmarks.bench_task_batch --devices 100 --rounds 5
+    BASE_URL=http://api:8000 python -m benchmarks.bench_task_batch --devices 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+BASE_URL = os.getenv("BASE_URL", "http://0.0.0.0:8000")
+ACTIONS = [{"action_id": "a1", "type": "screenshot", "params": {}}]
+
+
+async def _setup(client: httpx.AsyncClient, devices: int) -> tuple[dict, list[str]]:
+    email = f"bench_{uuid.uuid4().hex[:12]}@bench.local"
+    password = "BenchPassword123!"
+    await client.post("/v1/auth/signup", json={"email": email, "password": password})
+    login = await client.post("/v1/auth/login", json={"email": email, "password": password})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    device_ids = []
+    for i in range(devices):
+        response = await client.post("/v1/devices/enroll", headers=headers, json={
+            "device_name": f"bench-{i}", "platform": "linux", "capabilities": {},
+        })
+        response.raise_for_status()
+        device_ids.append(response.json()["device_id"])
+    return headers, device_ids
+
+
+def _item(device_id: str) -> dict:
+    return {"device_id": device_id, "title": "bench", "metadata": {"actions": ACTIONS}}
+
+
+async def _create_one(client: httpx.AsyncClient, headers: dict, device_id: str) -> None:
+    response = await client.post(
+        "/v1/tasks/", headers={**headers, "Idempotency-Key": uuid.uuid4().hex},
+        json=_item(device_id),
+    )
+    response.raise_for_status()
+
+
+async def _sequential(client, headers, device_ids, concurrency) -> None:
+    for device_id in device_ids:
+        await _create_one(client, headers, device_id)
+
+
+async def _concurrent(client, headers, device_ids, concurrency) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(device_id: str) -> None:
+        async with semaphore:
+            await _create_one(client, headers, device_id)
+
+    await asyncio.gather(*(create(d) for d in device_ids))
+
+
+async def _batch(client, headers, device_ids, concurrency) -> None:
+    response = await client.post(
+        "/v1/tasks/batch", headers={**headers, "Idempotency-Key": uuid.uuid4().hex},
+        json={"tasks": [_item(d) for d in device_ids]},
+    )
+    response.raise_for_status()
+
+
+MODES = {"sequential": _sequential, "concurrent": _concurrent, "batch": _batch}
+
+
+async def run(devices: int, rounds: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60, limits=limits) as client:
+        headers, device_ids = await _setup(client, devices)
+        print(f"{'mode':>10} {'median ms':>10} {'tasks/s':>10}")
+        for name, mode in MODES.items():
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                await mode(client, headers, device_ids, concurrency)
+                timings.append(time.perf_counter() - started)
+            median = statistics.median(timings)
+            print(f"{name:>10} {median * 1000:>10.1f} {devices / median:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.devices, args.rounds, args.concurrency))
@@ -120,6 +120,33 @@ class TestAdminUsersAPI:
                 assert "is_active" in user
                 assert "created_at" in user
 
+    async def test_list_users_cursor_pagination(self):
+        """Test paging through users with the next-page cursor"""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            admin_data = await create_user_and_login(is_admin=True)
+            admin_headers = admin_data["headers"]
+            for _ in range(2):
+                await create_user_and_login()
+
+            first = await client.get(
+                "/v1/admin/users", headers=admin_headers, params={"limit": 2}
+            )
+            assert first.status_code == 200
+            assert len(first.json()) == 2
+            cursor = first.headers["X-Next-Cursor"]
+
+            second = await client.get(
+                "/v1/admin/users", headers=admin_headers,
+                params={"limit": 2, "cursor": cursor}
+            )
+            assert second.status_code == 200
+            first_ids = {u["id"] for u in first.json()}
+            assert not first_ids & {u["id"] for u in second.json()}
+            assert all(
+                u["created_at"] <= min(f["created_at"] for f in first.json())
+                for u in second.json()
+            )
+
     async def test_list_users_unauthorized(self):
         """Test that non-admin users cannot list all users"""
         async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
@@ -203,6 +230,8 @@ class TestAdminSystemAPI:
             assert "active_users" in data
             assert "total_devices" in data
             assert "total_tasks" in data
+            assert "snapshot_at" in data
+            assert data["active_users"] <= data["total_users"]
 
     async def test_system_health(self):
         """Test getting system health status"""
@@ -266,6 +266,48 @@ class TestAnalyticsAPI:
             assert "success_rate" in data
             assert "average_execution_time" in data
 
+    async def test_device_specific_analytics_task_share(self):
+        """Test per-device analytics only count that device's tasks"""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            auth_data = await create_user_and_login()
+            auth_headers = auth_data["headers"]
+
+            busy = await create_device(auth_headers)
+            idle = await create_device(auth_headers)
+            for _ in range(3):
+                await create_task(auth_headers, busy["id"])
+            await create_task(auth_headers, idle["id"])
+
+            busy_response = await client.get(
+                f"/v1/analytics/devices/{busy['id']}",
+                headers=auth_headers
+            )
+            assert busy_response.status_code == 200
+            assert busy_response.json()["total_tasks"] == 3
+            assert busy_response.json()["task_share"] == 75.0
+
+            list_response = await client.get(
+                "/v1/analytics/devices",
+                headers=auth_headers
+            )
+            assert list_response.status_code == 200
+            shares = {d["device_id"]: d["task_share"]
+                      for d in list_response.json()["devices"]}
+            assert shares == {busy["id"]: 75.0, idle["id"]: 25.0}
+
+    async def test_device_specific_analytics_unknown_device(self):
+        """Test per-device analytics for unknown or malformed ids"""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            auth_data = await create_user_and_login()
+            auth_headers = auth_data["headers"]
+
+            for device_id in (str(uuid.uuid4()), "not-a-uuid"):
+                response = await client.get(
+                    f"/v1/analytics/devices/{device_id}",
+                    headers=auth_headers
+                )
+                assert response.status_code == 404
+
     async def test_analytics_export(self):
         """Test exporting analytics data"""
         async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
@@ -322,6 +364,29 @@ class TestAnalyticsAPI:
                 response = await client.get(endpoint)
                 assert response.status_code == 401
 
+    async def test_performance_analytics_reflects_new_tasks(self):
+        """Test that repeated performance requests see newly created tasks"""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            auth_data = await create_user_and_login()
+            auth_headers = auth_data["headers"]
+            device = await create_device(auth_headers)
+            await create_task(auth_headers, device["id"])
+
+            first = await client.get("/v1/analytics/performance", headers=auth_headers)
+            repeat = await client.get("/v1/analytics/performance", headers=auth_headers)
+            assert first.status_code == 200
+            assert repeat.json() == first.json()
+            assert first.json()["total_tasks"] == 1
+
+            # Different parameters are cached separately
+            week = await client.get(
+                "/v1/analytics/performance?days=7", headers=auth_headers)
+            assert week.json()["total_tasks"] == 1
+
+            await create_task(auth_headers, device["id"])
+            response = await client.get("/v1/analytics/performance", headers=auth_headers)
+            assert response.json()["total_tasks"] == 2
+
     async def test_analytics_cross_user_isolation(self):
         """Test that users only see their own analytics data"""
         async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
@@ -452,3 +517,30 @@ class TestAnalyticsIntegration:
             # Data should be consistent
             assert perf_data["total_tasks"] >= task_count
             assert device_data["total_devices"] >= 1
+
+    async def test_status_breakdown_follows_task_transitions(self):
+        """Test analytics reflect task status changes without recomputation"""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            auth_data = await create_user_and_login()
+            auth_headers = auth_data["headers"]
+
+            device = await create_device(auth_headers)
+            tasks = [await create_task(auth_headers, device["id"]) for _ in range(3)]
+
+            cancel_response = await client.delete(
+                f"/v1/tasks/{tasks[0]['id']}",
+                headers=auth_headers
+            )
+            assert cancel_response.status_code == 200
+
+            response = await client.get(
+                "/v1/analytics/performance",
+                params={"days": 365},
+                headers=auth_headers
+            )
+            assert response.status_code == 200
+            data = response.json()
+
+            assert data["total_tasks"] == 3
+            assert data["status_breakdown"]["cancelled"] == 1
+            assert sum(data["status_breakdown"].values()) == 3
@@ -0,0 +1,144 @@
+"""
+Unit tests for artifact retention (app.artifact_gc): rule parsing, task
+expiry, listing overlapping prefixes and the per-run advisory lock.
+
+The object store is an in-memory fake; the lock test runs against
+DATABASE_URL and is skipped without Postgres.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app import artifact_gc
+from app.artifact_gc import RetentionRule, _task_expired, collect_prefixes, parse_rules
+from app.config import settings
+from app.db import engine
+from app.storage import ObjectInfo
+
+postgres = pytest.mark.skipif(
+    not settings.database_url.startswith("postgresql"),
+    reason="artifact retention is Postgres only",
+)
+
+NOW = datetime(2026, 6, 1, 12, 0)
+
+
+class FakeStorage:
+    """list_pages over (key, age in days) pairs; records listed prefixes and
+    deleted keys"""
+
+    def __init__(self, objects):
+        self.objects = [
+            ObjectInfo(key, NOW - timedelta(days=age), 1) for key, age in objects]
+        self.listed = []
+        self.deleted = []
+
+    async def list_pages(self, prefix=""):
+        self.listed.append(prefix)
+        yield [o for o in self.objects if o.key.startswith(prefix)]
+
+    async def delete(self, keys):
+        self.deleted += keys
+        return len(keys)
+
+
+class TestParseRules:
+    """ARTIFACT_RETENTION_RULES parsing"""
+
+    def test_longest_prefix_first(self):
+        assert parse_rules(" screenshots/=14, derived/=30,screenshots/tmp/=1 ,") == [
+            RetentionRule("screenshots/tmp/", 1),
+            RetentionRule("screenshots/", 14),
+            RetentionRule("derived/", 30),
+        ]
+
+    def test_empty(self):
+        assert parse_rules(None) == []
+        assert parse_rules("") == []
+
+    def test_invalid_days(self):
+        with pytest.raises(ValueError):
+            parse_rules("screenshots/=two")
+
+
+class TestTaskExpired:
+    """Task age against the default or the owner's retention days"""
+
+    def test_default_days(self):
+        assert _task_expired((NOW - timedelta(days=8), None), 7, NOW)
+        assert not _task_expired((NOW - timedelta(days=6), None), 7, NOW)
+
+    def test_user_preference_wins(self):
+        assert not _task_expired((NOW - timedelta(days=8), 30), 7, NOW)
+        assert _task_expired((NOW - timedelta(days=2), 1), 7, NOW)
+        assert _task_expired((NOW - timedelta(hours=1), 0), 7, NOW)
+
+    def test_deleted_task(self):
+        assert _task_expired(None, 7, NOW)
+
+
+@pytest.mark.asyncio
+class TestCollectPrefixes:
+    """Overlapping prefixes are listed once and the longest rule applies"""
+
+    async def test_nested_prefixes_are_listed_once(self):
+        storage = FakeStorage([
+            ("screenshots/a.png", 20),
+            ("screenshots/b.png", 5),
+            ("screenshots/tmp/c.png", 2),
+            ("screenshots/tmp/d.png", 0),
+            ("derived/thumb/x.webp", 40),
+            ("other/e.png", 100),
+        ])
+        rules = parse_rules("screenshots/=14,screenshots/tmp/=1,derived/=30")
+
+        deleted = await collect_prefixes(storage, rules, NOW)
+
+        assert sorted(storage.listed) == ["derived/", "screenshots/"]
+        assert deleted == 3
+        assert set(storage.deleted) >= {
+            "screenshots/a.png", "screenshots/tmp/c.png", "derived/thumb/x.webp"}
+        assert "screenshots/b.png" not in storage.deleted
+        assert "screenshots/tmp/d.png" not in storage.deleted
+
+    async def test_dry_run_deletes_nothing(self):
+        storage = FakeStorage([("screenshots/a.png", 20)])
+        assert await collect_prefixes(storage, parse_rules("screenshots/=14"), NOW, True) == 1
+        assert storage.deleted == []
+
+
+@postgres
+@pytest.mark.asyncio
+class TestCollectorLock:
+    """Only one process collects at a time"""
+
+    async def test_run_is_skipped_while_locked(self, monkeypatch):
+        storage = FakeStorage([("screenshots/a.png", 20)])
+        monkeypatch.setattr(artifact_gc, "get_storage", lambda: storage)
+        monkeypatch.setattr(settings, "artifact_retention_rules", "screenshots/=14")
+        monkeypatch.setattr(settings, "artifact_task_retention_days", None)
+        monkeypatch.setattr(artifact_gc, "collect_unreferenced",
+                            lambda *args: _zero())
+
+        try:
+            async with engine.connect() as other:
+                other = await other.execution_options(isolation_level="AUTOCOMMIT")
+                await other.execute(
+                    text("SELECT pg_advisory_lock(:key)"), {"key": artifact_gc._LOCK_KEY})
+                try:
+                    assert await artifact_gc.collect_artifacts(now=NOW) == {}
+                    assert storage.listed == []
+                finally:
+                    await other.execute(
+                        text("SELECT pg_advisory_unlock(:key)"), {"key": artifact_gc._LOCK_KEY})
+
+            assert await artifact_gc.collect_artifacts(now=NOW) == {
+                "prefix": 1, "unreferenced": 0}
+        finally:
+            await engine.dispose()
+
+
+async def _zero() -> int:
+    return 0
@@ -3,6 +3,7 @@ Comprehensive tests for Artifacts endpoints.
 Tests all artifact endpoints with various scenarios including edge cases and error conditions.
 """
 
+import hashlib
 import os
 import uuid
 import pytest
@@ -390,6 +391,23 @@ class TestArtifactPresigning:
                 "Unexpected response for cross-user access"
             )
 
+    @pytest.mark.asyncio
+    async def test_presign_artifact_invalid_sha256(self):
+        """Test that a malformed content digest is rejected."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+            task_id = await create_task(client, access_token, device_id)
+
+            for sha256 in ["abc", "z" * 64, "0" * 63]:
+                response = await client.post(
+                    "/v1/artifacts/presign",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    json={"task_id": task_id, "filename": "s.png",
+                          "size": 1024, "sha256": sha256},
+                )
+                assert response.status_code == 422
+
 
 class TestArtifactIntegration:
     """Integration tests for artifact workflows."""
@@ -565,6 +583,52 @@ class TestArtifactIntegration:
             else:
                 assert response.status_code == 200
 
+    @pytest.mark.asyncio
+    async def test_presign_uses_external_endpoint_and_cached_bucket(self):
+        """Test that upload URLs point at the external endpoint and the bucket is checked once."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+            task_id = await create_task(client, access_token, device_id)
+
+            response = await client.post(
+                "/v1/artifacts/presign",
+                headers={"Authorization": f"Bearer {access_token}"},
+                json={"task_id": task_id, "filename": "endpoint.png", "size": 1024},
+            )
+            assert response.status_code == 200
+            upload_url = urlparse(response.json()["upload_url"])
+            query = parse_qs(upload_url.query)
+            if "X-Amz-Signature" not in query:
+                # Local backend: HMAC-signed URL of this server
+                assert "signature" in query
+                assert upload_url.path.startswith("/v1/artifacts/files/")
+            elif external := os.getenv("MINIO_EXTERNAL_ENDPOINT"):
+                assert upload_url.netloc == urlparse(external).netloc
+
+            # The presign above already checked (or created) the bucket
+            bucket = await client.post(
+                "/v1/artifacts/create-bucket",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert bucket.status_code == 200
+            assert bucket.json()["message"].endswith("already exists")
+
+    @pytest.mark.asyncio
+    async def test_local_artifact_upload_rejects_bad_signature(self):
+        """Local-backend upload URLs only accept a valid signature."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+            response = await client.put(
+                "/v1/artifacts/files/tasks/t1/x/forged.png",
+                params={"expires": 4102444800, "size": 4, "signature": "0" * 64},
+                content=b"fake",
+            )
+
+            # 404 when the S3 backend is configured (no local files route)
+            assert response.status_code in (403, 404)
+            response = await client.get("/v1/artifacts/files/tasks/t1/x/forged.png")
+            assert response.status_code == 404
+
     @pytest.mark.asyncio
     async def test_artifact_presign_different_task_types(self):
         """Test artifact presigning for different types of tasks."""
@@ -626,3 +690,90 @@ class TestArtifactIntegration:
                 assert artifact_response.status_code == 200
                 data = artifact_response.json()
                 assert task_id in data["s3_url"]
+
+    @pytest.mark.asyncio
+    async def test_content_addressed_presign_skips_known_content(self):
+        """Test that presigning content the user already stored returns no upload URL."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            headers = {"Authorization": f"Bearer {access_token}"}
+            device_id, _ = await enroll_device(client, access_token)
+            first_task = await create_task(client, access_token, device_id, "First")
+            second_task = await create_task(client, access_token, device_id, "Second")
+
+            content = f"idle screen {uuid.uuid4().hex}".encode()
+            sha256 = hashlib.sha256(content).hexdigest()
+            body = {"filename": "s.png", "size": len(content), "sha256": sha256}
+
+            first = await client.post(
+                "/v1/artifacts/presign", headers=headers, json={"task_id": first_task, **body})
+            assert first.status_code == 200
+            data = first.json()
+            assert data["exists"] is False
+            assert sha256 in data["s3_url"]
+
+            upload = await client.put(
+                data["upload_url"], content=content, headers=data["upload_headers"])
+            assert upload.status_code == 200
+
+            commit = await client.post(
+                "/v1/artifacts/commit", headers=headers,
+                json={"task_id": first_task, "sha256": sha256, "etag": upload.headers["etag"]},
+            )
+            assert commit.status_code == 200
+            assert commit.json()["s3_url"] == data["s3_url"]
+
+            second = await client.post(
+                "/v1/artifacts/presign", headers=headers, json={"task_id": second_task, **body})
+            assert second.status_code == 200
+            assert second.json()["exists"] is True
+            assert second.json()["upload_url"] is None
+            assert second.json()["s3_url"] == data["s3_url"]
+
+    @pytest.mark.asyncio
+    async def test_content_addressed_dedup_is_per_user(self):
+        """Test that content stored by another user still has to be uploaded and committed."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+            content = f"shared screen {uuid.uuid4().hex}".encode()
+            sha256 = hashlib.sha256(content).hexdigest()
+            body = {"filename": "s.png", "size": len(content), "sha256": sha256}
+
+            owner_token, _ = await create_user_and_get_token(client)
+            owner_headers = {"Authorization": f"Bearer {owner_token}"}
+            owner_device, _ = await enroll_device(client, owner_token)
+            owner_task = await create_task(client, owner_token, owner_device)
+            data = (await client.post(
+                "/v1/artifacts/presign", headers=owner_headers,
+                json={"task_id": owner_task, **body})).json()
+            upload = await client.put(
+                data["upload_url"], content=content, headers=data["upload_headers"])
+            await client.post(
+                "/v1/artifacts/commit", headers=owner_headers,
+                json={"task_id": owner_task, "sha256": sha256, "etag": upload.headers["etag"]},
+            )
+
+            other_token, _ = await create_user_and_get_token(client)
+            other_headers = {"Authorization": f"Bearer {other_token}"}
+            other_device, _ = await enroll_device(client, other_token)
+            other_task = await create_task(client, other_token, other_device)
+
+            presign = await client.post(
+                "/v1/artifacts/presign", headers=other_headers,
+                json={"task_id": other_task, **body})
+            assert presign.status_code == 200
+            assert presign.json()["exists"] is False
+            assert presign.json()["upload_url"]
+
+            # Knowing the digest is not enough to reference the content
+            commit = await client.post(
+                "/v1/artifacts/commit", headers=other_headers,
+                json={"task_id": other_task, "sha256": sha256, "etag": f'"{"0" * 32}"'},
+            )
+            assert commit.status_code == 409
+
+            # Neither is another user's task
+            commit = await client.post(
+                "/v1/artifacts/commit", headers=other_headers,
+                json={"task_id": owner_task, "sha256": sha256, "etag": upload.headers["etag"]},
+            )
+            assert commit.status_code == 404
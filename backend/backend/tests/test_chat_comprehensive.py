@@ -0,0 +1,354 @@
+"""
+Comprehensive tests for chat endpoints.
+Tests the chat agent commands against a device connected over WebSocket.
+"""
+
+import os
+import uuid
+import pytest
+import httpx
+import websockets
+import json
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Tuple
+
+
+BASE_URL = os.getenv("BASE_URL", "http://0.0.0.0:8000")
+WS_URL = BASE_URL.replace("http", "ws")
+
+
+async def create_user_and_get_token(client: httpx.AsyncClient) -> Tuple[str, str]:
+    """Helper function to create a user and return access token and user email."""
+    email = f"chat_test_{uuid.uuid4().hex[:12]}@test.com"
+    password = "SecurePassword123!"
+
+    # Signup
+    await client.post("/v1/auth/signup", json={"email": email, "password": password})
+
+    # Login
+    login_response = await client.post(
+        "/v1/auth/login", json={"email": email, "password": password}
+    )
+
+    access_token = login_response.json()["access_token"]
+    return access_token, email
+
+
+async def enroll_device(
+    client: httpx.AsyncClient, access_token: str, device_name: str = "Chat Test Device"
+) -> Tuple[str, str]:
+    """Helper function to enroll a device and return device_id and device_token."""
+    device_data = {
+        "device_name": device_name,
+        "platform": "linux",
+        "capabilities": {"screen": True},
+    }
+
+    response = await client.post(
+        "/v1/devices/enroll", headers={"Authorization": f"Bearer {access_token}"}, json=device_data
+    )
+
+    assert response.status_code == 201
+    data = response.json()
+    return data["device_id"], data["device_token"]
+
+
+async def answer_task(ws, status: str, result: dict | None = None) -> dict:
+    """Receive the next task.exec on `ws` and report every action with `status`."""
+    envelope = json.loads(await asyncio.wait_for(ws.recv(), timeout=5.0))
+    assert envelope["type"] == "task.exec"
+    await ws.send(json.dumps({
+        "type": "task.result",
+        "task_id": envelope["task_id"],
+        "results": [
+            {"action_id": action["action_id"], "status": status, "result": result or {}}
+            for action in envelope["actions"]
+        ],
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "signature": "",
+    }))
+    return envelope
+
+
+class TestChatAgentScreenshot:
+    """Test the screenshot command of /v1/chat/agent."""
+
+    @pytest.mark.asyncio
+    async def test_screenshot_answers_when_device_reports_result(self):
+        """The reply is sent as soon as the device reports, with the screenshot URL."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+            shot_url = f"http://example.com/{uuid.uuid4().hex}.png"
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                started = time.monotonic()
+                request = asyncio.create_task(client.post(
+                    "/v1/chat/agent",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    json={"message": "screenshot", "device_id": device_id},
+                ))
+                envelope = await answer_task(ws, "done", {"screenshot_url": shot_url})
+                response = await request
+                elapsed = time.monotonic() - started
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["task_created"] is True
+            assert data["task_id"] == envelope["task_id"]
+            assert data["screenshot_url"] == shot_url
+            assert data["assistant_message"]["content"].startswith("✅ Скриншот готов!")
+            assert shot_url in data["assistant_message"]["content"]
+            # Well under CHAT_SCREENSHOT_WAIT_SECONDS
+            assert elapsed < 5
+
+    @pytest.mark.asyncio
+    async def test_screenshot_reports_failed_task(self):
+        """A failed screenshot task is reported instead of the pending message."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                request = asyncio.create_task(client.post(
+                    "/v1/chat/agent",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    json={"message": "сделай скриншот", "device_id": device_id},
+                ))
+                await answer_task(ws, "failed", {"error": "no display"})
+                response = await request
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["task_created"] is True
+            assert data["screenshot_url"] is None
+            assert data["assistant_message"]["content"] == "⚠️ Не удалось сделать скриншот"
+
+    @pytest.mark.asyncio
+    async def test_screenshot_of_foreign_device_creates_no_task(self):
+        """Test screenshot command with a device of another user."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            owner_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, owner_token)
+            other_token, _ = await create_user_and_get_token(client)
+
+            response = await client.post(
+                "/v1/chat/agent",
+                headers={"Authorization": f"Bearer {other_token}"},
+                json={"message": "screenshot", "device_id": device_id},
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["task_created"] is False
+            assert data["assistant_message"]["content"] == \
+                "⚠️ Устройство не найдено или не принадлежит вам"
+
+
+async def read_sse(response: httpx.Response) -> list[Tuple[str, dict]]:
+    """Collect (event, data) pairs of a server-sent event stream until it ends."""
+    events, event = [], None
+    async for line in response.aiter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+class TestAgentChatStream:
+    """Test the server-sent events of /v1/agent/chat/stream."""
+
+    @pytest.mark.asyncio
+    async def test_stream_without_task_answers_at_once(self):
+        """Test a message that creates no task."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+
+            async with client.stream(
+                "POST", "/v1/agent/chat/stream",
+                headers={"Authorization": f"Bearer {access_token}"},
+                json={"message": "hello"},
+            ) as response:
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("text/event-stream")
+                events = await read_sse(response)
+
+            assert [name for name, _ in events] == ["accepted", "answer"]
+            accepted, answer = events[0][1], events[1][1]
+            assert accepted["message"]["content"] == "hello"
+            assert answer["session_id"] == accepted["session_id"]
+            assert answer["task_created"] is False
+
+    @pytest.mark.asyncio
+    async def test_stream_follows_task_until_result(self):
+        """Test the event sequence of a turn executed by a connected device."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+            shot_url = f"http://example.com/{uuid.uuid4().hex}.png"
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                async with client.stream(
+                    "POST", "/v1/agent/chat/stream",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    json={"message": "take a screenshot", "device_id": device_id},
+                ) as response:
+                    assert response.status_code == 200
+                    reader = asyncio.create_task(read_sse(response))
+
+                    envelope = json.loads(await asyncio.wait_for(ws.recv(), timeout=5.0))
+                    action_id = envelope["actions"][0]["action_id"]
+                    await ws.send(json.dumps({
+                        "type": "task.progress",
+                        "task_id": envelope["task_id"],
+                        "action_id": action_id,
+                        "status": "running",
+                    }))
+                    await ws.send(json.dumps({
+                        "type": "task.result",
+                        "task_id": envelope["task_id"],
+                        "results": [{
+                            "action_id": action_id,
+                            "status": "done",
+                            "result": {"screenshot_url": shot_url},
+                        }],
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        "signature": "",
+                    }))
+                    events = await asyncio.wait_for(reader, timeout=10.0)
+
+            names = [name for name, _ in events]
+            assert names == [
+                "accepted", "task", "delivered", "progress", "action", "screenshot", "answer"]
+            data = dict(events)
+            task_id = envelope["task_id"]
+            assert data["task"] == {"task_id": task_id, "status": "queued"}
+            assert data["progress"] == {
+                "task_id": task_id, "action_id": action_id, "status": "running"}
+            assert data["action"] == {"task_id": task_id, "action_id": action_id, "status": "done"}
+            assert data["screenshot"]["url"] == shot_url
+            assert data["answer"]["task_id"] == task_id
+            assert data["answer"]["task_status"] == "completed"
+
+
+class TestChatSessionHistory:
+    """Test the message tail and counters of chat sessions."""
+
+    @pytest.mark.asyncio
+    async def test_session_tail_pages_back_through_history(self):
+        """Test that the session returns the newest messages and pages back with the cursor."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            headers = {"Authorization": f"Bearer {access_token}"}
+
+            session = (await client.post(
+                "/v1/chat/sessions", headers=headers, json={"title": "History"})).json()
+            assert session["message_count"] == 0
+            sent = []
+            for i in range(5):
+                response = await client.post(
+                    f"/v1/chat/sessions/{session['id']}/messages",
+                    headers=headers, json={"content": f"message {i}", "role": "user"},
+                )
+                assert response.status_code == 201
+                sent.append(response.json())
+
+            pages, cursor = [], None
+            while True:
+                params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+                response = await client.get(
+                    f"/v1/chat/sessions/{session['id']}", headers=headers, params=params)
+                assert response.status_code == 200
+                pages.append([m["content"] for m in response.json()["messages"]])
+                cursor = response.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+
+            # Each page is in creation order, pages go from newest to oldest
+            assert pages == [
+                ["message 3", "message 4"], ["message 1", "message 2"], ["message 0"]]
+
+            data = response.json()
+            assert data["message_count"] == 5
+            assert data["last_message_at"] == sent[-1]["created_at"]
+
+            listed = (await client.get("/v1/chat/sessions", headers=headers)).json()
+            assert [(s["id"], s["message_count"]) for s in listed] == [(session["id"], 5)]
+
+    @pytest.mark.asyncio
+    async def test_agent_turn_counts_both_messages(self):
+        """Test that an agent turn adds the user and the assistant message to the counters."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            headers = {"Authorization": f"Bearer {access_token}"}
+
+            turn = (await client.post(
+                "/v1/agent/chat", headers=headers, json={"message": "hello"})).json()
+            session = (await client.get(
+                f"/v1/chat/sessions/{turn['session_id']}", headers=headers)).json()
+
+            assert session["message_count"] == 2
+            assert len(session["messages"]) == 2
+
+
+class TestChatSearch:
+    """Test full-text search over chat messages."""
+
+    @pytest.mark.asyncio
+    async def test_search_ranks_and_escapes_snippets(self):
+        """Test that matches are ranked and snippets are escaped HTML."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            headers = {"Authorization": f"Bearer {access_token}"}
+            session = (await client.post(
+                "/v1/chat/sessions", headers=headers, json={"title": "Search"})).json()
+            for content in [
+                "<img src=x onerror=alert(1)> screenshot",
+                "screenshot screenshot of the screen",
+                "nothing to see here",
+            ]:
+                await client.post(
+                    f"/v1/chat/sessions/{session['id']}/messages",
+                    headers=headers, json={"content": content, "role": "user"},
+                )
+
+            response = await client.get(
+                "/v1/chat/search", headers=headers, params={"q": "screenshot"})
+
+            assert response.status_code == 200
+            hits = response.json()
+            assert [h["content"] for h in hits] == [
+                "screenshot screenshot of the screen", "<img src=x onerror=alert(1)> screenshot"]
+            assert hits[0]["rank"] > hits[1]["rank"]
+            # Only the highlight tags are markup
+            snippet = hits[1]["snippet"]
+            assert "<b>screenshot</b>" in snippet
+            assert "&gt;" in snippet
+            assert "<" not in snippet.replace("<b>", "").replace("</b>", "")
+            assert all(h["session_title"] == "Search" for h in hits)
+
+    @pytest.mark.asyncio
+    async def test_search_is_scoped_to_user(self):
+        """Test that other users' messages are not found."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=20) as client:
+            owner_token, _ = await create_user_and_get_token(client)
+            word = f"word{uuid.uuid4().hex[:8]}"
+            session = (await client.post(
+                "/v1/chat/sessions", headers={"Authorization": f"Bearer {owner_token}"},
+                json={"title": "Private"})).json()
+            await client.post(
+                f"/v1/chat/sessions/{session['id']}/messages",
+                headers={"Authorization": f"Bearer {owner_token}"},
+                json={"content": word, "role": "user"},
+            )
+            other_token, _ = await create_user_and_get_token(client)
+
+            response = await client.get(
+                "/v1/chat/search", headers={"Authorization": f"Bearer {other_token}"},
+                params={"q": word})
+
+            assert response.status_code == 200
+            assert response.json() == []
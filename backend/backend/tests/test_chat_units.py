@@ -0,0 +1,157 @@
+"""
+Unit tests for chat on databases without the Postgres-only pieces, run on
+in-memory SQLite: session counters (the ChatMessage mapper events in
+app.models) and the substring search fallback of app.search.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import search
+from app.db import Base
+from app.models import ChatMessage, ChatSession, User
+from app.pagination import encode_score_cursor
+from app.search import search_chat_messages
+
+
+@pytest_asyncio.fixture
+async def sqlite_session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        yield db
+    await engine.dispose()
+
+
+async def _chat(db) -> ChatSession:
+    user = User(email=f"{uuid.uuid4().hex[:12]}@test.local", password_hash="-")
+    db.add(user)
+    await db.flush()
+    chat = ChatSession(user_id=user.id, title="units")
+    db.add(chat)
+    await db.commit()
+    return chat
+
+
+@pytest.mark.asyncio
+class TestChatSessionCounters:
+    """message_count and last_message_at follow ORM inserts and deletes"""
+
+    async def test_insert_counts_messages_and_keeps_latest_time(self, sqlite_session):
+        db = sqlite_session
+        chat = await _chat(db)
+        start = datetime(2026, 1, 1, 12, 0)
+
+        db.add_all([
+            ChatMessage(session_id=chat.id, role="user", content="one", created_at=start),
+            ChatMessage(session_id=chat.id, role="assistant", content="two",
+                        created_at=start + timedelta(minutes=1)),
+        ])
+        await db.commit()
+        # Out of order: an older message does not move last_message_at back
+        db.add(ChatMessage(session_id=chat.id, role="user", content="late",
+                           created_at=start - timedelta(minutes=5)))
+        await db.commit()
+
+        await db.refresh(chat)
+        assert chat.message_count == 3
+        assert chat.last_message_at == start + timedelta(minutes=1)
+
+    async def test_delete_recounts_and_recomputes_latest_time(self, sqlite_session):
+        db = sqlite_session
+        chat = await _chat(db)
+        start = datetime(2026, 1, 1, 12, 0)
+        first = ChatMessage(session_id=chat.id, role="user", content="one", created_at=start)
+        last = ChatMessage(session_id=chat.id, role="user", content="two",
+                           created_at=start + timedelta(minutes=1))
+        db.add_all([first, last])
+        await db.commit()
+
+        await db.delete(last)
+        await db.commit()
+        await db.refresh(chat)
+        assert chat.message_count == 1
+        assert chat.last_message_at == start
+
+        await db.delete(first)
+        await db.commit()
+        await db.refresh(chat)
+        assert chat.message_count == 0
+        assert chat.last_message_at is None
+
+
+class TestSearchSnippets:
+    """Snippets are escaped HTML with only <b> highlight tags"""
+
+    def test_headline_is_escaped_around_highlights(self):
+        headline = "<script>x</script> \x02screenshot\x03 & more"
+        assert search._snippet_html(headline) == \
+            "&lt;script&gt;x&lt;/script&gt; <b>screenshot</b> &amp; more"
+
+    def test_substring_highlight_escapes_and_ignores_stray_selectors(self):
+        assert search._highlight("<i>Take</i> a \x02SHOT", ["shot", "take"]) == \
+            "&lt;i&gt;<b>Take</b>&lt;/i&gt; a <b>SHOT</b>"
+
+    def test_query_terms(self):
+        assert search._query_terms('"open browser" or tab -firefox -') == (
+            ["open", "browser", "tab"], ["firefox"])
+
+
+@pytest.mark.asyncio
+class TestSubstringSearch:
+    """search_chat_messages without content_tsv"""
+
+    async def _seed(self, db):
+        chat = await _chat(db)
+        other = ChatSession(user_id=chat.user_id, title="other")
+        db.add(other)
+        await db.flush()
+        for session, content in [
+            (chat, "Take a SCREENSHOT please"),
+            (chat, "screenshot of the browser"),
+            (chat, "open the browser"),
+            (chat, "100%_done"),
+            (other, "another screenshot"),
+        ]:
+            db.add(ChatMessage(session_id=session.id, role="user", content=content))
+        await db.commit()
+        return chat, other
+
+    async def test_all_words_required_and_excluded_words_rejected(self, sqlite_session):
+        chat, _ = await self._seed(sqlite_session)
+
+        rows = await search_chat_messages(sqlite_session, chat.user_id, "screenshot", 10)
+        assert sorted(m.content for m, *_ in rows) == [
+            "Take a SCREENSHOT please", "another screenshot", "screenshot of the browser"]
+
+        rows = await search_chat_messages(
+            sqlite_session, chat.user_id, "screenshot -browser", 10, session_id=chat.id)
+        assert [(m.content, title, rank, snippet) for m, title, rank, snippet in rows] == [
+            ("Take a SCREENSHOT please", "units", 0.0, "Take a <b>SCREENSHOT</b> please")]
+
+    async def test_like_wildcards_are_literal(self, sqlite_session):
+        chat, _ = await self._seed(sqlite_session)
+        rows = await search_chat_messages(sqlite_session, chat.user_id, "%_", 10)
+        assert [m.content for m, *_ in rows] == ["100%_done"]
+
+    async def test_cursor_pages_through_hits(self, sqlite_session):
+        chat, _ = await self._seed(sqlite_session)
+        seen, cursor = [], None
+        while True:
+            rows = await search_chat_messages(
+                sqlite_session, chat.user_id, "screenshot", 2, cursor=cursor)
+            seen += [m.content for m, *_ in rows]
+            if len(rows) < 2:
+                break
+            last, _, rank, _ = rows[-1]
+            cursor = encode_score_cursor(rank, last.id)
+        assert len(seen) == len(set(seen)) == 3
+
+    async def test_other_users_messages_are_not_found(self, sqlite_session):
+        await self._seed(sqlite_session)
+        assert await search_chat_messages(sqlite_session, uuid.uuid4(), "screenshot", 10) == []
@@ -0,0 +1,126 @@
+"""
+Unit tests for the S3 helpers of app.clients: the per-process bucket check
+and the client used to sign presigned URLs.
+"""
+
+import asyncio
+from urllib.parse import urlparse
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+from app import clients
+
+
+def _client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code}}, "Operation")
+
+
+class FakeS3:
+    """head_bucket/create_bucket recording calls; `missing` buckets 404 on
+    head, `create_error` is raised by create_bucket"""
+
+    def __init__(self, missing=(), create_error=None):
+        self.missing = set(missing)
+        self.create_error = create_error
+        self.calls = []
+
+    def head_bucket(self, Bucket):
+        self.calls.append(("head_bucket", Bucket))
+        if Bucket in self.missing:
+            raise _client_error("404")
+
+    def create_bucket(self, Bucket):
+        self.calls.append(("create_bucket", Bucket))
+        if self.create_error is not None:
+            raise self.create_error
+        self.missing.discard(Bucket)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(clients, "get_s3_client", lambda: fake)
+    monkeypatch.setattr(clients, "_ready_buckets", set())
+    monkeypatch.setattr(clients, "_bucket_lock", asyncio.Lock())
+    return fake
+
+
+@pytest.mark.asyncio
+class TestEnsureBucket:
+    """The bucket is checked once per process, even under concurrency"""
+
+    async def test_existing_bucket_is_checked_once(self, s3):
+        results = await asyncio.gather(*(clients.ensure_bucket("artifacts") for _ in range(5)))
+        assert results == [False] * 5
+        assert await clients.ensure_bucket("artifacts") is False
+        assert s3.calls == [("head_bucket", "artifacts")]
+
+    async def test_missing_bucket_is_created_once(self, s3):
+        s3.missing.add("artifacts")
+        assert await clients.ensure_bucket("artifacts") is True
+        assert await clients.ensure_bucket("artifacts") is False
+        assert s3.calls == [("head_bucket", "artifacts"), ("create_bucket", "artifacts")]
+
+    async def test_bucket_created_by_another_process(self, s3):
+        s3.missing.add("artifacts")
+        s3.create_error = _client_error("BucketAlreadyOwnedByYou")
+        assert await clients.ensure_bucket("artifacts") is False
+        assert await clients.ensure_bucket("artifacts") is False
+        assert len(s3.calls) == 2
+
+    async def test_failed_creation_is_not_cached(self, s3):
+        s3.missing.add("artifacts")
+        s3.create_error = _client_error("AccessDenied")
+        with pytest.raises(ClientError):
+            await clients.ensure_bucket("artifacts")
+
+        s3.create_error = None
+        assert await clients.ensure_bucket("artifacts") is True
+
+    async def test_buckets_are_cached_separately(self, s3):
+        await clients.ensure_bucket("artifacts")
+        await clients.ensure_bucket("screenshots")
+        assert [bucket for _, bucket in s3.calls] == ["artifacts", "screenshots"]
+
+    async def test_no_client(self, monkeypatch):
+        monkeypatch.setattr(clients, "get_s3_client", lambda: None)
+        monkeypatch.setattr(clients, "_ready_buckets", set())
+        with pytest.raises(HTTPException) as exc:
+            await clients.ensure_bucket("artifacts")
+        assert exc.value.status_code == 500
+
+
+class TestPresignClient:
+    """Presigned URLs point at MINIO_EXTERNAL_ENDPOINT and are signed locally"""
+
+    @pytest.fixture(autouse=True)
+    def minio(self, monkeypatch):
+        monkeypatch.setattr(clients.settings, "minio_endpoint", "http://minio:9000")
+        monkeypatch.setattr(clients.settings, "minio_access_key", "key")
+        monkeypatch.setattr(clients.settings, "minio_secret_key", "secret")
+        monkeypatch.setattr(clients, "_s3_client", None)
+        monkeypatch.setattr(clients, "_s3_presign_client", None)
+
+    def _presign(self) -> str:
+        return clients.get_s3_presign_client().generate_presigned_url(
+            "put_object", Params={"Bucket": "artifacts", "Key": "tasks/t1/a.png"},
+            ExpiresIn=300)
+
+    def test_external_endpoint(self, monkeypatch):
+        monkeypatch.setattr(clients.settings, "minio_external_endpoint", "https://files.example.com")
+
+        url = urlparse(self._presign())
+
+        assert (url.scheme, url.netloc, url.path) == (
+            "https", "files.example.com", "/artifacts/tasks/t1/a.png")
+        assert "X-Amz-Signature=" in url.query
+        assert clients.get_s3_presign_client() is clients.get_s3_presign_client()
+        assert clients.get_s3_presign_client() is not clients.get_s3_client()
+
+    def test_internal_endpoint_without_external(self, monkeypatch):
+        monkeypatch.setattr(clients.settings, "minio_external_endpoint", None)
+
+        assert urlparse(self._presign()).netloc == "minio:9000"
+        assert clients.get_s3_presign_client() is clients.get_s3_client()
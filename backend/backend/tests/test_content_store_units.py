@@ -0,0 +1,170 @@
+"""
+Unit tests for content-addressed artifacts (app.content_store): per-user
+dedup, committing presigned uploads and the Postgres requirement.
+
+The reference tests run against DATABASE_URL and are skipped without
+Postgres; the object store is an in-memory fake.
+"""
+
+import hashlib
+import uuid
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.content_store import (
+    add_ref,
+    cas_key,
+    commit_upload,
+    is_stored,
+    record_artifact,
+    referenced_by,
+    require_content_store,
+)
+from app.db import AsyncSessionLocal, engine
+from app.models import Artifact, ArtifactRef, Device, Task, User
+
+postgres = pytest.mark.skipif(
+    not settings.database_url.startswith("postgresql"),
+    reason="content-addressed artifacts are Postgres only",
+)
+
+
+class FakeStorage:
+    """Object ETags by key"""
+
+    def __init__(self):
+        self.etags = {}
+
+    async def etag(self, key):
+        return self.etags.get(key)
+
+    async def exists(self, key):
+        return key in self.etags
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def dispose_engine():
+    """Pooled connections are bound to this test's event loop"""
+    yield
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def owner():
+    """A user with a device and two tasks: (user_id, [task ids])"""
+    user_id, device_id = uuid.uuid4(), uuid.uuid4()
+    task_ids = [f"cas_{uuid.uuid4().hex[:12]}" for _ in range(2)]
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, email=f"cas_{user_id.hex[:12]}@test.local", password_hash="-"))
+        await db.flush()
+        db.add(Device(id=device_id, user_id=user_id, device_name="cas",
+                      platform="linux", capabilities={}))
+        await db.flush()
+        for task_id in task_ids:
+            db.add(Task(id=task_id, user_id=user_id, device_id=device_id,
+                        title="cas", payload={}))
+        await db.commit()
+    try:
+        yield user_id, task_ids
+    finally:
+        async with AsyncSessionLocal() as db:
+            digests = select(ArtifactRef.sha256).where(ArtifactRef.task_id.in_(task_ids))
+            await db.execute(delete(Artifact).where(Artifact.sha256.in_(digests)))
+            await db.execute(delete(Task).where(Task.user_id == user_id))
+            await db.execute(delete(Device).where(Device.id == device_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+
+def _digest() -> str:
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+
+@postgres
+@pytest.mark.asyncio
+class TestReferences:
+    """Dedup is scoped to the caller and refs need a committed upload"""
+
+    async def test_referenced_by_is_per_user(self, owner):
+        user_id, (task_id, _) = owner
+        sha256 = _digest()
+        async with AsyncSessionLocal() as db:
+            await record_artifact(db, sha256, 10, stored=True)
+            assert not await referenced_by(db, sha256, user_id)
+
+            await add_ref(db, sha256, task_id)
+            await add_ref(db, sha256, task_id)
+            await db.commit()
+
+            assert await referenced_by(db, sha256, user_id)
+            assert not await referenced_by(db, sha256, uuid.uuid4())
+            assert await db.scalar(
+                select(Artifact.ref_count).where(Artifact.sha256 == sha256)) == 1
+
+    async def test_commit_requires_the_uploaded_object(self, owner):
+        sha256 = _digest()
+        storage = FakeStorage()
+        async with AsyncSessionLocal() as db:
+            await record_artifact(db, sha256, 10, stored=False)
+            await db.commit()
+
+            # Presigned but not uploaded yet
+            assert not await commit_upload(db, storage, sha256, '"abc"')
+
+            storage.etags[cas_key(sha256)] = '"abc"'
+            assert not await commit_upload(db, storage, sha256, '"other"')
+            assert await commit_upload(db, storage, sha256, "abc")
+            await db.commit()
+
+            assert await db.scalar(
+                select(Artifact.stored_at).where(Artifact.sha256 == sha256)) is not None
+
+    async def test_is_stored_needs_a_row(self, owner):
+        sha256 = _digest()
+        storage = FakeStorage()
+        storage.etags[cas_key(sha256)] = '"abc"'
+        async with AsyncSessionLocal() as db:
+            # An object without a row may be about to be collected
+            assert not await is_stored(db, storage, sha256)
+
+            await record_artifact(db, sha256, 10, stored=False)
+            await db.commit()
+            assert await is_stored(db, storage, sha256)
+
+            del storage.etags[cas_key(sha256)]
+            assert not await is_stored(db, storage, sha256)
+
+            await db.execute(delete(Artifact).where(Artifact.sha256 == sha256))
+            await db.commit()
+
+    async def test_commit_without_presign(self):
+        sha256 = _digest()
+        storage = FakeStorage()
+        storage.etags[cas_key(sha256)] = '"abc"'
+        async with AsyncSessionLocal() as db:
+            assert not await commit_upload(db, storage, sha256, '"abc"')
+
+
+@pytest.mark.asyncio
+class TestRequireContentStore:
+    """Content addressing is refused without Postgres"""
+
+    async def test_rejected_on_sqlite(self):
+        sqlite = create_async_engine("sqlite+aiosqlite://")
+        try:
+            async with async_sessionmaker(sqlite)() as db:
+                with pytest.raises(HTTPException) as exc:
+                    require_content_store(db)
+            assert exc.value.status_code == 501
+        finally:
+            await sqlite.dispose()
+
+    @postgres
+    async def test_allowed_on_postgres(self):
+        async with AsyncSessionLocal() as db:
+            require_content_store(db)
@@ -94,6 +94,26 @@ class TestDebugAPI:
             data = response.json()
             assert isinstance(data, list)
 
+    async def test_system_stats(self):
+        """Test system statistics served from the background snapshot"""
+        auth_data = await create_user_and_login()
+        auth_headers = auth_data["headers"]
+
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            response = await client.get(
+                "/v1/debug/system/stats",
+                headers=auth_headers
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert "snapshot_at" in data
+            assert data["counts"]["users"] >= 1
+            breakdown = data["task_status_breakdown"]
+            assert {"queued", "completed", "failed"} <= set(breakdown)
+            assert sum(breakdown.values()) <= data["counts"]["tasks"]
+            assert "redis" in data
+
     async def test_unauthorized_access(self):
         """Test unauthorized access to debug endpoints"""
         async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
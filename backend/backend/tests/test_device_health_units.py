@@ -0,0 +1,38 @@
+"""
+Unit tests for device health history downsampling (app.device_health).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from app.device_health import downsample_health_history
+
+
+def _sample(at: datetime, cpu: float, status: int = 0):
+    return f"{int(at.timestamp() * 1000)}-0", {"s": str(status), "cpu": str(cpu)}
+
+
+class TestDownsampleHealthHistory:
+    """Buckets are aligned to the epoch, not to the request time."""
+
+    def test_buckets_do_not_shift_between_polls(self):
+        base = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+        samples = [_sample(base + timedelta(minutes=m), float(m)) for m in range(0, 120, 7)]
+
+        first = downsample_health_history(samples, base - timedelta(minutes=1), 1800)
+        later = downsample_health_history(samples, base - timedelta(seconds=13), 1800)
+
+        assert first == later
+        starts = [datetime.fromisoformat(b["bucket_start"]) for b in first]
+        assert all(s.minute in (0, 30) and s.second == 0 for s in starts)
+        assert sum(b["samples"] for b in first) == len(samples)
+
+    def test_samples_before_since_are_skipped(self):
+        base = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+        samples = [_sample(base, 10.0), _sample(base + timedelta(minutes=10), 30.0, status=2)]
+
+        buckets = downsample_health_history(samples, base + timedelta(minutes=5), 3600)
+
+        assert len(buckets) == 1
+        assert buckets[0]["samples"] == 1
+        assert buckets[0]["bucket_start"] == base.isoformat()
+        assert buckets[0]["worst_status"] != "healthy"
@@ -539,6 +539,72 @@ class TestDeviceGet:
             assert "Device not found" in response.json()["detail"]
 
 
+class TestDeviceHealthHistory:
+    """Test device health history endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_health_history_success(self):
+        """Test fetching downsampled health history for an owned device."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+
+            enroll_response = await client.post(
+                "/v1/devices/enroll",
+                headers={"Authorization": f"Bearer {access_token}"},
+                json={"device_name": "History Device", "platform": "linux"},
+            )
+            device_id = enroll_response.json()["device_id"]
+
+            response = await client.get(
+                f"/v1/devices/{device_id}/health/history",
+                headers={"Authorization": f"Bearer {access_token}"},
+                params={"hours": 168, "bucket_minutes": 60},
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["device_id"] == device_id
+            assert data["bucket_minutes"] == 60
+            assert isinstance(data["buckets"], list)
+            for bucket in data["buckets"]:
+                assert "bucket_start" in bucket
+                assert "samples" in bucket
+                assert "worst_status" in bucket
+                assert "metrics" in bucket
+
+    @pytest.mark.asyncio
+    async def test_health_history_invalid_window(self):
+        """Test history window is limited to one week."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+
+            response = await client.get(
+                f"/v1/devices/{uuid.uuid4()}/health/history",
+                headers={"Authorization": f"Bearer {access_token}"},
+                params={"hours": 1000},
+            )
+            assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_health_history_other_users_device(self):
+        """Test health history of another user's device is not visible."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            token1, _ = await create_user_and_get_token(client)
+            enroll_response = await client.post(
+                "/v1/devices/enroll",
+                headers={"Authorization": f"Bearer {token1}"},
+                json={"device_name": "Private Device", "platform": "linux"},
+            )
+            device_id = enroll_response.json()["device_id"]
+
+            token2, _ = await create_user_and_get_token(client)
+            response = await client.get(
+                f"/v1/devices/{device_id}/health/history",
+                headers={"Authorization": f"Bearer {token2}"},
+            )
+            assert response.status_code == 404
+
+
 class TestDevicesIntegration:
     """Integration tests for device management workflow."""
 
@@ -0,0 +1,89 @@
+"""
+Unit tests for the Redis Idempotency-Key fast path (app.idempotency).
+"""
+
+import asyncio
+
+import pytest
+
+from app import idempotency
+from app.idempotency import claim_idempotency_key
+
+
+class FakeRedis:
+    """The subset of redis.asyncio used for idempotency claims"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(idempotency, "get_redis", lambda: fake)
+    monkeypatch.setattr(idempotency.settings, "idempotency_redis_enabled", True)
+    return fake
+
+
+def _claim(**kwargs):
+    return claim_idempotency_key("/v1/tasks", "user", "key", "hash", **kwargs)
+
+
+@pytest.mark.asyncio
+class TestInFlightDuplicateWait:
+    """A duplicate waits for the running request, then lets Postgres decide"""
+
+    async def test_duplicate_gets_response_once_owner_completes(self, redis):
+        owner = await _claim()
+        assert owner.owned
+
+        duplicate = asyncio.create_task(_claim(wait_seconds=2))
+        await asyncio.sleep(0.1)
+        await owner.complete({"id": "t1"})
+
+        claim = await duplicate
+        assert claim.response == {"id": "t1"}
+        assert not claim.owned
+
+    async def test_wait_seconds_bounds_the_wait(self, redis):
+        await _claim()
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        claim = await _claim(wait_seconds=0.2)
+        elapsed = loop.time() - started
+
+        assert claim.response is None and not claim.owned
+        assert 0.2 <= elapsed < 0.5
+
+    async def test_wait_defaults_to_setting(self, redis, monkeypatch):
+        monkeypatch.setattr(idempotency.settings, "idempotency_wait_seconds", 0.1)
+        await _claim()
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        claim = await _claim()
+
+        assert claim.response is None
+        assert loop.time() - started < 0.4
+
+    async def test_released_claim_stops_the_wait(self, redis):
+        owner = await _claim()
+        duplicate = asyncio.create_task(_claim(wait_seconds=5))
+        await asyncio.sleep(0.1)
+        await owner.release()
+
+        claim = await asyncio.wait_for(duplicate, timeout=1)
+        assert claim.response is None and not claim.owned
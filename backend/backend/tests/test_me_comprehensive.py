@@ -118,6 +118,34 @@ class TestMeAPI:
             assert "total_tasks" in data
             assert "success_rate" in data
 
+    async def test_statistics_reflect_new_devices_and_tasks(self):
+        """Test that statistics are refreshed after devices and tasks are created"""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            auth_data = await create_user_and_login()
+            auth_headers = auth_data["headers"]
+
+            response = await client.get("/v1/me/statistics", headers=auth_headers)
+            assert response.json()["total_devices"] == 0
+            assert response.json()["total_tasks"] == 0
+
+            device = await client.post(
+                "/v1/devices/",
+                json={"name": "Stats Device", "device_type": "desktop"},
+                headers=auth_headers
+            )
+            assert device.status_code == 201
+            response = await client.get("/v1/me/statistics", headers=auth_headers)
+            assert response.json()["total_devices"] == 1
+
+            task = await client.post(
+                "/v1/tasks/",
+                json={"title": "Stats Task", "device_id": device.json()["id"]},
+                headers={**auth_headers, "Idempotency-Key": str(uuid.uuid4())}
+            )
+            assert task.status_code == 201
+            response = await client.get("/v1/me/statistics", headers=auth_headers)
+            assert response.json()["total_tasks"] == 1
+
     async def test_unauthorized_access(self):
         """Test unauthorized access to profile endpoints"""
         async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
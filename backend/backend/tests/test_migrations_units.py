@@ -0,0 +1,114 @@
+"""
+Unit tests for the migration runner (app.migrations).
+
+Runs a throwaway list of migrations in a scratch Postgres schema, so the
+real schema_migrations table is not touched. Skipped without Postgres.
+"""
+
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import migrations
+from app.config import settings
+from app.migrations import Migration, current_version, run_migrations
+
+pytestmark = pytest.mark.skipif(
+    not settings.database_url.startswith("postgresql"),
+    reason="the migration runner is Postgres only",
+)
+
+
+async def _create_table(conn):
+    await conn.execute(text("CREATE TABLE widgets (id INTEGER, name TEXT)"))
+
+
+async def _index_concurrently(conn):
+    # Fails inside a transaction block
+    await conn.execute(text("CREATE INDEX CONCURRENTLY ix_widgets_name ON widgets (name)"))
+
+
+async def _half_applied(conn):
+    await conn.execute(text("CREATE TABLE gadgets (id INTEGER)"))
+    raise RuntimeError("migration bug")
+
+
+@pytest_asyncio.fixture
+async def scratch_engine():
+    schema = f"mig_{uuid.uuid4().hex[:12]}"
+    engine = create_async_engine(
+        settings.database_url,
+        connect_args={"server_settings": {"search_path": schema}},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    try:
+        yield engine
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await engine.dispose()
+
+
+def _use(monkeypatch, *steps: Migration):
+    monkeypatch.setattr(migrations, "MIGRATIONS", list(steps))
+    monkeypatch.setattr(migrations, "HEAD", max(m.version for m in steps))
+
+
+async def _scalar(engine, sql):
+    async with engine.connect() as conn:
+        return await conn.scalar(text(sql))
+
+
+@pytest.mark.asyncio
+class TestRunMigrations:
+    """Version tracking, non-transactional steps and failed migrations"""
+
+    async def test_applies_pending_and_records_versions(self, scratch_engine, monkeypatch):
+        _use(monkeypatch,
+             Migration(2, "index_widgets", _index_concurrently, transactional=False),
+             Migration(1, "create_widgets", _create_table))
+
+        assert await run_migrations(scratch_engine) == 2
+
+        async with scratch_engine.connect() as conn:
+            assert await current_version(conn) == 2
+            rows = (await conn.execute(text(
+                "SELECT version, name FROM schema_migrations ORDER BY version"))).all()
+        assert [tuple(r) for r in rows] == [(1, "create_widgets"), (2, "index_widgets")]
+        assert await _scalar(scratch_engine, "SELECT to_regclass('ix_widgets_name') IS NOT NULL")
+
+        # At head: nothing to do, nothing re-run
+        assert await run_migrations(scratch_engine) == 0
+
+    async def test_only_newer_versions_run(self, scratch_engine, monkeypatch):
+        _use(monkeypatch, Migration(1, "create_widgets", _create_table))
+        assert await run_migrations(scratch_engine) == 1
+
+        # Re-running migration 1 would fail on the existing table
+        _use(monkeypatch,
+             Migration(1, "create_widgets", _create_table),
+             Migration(2, "index_widgets", _index_concurrently, transactional=False))
+        assert await run_migrations(scratch_engine) == 1
+        assert await _scalar(scratch_engine, "SELECT max(version) FROM schema_migrations") == 2
+
+    async def test_failed_migration_rolls_back_and_is_not_recorded(
+            self, scratch_engine, monkeypatch):
+        _use(monkeypatch,
+             Migration(1, "create_widgets", _create_table),
+             Migration(2, "half_applied", _half_applied))
+
+        with pytest.raises(RuntimeError):
+            await run_migrations(scratch_engine)
+
+        async with scratch_engine.connect() as conn:
+            assert await current_version(conn) == 1
+            assert await conn.scalar(text("SELECT to_regclass('gadgets')")) is None
+            # The advisory lock was released for the next worker
+            assert await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": migrations._LOCK_KEY})
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": migrations._LOCK_KEY})
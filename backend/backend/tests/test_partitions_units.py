@@ -0,0 +1,98 @@
+"""
+Unit tests for monthly partition naming and retention (app.partitions).
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app import partitions
+from app.config import settings
+from app.partitions import (
+    Partition,
+    add_months,
+    bound_literal,
+    expired_partitions,
+    maintain_partitions,
+    month_start,
+    partition_name,
+)
+
+
+class TestPartitionNaming:
+    """Month arithmetic and partition names/bounds"""
+
+    def test_month_start(self):
+        assert month_start(datetime(2026, 3, 31, 23, 59, 59, 999999)) == datetime(2026, 3, 1)
+        assert month_start(datetime(2026, 3, 1)) == datetime(2026, 3, 1)
+
+    @pytest.mark.parametrize("start, months, expected", [
+        (datetime(2026, 1, 1), 1, datetime(2026, 2, 1)),
+        (datetime(2026, 12, 1), 1, datetime(2027, 1, 1)),
+        (datetime(2026, 1, 1), -1, datetime(2025, 12, 1)),
+        (datetime(2026, 3, 1), -15, datetime(2024, 12, 1)),
+        (datetime(2026, 3, 1), 0, datetime(2026, 3, 1)),
+    ])
+    def test_add_months(self, start, months, expected):
+        assert add_months(start, months) == expected
+
+    def test_partition_name_is_zero_padded(self):
+        assert partition_name("tasks", datetime(2026, 3, 1)) == "tasks_p2026_03"
+        assert partition_name("action_logs", datetime(2026, 11, 1)) == "action_logs_p2026_11"
+
+    def test_bound_literal_is_utc(self):
+        assert bound_literal(datetime(2026, 3, 1)) == "'2026-03-01 00:00:00+00'"
+
+
+class TestExpiredPartitions:
+    """Only partitions that ended `months` whole months ago are dropped"""
+
+    PARTITIONS = [
+        Partition("tasks_legacy", datetime(2025, 11, 1)),
+        Partition("tasks_p2025_11", datetime(2025, 12, 1)),
+        Partition("tasks_p2025_12", datetime(2026, 1, 1)),
+        Partition("tasks_p2026_01", datetime(2026, 2, 1)),
+        Partition("tasks_p2026_02", datetime(2026, 3, 1)),
+        Partition("tasks_default", None),
+    ]
+
+    def _names(self, months, now):
+        return [p.name for p in expired_partitions(self.PARTITIONS, months, now)]
+
+    def test_partitions_ending_before_cutoff_expire(self):
+        # Keeping 2 months on 2026-03-15 keeps January and February
+        assert self._names(2, datetime(2026, 3, 15, 12)) == [
+            "tasks_legacy", "tasks_p2025_11", "tasks_p2025_12"]
+
+    def test_current_month_is_never_dropped(self):
+        assert self._names(0, datetime(2026, 2, 28)) == [
+            "tasks_legacy", "tasks_p2025_11", "tasks_p2025_12", "tasks_p2026_01"]
+
+    def test_default_partition_never_expires(self):
+        assert "tasks_default" not in self._names(0, datetime(2030, 1, 1))
+
+    def test_nothing_expires_within_retention(self):
+        assert self._names(12, datetime(2026, 3, 1)) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not settings.database_url.startswith("postgresql"),
+                    reason="partitioning is Postgres only")
+class TestMaintenanceLock:
+    """Only one process runs maintenance at a time"""
+
+    async def test_skips_while_another_process_holds_the_lock(self):
+        try:
+            async with partitions.engine.connect() as conn:
+                assert await conn.scalar(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": partitions._LOCK_KEY})
+                try:
+                    assert await maintain_partitions(dry_run=True) == {}
+                finally:
+                    await conn.execute(
+                        text("SELECT pg_advisory_unlock(:key)"), {"key": partitions._LOCK_KEY})
+
+            assert set(await maintain_partitions(dry_run=True)) == {"action_logs", "tasks"}
+        finally:
+            await partitions.engine.dispose()
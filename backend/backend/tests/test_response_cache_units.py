@@ -0,0 +1,142 @@
+"""
+Unit tests for request coalescing in the response cache (app.response_cache).
+"""
+
+import asyncio
+
+import pytest
+
+from app import response_cache
+
+
+class FakeRedis:
+    """The subset of redis.asyncio used by the cache; reads fail after
+    `fail_after` successful get() calls"""
+
+    def __init__(self, fail_after: int | None = None):
+        self.data = {}
+        self.gets = 0
+        self.fail_after = fail_after
+
+    async def get(self, key):
+        if self.fail_after is not None and self.gets >= self.fail_after:
+            raise ConnectionError("Redis is down")
+        self.gets += 1
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def set(self, *args, **kwargs):
+                self.calls.append(redis.set(*args, **kwargs))
+
+            def delete(self, *args):
+                self.calls.append(redis.delete(*args))
+
+            async def execute(self):
+                return [await call for call in self.calls]
+
+        return Pipeline()
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(response_cache, "get_redis", lambda: fake)
+    monkeypatch.setattr(response_cache.settings, "response_cache_enabled", True)
+    monkeypatch.setattr(response_cache.settings, "response_cache_lock_seconds", 1.0)
+    return fake
+
+
+def _entry_key(endpoint: str, user_id: str) -> str:
+    return response_cache._ENTRY_KEY.format(
+        endpoint=endpoint, user_id=user_id, version="0",
+        params=response_cache._params_digest(None))
+
+
+@pytest.mark.asyncio
+class TestCachedResponseCoalescing:
+    """Waiters fall back to computing when the owner or Redis goes away"""
+
+    async def test_waiters_share_one_computation(self, redis):
+        calls = 0
+        release = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"n": 1}
+
+        requests = [asyncio.create_task(response_cache.cached_response("ep", compute, "u1"))
+                    for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert await asyncio.gather(*requests) == [{"n": 1}] * 3
+        assert calls == 1
+
+    async def test_waiter_recomputes_when_owner_is_cancelled(self, redis):
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        async def compute():
+            return {"from": "waiter"}
+
+        owner = asyncio.create_task(response_cache.cached_response("ep", hang, "u2"))
+        await started.wait()
+        waiters = [asyncio.create_task(response_cache.cached_response("ep", compute, "u2"))
+                   for _ in range(2)]
+        await asyncio.sleep(0.01)
+        owner.cancel()
+
+        assert await asyncio.gather(*waiters) == [{"from": "waiter"}] * 2
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+    async def test_cancelled_waiter_still_raises(self, redis):
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return {"n": 1}
+
+        owner = asyncio.create_task(response_cache.cached_response("ep", compute, "u3"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(response_cache.cached_response("ep", compute, "u3"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        assert await owner == {"n": 1}
+
+    async def test_lock_poll_falls_back_to_compute_when_redis_fails(self, redis):
+        # Another worker holds the fill lock, then Redis stops answering
+        redis.data[_entry_key("ep", "u4") + ":lock"] = "1"
+        redis.fail_after = 2
+
+        async def compute():
+            return {"n": 4}
+
+        value = await asyncio.wait_for(
+            response_cache.cached_response("ep", compute, "u4"), timeout=0.5)
+
+        assert value == {"n": 4}
@@ -0,0 +1,71 @@
+"""
+Unit tests for the artifact storage interface (app.storage) and the upload
+endpoint of presigned URLs of the local backend.
+"""
+
+import time
+
+import pytest
+from fastapi import HTTPException, Request, Response
+
+from app.routers import artifacts
+from app.storage import ArtifactStorage, LocalStorage, S3Storage, upload_signature
+
+
+class TestArtifactStorageInterface:
+    """Backends must implement the whole interface to be constructed"""
+
+    def test_incomplete_backend_is_rejected(self):
+        class PartialStorage(ArtifactStorage):
+            kind = "partial"
+
+            async def etag(self, key):
+                return None
+
+        with pytest.raises(TypeError, match="abstract"):
+            PartialStorage()
+
+    def test_backends_are_complete(self, tmp_path):
+        assert LocalStorage(tmp_path).kind == "local"
+        assert S3Storage("artifacts").kind == "s3"
+
+
+def _put_request(body: bytes, content_length: str) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({
+        "type": "http",
+        "method": "PUT",
+        "path": "/v1/artifacts/files/tasks/t1/a.bin",
+        "headers": [(b"content-length", content_length.encode())],
+    }, receive)
+
+
+@pytest.mark.asyncio
+class TestLocalPresignedUpload:
+    """PUT /v1/artifacts/files/{key} of the local backend"""
+
+    @pytest.fixture
+    def storage(self, tmp_path, monkeypatch):
+        storage = LocalStorage(tmp_path)
+        monkeypatch.setattr(artifacts, "get_storage", lambda: storage)
+        return storage
+
+    async def _put(self, body: bytes, content_length: str, size: int = 5) -> Response:
+        key, expires = "tasks/t1/a.bin", int(time.time()) + 60
+        return await artifacts.put_local_artifact(
+            key, _put_request(body, content_length), expires, size,
+            upload_signature(key, expires, size, None, None))
+
+    async def test_upload(self, storage):
+        response = await self._put(b"hello", "5")
+        assert response.status_code == 200
+        assert (await storage.get_bytes("tasks/t1/a.bin"))[0] == b"hello"
+
+    @pytest.mark.parametrize("content_length", ["6", "five", ""])
+    async def test_bad_content_length_is_rejected(self, storage, content_length):
+        with pytest.raises(HTTPException) as exc:
+            await self._put(b"hello", content_length)
+        assert exc.value.status_code == 400
+        assert await storage.etag("tasks/t1/a.bin") is None
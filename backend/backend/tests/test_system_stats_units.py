@@ -0,0 +1,141 @@
+"""
+Unit tests for the background system statistics snapshot (app.system_stats).
+
+The database queries are replaced with a counter and Redis with an
+in-memory fake.
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app import system_stats as system_stats_module
+from app.system_stats import SNAPSHOT_KEY, SystemStatsSnapshotter
+
+
+class FakeRedis:
+    """get/set over a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def _snapshot(users: int, age: float = 0.0) -> dict:
+    at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return {"users": users, "snapshot_at": at.isoformat()}
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    """Replace the database queries with a counter"""
+    calls = []
+
+    async def collect(db):
+        calls.append(db)
+        await asyncio.sleep(0.01)
+        return _snapshot(len(calls))
+
+    class Session:
+        async def __aenter__(self):
+            return "db"
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(system_stats_module, "collect_system_stats", collect)
+    monkeypatch.setattr(system_stats_module, "AsyncSessionLocal", Session)
+    monkeypatch.setattr(system_stats_module, "get_redis", lambda: None)
+    return calls
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(system_stats_module, "get_redis", lambda: fake)
+    return fake
+
+
+def _lock(monkeypatch, acquired: bool):
+    @asynccontextmanager
+    async def lock():
+        yield acquired
+
+    monkeypatch.setattr(system_stats_module, "_collector_lock", lock)
+
+
+@pytest.mark.asyncio
+class TestSystemStatsSnapshotter:
+    """Requests read the snapshot; only the background refresh collects"""
+
+    async def test_requests_never_collect(self, collections):
+        stats = SystemStatsSnapshotter(interval=0.05)
+
+        with pytest.raises(HTTPException) as exc:
+            await stats.get()
+        assert exc.value.status_code == 503
+        assert collections == []
+
+    async def test_requests_wait_for_the_first_refresh(self, collections):
+        stats = SystemStatsSnapshotter(interval=30)
+
+        requests = asyncio.gather(*(stats.get() for _ in range(3)))
+        await stats.refresh()
+
+        assert [s["users"] for s in await requests] == [1, 1, 1]
+        assert len(collections) == 1
+
+    async def test_background_loop_refreshes(self, collections):
+        stats = SystemStatsSnapshotter(interval=0.02)
+        loop = asyncio.create_task(stats.start())
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            stats.stop()
+            loop.cancel()
+        assert len(collections) >= 2
+        assert (await stats.get())["users"] >= 2
+
+    async def test_current_shared_snapshot_is_adopted(self, collections, redis):
+        redis.data[SNAPSHOT_KEY] = json.dumps(_snapshot(7))
+        stats = SystemStatsSnapshotter(interval=30)
+
+        await stats.refresh()
+
+        assert (await stats.get())["users"] == 7
+        assert collections == []
+
+    async def test_stale_shared_snapshot_is_collected_and_published(
+        self, collections, redis, monkeypatch
+    ):
+        _lock(monkeypatch, True)
+        redis.data[SNAPSHOT_KEY] = json.dumps(_snapshot(7, age=60))
+        stats = SystemStatsSnapshotter(interval=30)
+
+        await stats.refresh()
+
+        assert (await stats.get())["users"] == 1
+        assert json.loads(redis.data[SNAPSHOT_KEY])["users"] == 1
+
+    async def test_replica_without_the_lock_keeps_its_snapshot(
+        self, collections, redis, monkeypatch
+    ):
+        _lock(monkeypatch, True)
+        stats = SystemStatsSnapshotter(interval=30)
+        await stats.refresh()
+        redis.data.clear()
+
+        _lock(monkeypatch, False)
+        await stats.refresh()
+
+        assert (await stats.get())["users"] == 1
+        assert len(collections) == 1
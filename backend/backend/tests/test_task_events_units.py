@@ -0,0 +1,291 @@
+"""
+Unit tests for the ClickHouse task event writer (app.task_events) and the
+ClickHouse analytics backend (app.analytics_clickhouse).
+
+The writer is driven through its `client_factory` with an in-memory fake.
+The parity test runs the ClickHouse queries on embedded ClickHouse (chdb)
+and the Postgres path against DATABASE_URL, so it is skipped without chdb
+or without Postgres.
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete
+
+from app import analytics_clickhouse, task_events
+from app.analytics import AdvancedAnalytics
+from app.config import get_settings, settings
+from app.db import AsyncSessionLocal, engine
+from app.models import ActionLog, Device, Task, User
+from app.task_events import TASK_EVENT_COLUMNS, TaskEventWriter, task_event_rows
+
+postgres = pytest.mark.skipif(
+    not settings.database_url.startswith("postgresql"),
+    reason="the analytics parity test compares against Postgres",
+)
+
+
+class FakeClickHouse:
+    """Records DDL and inserted batches; the first `failures` inserts raise"""
+
+    def __init__(self, failures: int = 0):
+        self.commands = []
+        self.batches = []
+        self.failures = failures
+
+    def command(self, sql):
+        self.commands.append(sql)
+
+    def insert(self, table, rows, column_names):
+        assert column_names == TASK_EVENT_COLUMNS
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("ClickHouse is down")
+        self.batches.append(list(rows))
+
+
+def _rows(count: int, start: int = 0) -> list[tuple]:
+    return [(i,) for i in range(start, start + count)]
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+class TestTaskEventWriter:
+    """Batching and flush triggers"""
+
+    async def test_flushes_when_batch_is_full(self):
+        client = FakeClickHouse()
+        writer = TaskEventWriter(batch_size=3, flush_seconds=60, client_factory=lambda: client)
+        runner = asyncio.create_task(writer.start())
+        try:
+            writer.enqueue(_rows(2))
+            await asyncio.sleep(0.05)
+            assert client.batches == []
+
+            writer.enqueue(_rows(4, start=2))
+            await _wait_for(lambda: sum(len(b) for b in client.batches) == 6)
+            assert [len(b) for b in client.batches] == [3, 3]
+            assert [row for b in client.batches for row in b] == _rows(6)
+        finally:
+            await writer.stop()
+            await runner
+
+    async def test_flushes_on_interval(self):
+        client = FakeClickHouse()
+        writer = TaskEventWriter(batch_size=100, flush_seconds=0.05, client_factory=lambda: client)
+        runner = asyncio.create_task(writer.start())
+        try:
+            writer.enqueue(_rows(2))
+            await _wait_for(lambda: client.batches)
+            assert client.batches == [_rows(2)]
+        finally:
+            await writer.stop()
+            await runner
+
+    async def test_stop_flushes_pending_events(self):
+        client = FakeClickHouse()
+        writer = TaskEventWriter(batch_size=100, flush_seconds=60, client_factory=lambda: client)
+        runner = asyncio.create_task(writer.start())
+        await asyncio.sleep(0)
+        writer.enqueue(_rows(5))
+        await writer.stop()
+        await runner
+        assert client.batches == [_rows(5)]
+
+    async def test_failed_batch_is_retried_in_order(self):
+        client = FakeClickHouse(failures=1)
+        writer = TaskEventWriter(batch_size=2, flush_seconds=60, client_factory=lambda: client)
+        writer._client = client
+        writer.enqueue(_rows(3))
+
+        await writer.flush()
+        assert client.batches == []
+        assert list(writer._pending) == _rows(3)
+
+        await writer.flush()
+        assert client.batches == [_rows(2), _rows(1, start=2)]
+
+    async def test_missing_driver_disables_buffering(self, monkeypatch):
+        monkeypatch.setattr("app.task_events.settings.clickhouse_url", "http://clickhouse:8123")
+        writer = TaskEventWriter(batch_size=1, flush_seconds=0.01, client_factory=lambda: None)
+        writer.enqueue(_rows(1))
+
+        await asyncio.wait_for(writer.start(), timeout=2)
+
+        assert not writer.enabled
+        assert not writer._pending
+
+
+class TestTaskEventBuffer:
+    """The pending buffer keeps the newest `max_pending` events"""
+
+    def test_buffer_cap_drops_oldest_events(self):
+        writer = TaskEventWriter(batch_size=1000, flush_seconds=60, client_factory=FakeClickHouse)
+        assert writer.max_pending == 100_000
+
+        writer.enqueue(_rows(99_990))
+        writer.enqueue(_rows(25, start=99_990))
+
+        assert len(writer._pending) == 100_000
+        assert writer._pending[0] == (15,)
+        assert writer._pending[-1] == (100_014,)
+
+    def test_single_oversized_enqueue_is_capped(self):
+        writer = TaskEventWriter(batch_size=10, flush_seconds=60, max_pending=5,
+                                 client_factory=FakeClickHouse)
+        writer.enqueue(_rows(8))
+        assert list(writer._pending) == _rows(5, start=3)
+
+
+@pytest.mark.asyncio
+class TestEmitTaskEvent:
+    """Emitting never fails the request that changed the task"""
+
+    async def test_redis_errors_are_swallowed(self, monkeypatch):
+        async def unavailable(*args):
+            raise ConnectionError("Redis is down")
+
+        monkeypatch.setattr(task_events, "bump_cache_version", unavailable)
+        monkeypatch.setattr(task_events.task_status_hub, "publish", unavailable)
+        monkeypatch.setattr("app.task_events.settings.clickhouse_url", "http://clickhouse:8123")
+        writer = TaskEventWriter(batch_size=1000, flush_seconds=60, client_factory=FakeClickHouse)
+        monkeypatch.setattr(task_events, "task_event_writer", writer)
+        task = SimpleNamespace(
+            id="t1", user_id=uuid.uuid4(), device_id=uuid.uuid4(), status="queued",
+            created_at=datetime(2026, 1, 1), updated_at=datetime(2026, 1, 1), payload={})
+
+        await task_events.emit_task_event("created", task)
+        await task_events.emit_task_events("created", [task])
+
+        assert len(writer._pending) == 2
+
+
+def _ch_value(value):
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return value
+
+
+class ChdbClickHouse:
+    """clickhouse-connect client surface on top of an embedded chdb session"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def command(self, sql):
+        self.session.query(sql)
+
+    def insert(self, table, rows, column_names):
+        lines = "\n".join(
+            json.dumps({c: _ch_value(v) for c, v in zip(column_names, row)}) for row in rows)
+        self.session.query(f"INSERT INTO {table} FORMAT JSONEachRow\n{lines}")
+
+    def query(self, sql, parameters):
+        result = self.session.query(
+            sql, "JSONEachRow", params={k: str(_ch_value(v)) for k, v in parameters.items()})
+        rows = [json.loads(line) for line in result.data().splitlines() if line]
+        return SimpleNamespace(named_results=lambda: rows)
+
+
+# (status, hours ago, seconds until the status change or None if never
+# updated, executed actions)
+_FIXTURE = [
+    ("completed", 3, 40, [
+        {"action": {"type": "click"}, "status": "success", "duration": 1.5},
+        {"action": {"type": "type"}, "status": "failed", "duration": 0.5},
+    ]),
+    ("completed", 26, 10, [
+        {"action": {"type": "click"}, "status": "ok", "duration": 2.5},
+    ]),
+    ("failed", 50, 5, [
+        {"action": {"type": "scroll"}, "status": "error", "duration": 4},
+    ]),
+    ("queued", 1, None, []),
+    ("in_progress", 200, 30, []),
+    ("cancelled", 240, 20, []),
+]
+
+
+@postgres
+@pytest.mark.asyncio
+class TestClickHouseAnalyticsParity:
+    """argMax state queries agree with the Postgres aggregates"""
+
+    async def test_matches_postgres(self, monkeypatch):
+        chdb_session = pytest.importorskip("chdb.session")
+        session = chdb_session.Session()
+        client = ChdbClickHouse(session)
+        writer = TaskEventWriter(batch_size=100, flush_seconds=60, client_factory=lambda: client)
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        user_id, device_id = uuid.uuid4(), uuid.uuid4()
+        task_ids = []
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add(User(id=user_id, email=f"ch_{user_id.hex[:12]}@test.local",
+                            password_hash="-"))
+                await db.flush()
+                db.add(Device(id=device_id, user_id=user_id, device_name="ch",
+                              platform="linux", capabilities={}))
+                await db.flush()
+                for status, hours, seconds, results in _FIXTURE:
+                    task = SimpleNamespace(
+                        id=uuid.uuid4().hex, user_id=user_id, device_id=device_id,
+                        status=status, created_at=now - timedelta(hours=hours))
+                    finished_at = task.created_at + timedelta(seconds=seconds or 0)
+                    task_ids.append(task.id)
+                    db.add(Task(id=task.id, user_id=user_id, device_id=device_id,
+                                status=status, title="ch", payload={},
+                                created_at=task.created_at, updated_at=finished_at))
+                    # The rollup trigger looks the task up when the log is inserted
+                    await db.flush()
+                    for result in results:
+                        db.add(ActionLog(
+                            task_id=task.id, device_id=device_id, actor="device",
+                            action=result["action"],
+                            result={"status": result["status"], "duration": result["duration"]},
+                            created_at=finished_at))
+                    writer.enqueue(task_event_rows("created", task, "queued", at=task.created_at))
+                    if seconds is not None:
+                        writer.enqueue(task_event_rows(status, task, status, results, at=finished_at))
+                await db.commit()
+
+            assert await writer._connect()
+            await writer.flush()
+            monkeypatch.setattr(analytics_clickhouse, "_client", client)
+
+            async def snapshot(backend: str, rollups: bool):
+                monkeypatch.setattr(get_settings(), "analytics_backend", backend)
+                monkeypatch.setattr(get_settings(), "analytics_use_rollups", rollups)
+                async with AsyncSessionLocal() as db:
+                    return (
+                        await AdvancedAnalytics.get_user_performance_summary(db, str(user_id), 30),
+                        await AdvancedAnalytics.get_device_analytics(db, str(user_id), 30),
+                        await AdvancedAnalytics.get_action_performance(db, str(user_id), 30),
+                    )
+
+            clickhouse = await snapshot("clickhouse", True)
+            assert clickhouse[0]["total_tasks"] == len(_FIXTURE)
+            assert clickhouse[2]["click"]["total_executions"] == 2
+            assert clickhouse == await snapshot("postgres", False)
+            assert clickhouse == await snapshot("postgres", True)
+        finally:
+            session.close()
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(ActionLog).where(ActionLog.task_id.in_(task_ids)))
+                await db.execute(delete(Task).where(Task.user_id == user_id))
+                await db.execute(delete(Device).where(Device.id == device_id))
+                await db.execute(delete(User).where(User.id == user_id))
+                await db.commit()
+            await engine.dispose()
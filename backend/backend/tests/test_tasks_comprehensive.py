@@ -180,6 +180,70 @@ class TestTaskCreation:
             # Should return the same task
             assert task_id_1 == task_id_2
 
+    @pytest.mark.asyncio
+    async def test_create_task_idempotency_replay_returns_stored_response(self):
+        """Test that a replayed creation returns the creation response."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Idempotency-Key": uuid.uuid4().hex,
+            }
+            task_data = {
+                "device_id": device_id,
+                "title": "Needs approval",
+                "metadata": {"actions": [{"action_id": "a1", "type": "shell", "params": {"command": "ls"}}]},
+            }
+
+            response1 = await client.post("/v1/tasks/", headers=headers, json=task_data)
+            assert response1.status_code == 201
+            assert response1.json()["status"] == "awaiting_confirmation"
+            task_id = response1.json()["id"]
+
+            reject = await client.post(
+                f"/v1/approvals/{task_id}/reject",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert reject.status_code == 200
+
+            response2 = await client.post("/v1/tasks/", headers=headers, json=task_data)
+            assert response2.status_code == 201
+            assert response2.json() == response1.json()
+
+            current = await client.get(
+                f"/v1/tasks/{task_id}",
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert current.json()["status"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_create_task_idempotency_concurrent_retries(self):
+        """Test that a burst of concurrent retries creates a single task."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Idempotency-Key": uuid.uuid4().hex,
+            }
+            task_data = {"device_id": device_id, "title": "Retry Storm Task"}
+
+            responses = await asyncio.gather(*(
+                client.post("/v1/tasks/", headers=headers, json=task_data)
+                for _ in range(10)
+            ))
+
+            assert all(r.status_code == 201 for r in responses)
+            assert len({r.json()["id"] for r in responses}) == 1
+
+            listed = await client.get(
+                "/v1/tasks/", headers={"Authorization": f"Bearer {access_token}"})
+            assert len(listed.json()) == 1
+
+            metrics = (await client.get("/metrics")).text
+            assert 'idempotency_requests_total{endpoint="/v1/tasks",result="replayed"}' in metrics
+
     @pytest.mark.asyncio
     async def test_create_task_missing_idempotency_key(self):
         """Test task creation without idempotency key."""
@@ -405,6 +469,132 @@ class TestTaskCreation:
             assert len(data["payload"]["actions"]) == 0
 
 
+class TestTaskBatchCreation:
+    """Test bulk task creation endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_create_tasks_batch_success(self):
+        """Test creating tasks for several devices in one request."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_ids = [(await enroll_device(client, access_token, f"Device {i}"))[0]
+                          for i in range(3)]
+
+            response = await client.post(
+                "/v1/tasks/batch",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Idempotency-Key": uuid.uuid4().hex,
+                },
+                json={"tasks": [
+                    {
+                        "device_id": device_id,
+                        "title": f"Batch Task {i}",
+                        "metadata": {"actions": [{"action_id": "a1", "type": "noop", "params": {}}]},
+                    }
+                    for i, device_id in enumerate(device_ids)
+                ] + [{
+                    "device_id": device_ids[0],
+                    "title": "Batch Shell Task",
+                    "metadata": {"actions": [{"action_id": "a1", "type": "shell", "params": {"command": "ls"}}]},
+                }]},
+            )
+
+            assert response.status_code == 201
+            tasks = response.json()["tasks"]
+            assert [t["title"] for t in tasks] == [
+                "Batch Task 0", "Batch Task 1", "Batch Task 2", "Batch Shell Task"]
+            assert [t["device_id"] for t in tasks] == device_ids + [device_ids[0]]
+            assert [t["status"] for t in tasks[:3]] == ["queued"] * 3
+            assert tasks[3]["status"] == "awaiting_confirmation"
+            assert len({t["id"] for t in tasks}) == 4
+
+            listed = await client.get(
+                "/v1/tasks/", headers={"Authorization": f"Bearer {access_token}"})
+            assert {t["id"] for t in tasks} <= {t["id"] for t in listed.json()}
+
+    @pytest.mark.asyncio
+    async def test_create_tasks_batch_idempotency(self):
+        """Test that a retried batch returns the original tasks."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Idempotency-Key": uuid.uuid4().hex,
+            }
+            # Identical items are still distinct tasks
+            batch = {"tasks": [{"device_id": device_id, "title": "Same"}] * 2}
+
+            first = await client.post("/v1/tasks/batch", headers=headers, json=batch)
+            second = await client.post("/v1/tasks/batch", headers=headers, json=batch)
+
+            assert first.status_code == 201
+            assert second.status_code == 201
+            first_ids = [t["id"] for t in first.json()["tasks"]]
+            assert len(set(first_ids)) == 2
+            assert [t["id"] for t in second.json()["tasks"]] == first_ids
+
+            other = await client.post(
+                "/v1/tasks/batch", headers=headers,
+                json={"tasks": [{"device_id": device_id, "title": "Different"}]},
+            )
+            assert other.status_code == 409
+
+    @pytest.mark.asyncio
+    async def test_create_tasks_batch_invalid_device(self):
+        """Test that one foreign device rejects the whole batch."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+
+            response = await client.post(
+                "/v1/tasks/batch",
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Idempotency-Key": uuid.uuid4().hex,
+                },
+                json={"tasks": [
+                    {"device_id": device_id, "title": "Valid"},
+                    {"device_id": str(uuid.uuid4()), "title": "Unknown device"},
+                ]},
+            )
+            assert response.status_code == 404
+
+            listed = await client.get(
+                "/v1/tasks/", headers={"Authorization": f"Bearer {access_token}"})
+            assert listed.json() == []
+
+    @pytest.mark.asyncio
+    async def test_create_tasks_batch_delivery(self):
+        """Test that batch tasks are delivered to a connected device."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                await asyncio.sleep(0.5)
+                response = await client.post(
+                    "/v1/tasks/batch",
+                    headers={
+                        "Authorization": f"Bearer {access_token}",
+                        "Idempotency-Key": uuid.uuid4().hex,
+                    },
+                    json={"tasks": [
+                        {"device_id": device_id, "title": f"Delivered {i}"} for i in range(3)
+                    ]},
+                )
+                assert response.status_code == 201
+                expected = {t["id"] for t in response.json()["tasks"]}
+
+                received = set()
+                while received != expected:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), timeout=5.0))
+                    if message.get("type") == "task.exec":
+                        received.add(message["task_id"])
+                assert received == expected
+
+
 class TestTaskDelivery:
     """Test task delivery via WebSocket."""
 
@@ -627,6 +817,161 @@ class TestTaskDelivery:
                     pytest.fail("Pending task was not delivered on reconnect")
 
 
+class TestTaskStatusWatch:
+    """Test long-poll and SSE task status endpoints."""
+
+    async def _create_delivered_task(self, client, access_token, ws, device_id) -> str:
+        response = await client.post(
+            "/v1/tasks/",
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Idempotency-Key": uuid.uuid4().hex,
+            },
+            json={
+                "device_id": device_id,
+                "title": "Watched Task",
+                "metadata": {"actions": [{"action_id": "a1", "type": "noop", "params": {}}]},
+            },
+        )
+        assert response.status_code == 201
+        await asyncio.wait_for(ws.recv(), timeout=5.0)
+        return response.json()["id"]
+
+    async def _send_result(self, ws, task_id: str) -> None:
+        await ws.send(json.dumps({
+            "type": "task.result",
+            "task_id": task_id,
+            "results": [{"action_id": "a1", "status": "done"}],
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "signature": "",
+        }))
+
+    @pytest.mark.asyncio
+    async def test_wait_returns_on_completion(self):
+        """Test that /wait returns as soon as the device reports the result."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+            headers = {"Authorization": f"Bearer {access_token}"}
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                task_id = await self._create_delivered_task(client, access_token, ws, device_id)
+
+                waiter = asyncio.create_task(client.get(
+                    f"/v1/tasks/{task_id}/wait", headers=headers, params={"timeout": 20}))
+                await asyncio.sleep(0.5)
+                assert not waiter.done()
+
+                started = asyncio.get_running_loop().time()
+                await self._send_result(ws, task_id)
+                response = await asyncio.wait_for(waiter, timeout=10)
+                elapsed = asyncio.get_running_loop().time() - started
+
+            assert response.status_code == 200
+            assert response.json()["status"] == "completed"
+            assert elapsed < 5
+
+            # Finished tasks are returned immediately
+            response = await client.get(
+                f"/v1/tasks/{task_id}/wait", headers=headers, params={"timeout": 20})
+            assert response.json()["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_wait_times_out_with_current_status(self):
+        """Test that /wait returns the unfinished task after the timeout."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=15) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+            headers = {"Authorization": f"Bearer {access_token}"}
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                task_id = await self._create_delivered_task(client, access_token, ws, device_id)
+                response = await client.get(
+                    f"/v1/tasks/{task_id}/wait", headers=headers, params={"timeout": 0.5})
+
+            assert response.status_code == 200
+            assert response.json()["status"] not in ("completed", "failed", "cancelled")
+
+            response = await client.get(
+                f"/v1/tasks/{uuid.uuid4()}/wait", headers=headers, params={"timeout": 0.5})
+            assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_events_stream_until_completion(self):
+        """Test that /events streams the current status and the completion."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+            headers = {"Authorization": f"Bearer {access_token}"}
+
+            async with websockets.connect(f"{WS_URL}/v1/ws/agent?token={device_token}") as ws:
+                task_id = await self._create_delivered_task(client, access_token, ws, device_id)
+
+                events = []
+                async with client.stream(
+                    "GET", f"/v1/tasks/{task_id}/events", headers=headers
+                ) as response:
+                    assert response.status_code == 200
+                    assert response.headers["content-type"].startswith("text/event-stream")
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        events.append(json.loads(line[len("data: "):]))
+                        if len(events) == 1:
+                            await self._send_result(ws, task_id)
+
+            assert events[0]["event"] == "current"
+            assert events[0]["task_id"] == task_id
+            assert events[-1]["status"] == "completed"
+
+
+class TestTaskListing:
+    """Test task listing and pagination."""
+
+    @pytest.mark.asyncio
+    async def test_list_tasks_cursor_pagination(self):
+        """Test walking the task list with cursors, including equal timestamps."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, _ = await enroll_device(client, access_token)
+            headers = {"Authorization": f"Bearer {access_token}"}
+
+            # Batch tasks share one created_at, so pages split on the id tie breaker
+            response = await client.post(
+                "/v1/tasks/batch",
+                headers={**headers, "Idempotency-Key": uuid.uuid4().hex},
+                json={"tasks": [
+                    {"device_id": device_id, "title": f"Page Task {i}"} for i in range(5)
+                ]},
+            )
+            assert response.status_code == 201
+            created = {t["id"] for t in response.json()["tasks"]}
+
+            seen = []
+            params = {"limit": 2}
+            while True:
+                page = await client.get("/v1/tasks/", headers=headers, params=params)
+                assert page.status_code == 200
+                assert len(page.json()) <= 2
+                seen.extend(t["id"] for t in page.json())
+                cursor = page.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+                params = {"limit": 2, "cursor": cursor}
+
+            assert len(seen) == len(set(seen)) == 5
+            assert set(seen) == created
+
+            # Offset pagination still returns the same order
+            offset_page = await client.get(
+                "/v1/tasks/", headers=headers, params={"limit": 2, "offset": 2})
+            assert [t["id"] for t in offset_page.json()] == seen[2:4]
+
+            invalid = await client.get(
+                "/v1/tasks/", headers=headers, params={"cursor": "not-a-cursor"})
+            assert invalid.status_code == 400
+
+
 class TestTasksIntegration:
     """Integration tests for task workflows."""
 
@@ -0,0 +1,107 @@
+"""
+Unit tests for replays of batch task creation (app.routers.tasks) whose
+tasks no longer exist.
+
+They run against DATABASE_URL and are skipped without Postgres; events and
+dispatch to devices are stubbed out.
+"""
+
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select
+
+from app.config import settings
+from app.db import AsyncSessionLocal, engine
+from app.models import Device, IdempotencyKey, Task, User
+from app.routers import tasks as tasks_router
+from app.routers.tasks import _create_tasks_batch, _request_body_hash
+from app.schemas import TaskBatchCreateRequest
+
+postgres = pytest.mark.skipif(
+    not settings.database_url.startswith("postgresql"),
+    reason="batch replays are tested against Postgres",
+)
+
+
+@pytest_asyncio.fixture
+async def owner(monkeypatch):
+    """A user with a device: (user_id, device_id)"""
+    async def nothing(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(tasks_router, "emit_task_events", nothing)
+    monkeypatch.setattr(tasks_router, "_dispatch_batch", nothing)
+    user_id, device_id = uuid.uuid4(), uuid.uuid4()
+    async with AsyncSessionLocal() as db:
+        db.add(User(id=user_id, email=f"batch_{user_id.hex[:12]}@test.local", password_hash="-"))
+        await db.flush()
+        db.add(Device(id=device_id, user_id=user_id, device_name="batch",
+                      platform="linux", capabilities={}))
+        await db.commit()
+    try:
+        yield user_id, device_id
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id))
+            await db.execute(delete(Task).where(Task.user_id == user_id))
+            await db.execute(delete(Device).where(Device.id == device_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+        await engine.dispose()
+
+
+async def _create(user_id, payload, key):
+    hashes = [_request_body_hash(item, batch_index=i) for i, item in enumerate(payload.tasks)]
+    async with AsyncSessionLocal() as db:
+        return [t.id for t in (await _create_tasks_batch(payload, db, user_id, key, hashes)).tasks]
+
+
+async def _delete_tasks(task_ids):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Task).where(Task.id.in_(task_ids)))
+        await db.commit()
+
+
+@postgres
+@pytest.mark.asyncio
+class TestBatchReplay:
+    """Claims whose task is gone are released and the item is created again"""
+
+    def _payload(self, device_id, count=3):
+        return TaskBatchCreateRequest(tasks=[
+            {"device_id": device_id, "title": f"batch {i}"} for i in range(count)])
+
+    async def test_replay_returns_the_same_tasks(self, owner):
+        user_id, device_id = owner
+        payload, key = self._payload(device_id), uuid.uuid4().hex
+
+        first = await _create(user_id, payload, key)
+        assert await _create(user_id, payload, key) == first
+
+    async def test_deleted_task_is_created_again(self, owner):
+        user_id, device_id = owner
+        payload, key = self._payload(device_id), uuid.uuid4().hex
+        first = await _create(user_id, payload, key)
+
+        await _delete_tasks([first[1]])
+        second = await _create(user_id, payload, key)
+
+        assert second[0] == first[0] and second[2] == first[2]
+        assert second[1] != first[1]
+        assert await _create(user_id, payload, key) == second
+        async with AsyncSessionLocal() as db:
+            claimed = set((await db.execute(select(IdempotencyKey.resource_id).where(
+                IdempotencyKey.user_id == user_id, IdempotencyKey.idem_key == key))).scalars())
+        assert claimed == set(second)
+
+    async def test_whole_batch_gone(self, owner):
+        user_id, device_id = owner
+        payload, key = self._payload(device_id, count=2), uuid.uuid4().hex
+        first = await _create(user_id, payload, key)
+
+        await _delete_tasks(first)
+        second = await _create(user_id, payload, key)
+
+        assert len(second) == 2 and not set(second) & set(first)
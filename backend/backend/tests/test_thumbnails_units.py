@@ -0,0 +1,252 @@
+"""
+Unit tests for image derivatives (app.imaging, app.thumbnails).
+
+Rendering runs on a thread pool instead of the spawned process pool and
+the artifact store is an in-memory fake.
+"""
+
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from app import thumbnails
+from app.imaging import render
+from app.storage import ObjectNotFound
+
+CAS_KEY = "cas/sha256/ab/cd/" + "ab" * 32
+
+
+def _image(size, mode="RGB", fmt="PNG") -> bytes:
+    out = io.BytesIO()
+    Image.new(mode, size).save(out, fmt)
+    return out.getvalue()
+
+
+def _webp_size(data: bytes) -> tuple[int, int]:
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == "WEBP"
+        return image.size
+
+
+class FakeStorage:
+    """get_bytes/put_bytes/etag over a dict; `gate` holds get_bytes back"""
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.gate: asyncio.Event | None = None
+
+    async def get_bytes(self, key, max_bytes=None):
+        if self.gate is not None:
+            await self.gate.wait()
+        if key not in self.objects:
+            raise ObjectNotFound(key)
+        return self.objects[key], thumbnails.etag_of(self.objects[key])
+
+    async def put_bytes(self, key, data, content_type=None, cache_control=None):
+        self.objects[key] = data
+
+    async def etag(self, key):
+        return thumbnails.etag_of(self.objects[key]) if key in self.objects else None
+
+    def key_from_url(self, url):
+        prefix = "http://store/"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+    def public_url(self, key):
+        return f"http://store/{key}"
+
+
+@pytest.fixture(autouse=True)
+def thread_pool(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(thumbnails, "_get_pool", lambda: pool)
+    yield
+    pool.shutdown()
+
+
+class TestRender:
+    """Downscaled WebP output"""
+
+    def test_longest_edge_is_bounded(self):
+        assert _webp_size(render(_image((1000, 500)), 320, 80)) == (320, 160)
+        assert _webp_size(render(_image((300, 900)), 320, 80)) == (107, 320)
+
+    def test_small_images_are_not_upscaled(self):
+        assert _webp_size(render(_image((100, 50)), 320, 80)) == (100, 50)
+
+    def test_jpeg_and_palette_sources(self):
+        assert _webp_size(render(_image((2000, 1000), fmt="JPEG"), 1280, 80)) == (1280, 640)
+        assert _webp_size(render(_image((64, 64), mode="P"), 320, 80)) == (64, 64)
+
+    def test_transparency_is_kept(self):
+        with Image.open(io.BytesIO(render(_image((64, 64), mode="RGBA"), 320, 80))) as image:
+            assert image.mode == "RGBA"
+
+
+class TestKeysAndHeaders:
+    """Derivative keys, image detection and cache headers"""
+
+    def test_derived_key(self):
+        assert thumbnails.derived_key("screenshots/t1.png", "thumb") == \
+            "derived/thumb/screenshots/t1.png.webp"
+        assert thumbnails.derived_key(CAS_KEY, "preview") == f"derived/preview/{CAS_KEY}.webp"
+
+    def test_cache_control(self, monkeypatch):
+        monkeypatch.setattr(thumbnails.settings, "thumbnail_cache_seconds", 600)
+        assert thumbnails.cache_control(CAS_KEY) == "public, max-age=31536000, immutable"
+        assert thumbnails.cache_control("screenshots/t1.png") == "public, max-age=600"
+
+    def test_is_image(self):
+        assert thumbnails.is_image("a/B.PNG")
+        assert not thumbnails.is_image("a/b.txt")
+        assert thumbnails.is_image("a/b.bin", "image/jpeg")
+        assert not thumbnails.is_image("a/b.png", "application/pdf")
+
+
+@pytest.mark.asyncio
+class TestSharedRender:
+    """Concurrent requests for one derivative share a render"""
+
+    async def test_concurrent_requests_render_once(self, monkeypatch):
+        renders = 0
+        real_render = thumbnails.render_variant
+
+        async def counting_render(data, variant):
+            nonlocal renders
+            renders += 1
+            return await real_render(data, variant)
+
+        monkeypatch.setattr(thumbnails, "render_variant", counting_render)
+        storage = FakeStorage({"s/a.png": _image((800, 400))})
+        storage.gate = asyncio.Event()
+
+        requests = [asyncio.create_task(thumbnails.get_derivative(storage, "s/a.png", "thumb"))
+                    for _ in range(3)]
+        await asyncio.sleep(0.01)
+        storage.gate.set()
+        results = await asyncio.gather(*requests)
+
+        assert renders == 1
+        assert len({etag for _, etag in results}) == 1
+        assert _webp_size(storage.objects["derived/thumb/s/a.png.webp"]) == (320, 160)
+        assert thumbnails._inflight == {}
+
+    async def test_render_survives_a_cancelled_caller(self):
+        storage = FakeStorage({"s/a.png": _image((800, 400))})
+        storage.gate = asyncio.Event()
+
+        first = asyncio.create_task(thumbnails.generate_derivative(storage, "s/a.png", "thumb"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(thumbnails.generate_derivative(storage, "s/a.png", "thumb"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        storage.gate.set()
+
+        data, _ = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert storage.objects["derived/thumb/s/a.png.webp"] == data
+
+    async def test_failed_render_is_not_cached(self):
+        storage = FakeStorage({"s/a.png": b"not an image"})
+
+        with pytest.raises(Exception):
+            await thumbnails.generate_derivative(storage, "s/a.png", "thumb")
+        assert thumbnails._inflight == {}
+
+        storage.objects["s/a.png"] = _image((10, 10))
+        data, _ = await thumbnails.generate_derivative(storage, "s/a.png", "thumb")
+        assert _webp_size(data) == (10, 10)
+
+
+@pytest.mark.asyncio
+class TestIngest:
+    """Derivatives rendered in the background after an upload"""
+
+    async def _ingest(self, storage, key):
+        thumbnails.schedule_derivatives(storage, key)
+        await asyncio.gather(*thumbnails._background)
+
+    async def test_overwritten_key_is_rendered_again(self):
+        storage = FakeStorage({"s/a.png": _image((800, 400))})
+        await self._ingest(storage, "s/a.png")
+        assert _webp_size(storage.objects["derived/thumb/s/a.png.webp"]) == (320, 160)
+
+        storage.objects["s/a.png"] = _image((400, 800))
+        await self._ingest(storage, "s/a.png")
+        assert _webp_size(storage.objects["derived/thumb/s/a.png.webp"]) == (160, 320)
+        assert _webp_size(storage.objects["derived/preview/s/a.png.webp"]) == (400, 800)
+
+    async def test_content_addressed_derivatives_are_kept(self):
+        stored = b"already rendered"
+        storage = FakeStorage({CAS_KEY: _image((800, 400)),
+                               f"derived/thumb/{CAS_KEY}.webp": stored})
+        await self._ingest(storage, CAS_KEY)
+
+        assert storage.objects[f"derived/thumb/{CAS_KEY}.webp"] == stored
+        assert _webp_size(storage.objects[f"derived/preview/{CAS_KEY}.webp"]) == (800, 400)
+
+
+@pytest.mark.asyncio
+class TestPreviewUrl:
+    """Only image artifacts are sent to the render pool"""
+
+    @pytest.fixture
+    def storage(self, monkeypatch):
+        storage = FakeStorage({"s/a.png": _image((2000, 1000)), CAS_KEY: _image((2000, 1000))})
+        monkeypatch.setattr("app.storage.get_storage", lambda: storage)
+        return storage
+
+    async def test_image_key(self, storage):
+        assert await thumbnails.preview_url("http://store/s/a.png") == \
+            "http://store/derived/preview/s/a.png.webp"
+
+    async def test_foreign_and_non_image_urls(self, storage):
+        assert await thumbnails.preview_url("http://elsewhere/s/a.png") is None
+        storage.objects["s/a.txt"] = b"text"
+        assert await thumbnails.preview_url("http://store/s/a.txt") is None
+
+    async def test_content_addressed_key_uses_the_artifact_type(self, storage, monkeypatch):
+        types = {}
+
+        async def content_type(sha256):
+            return types.get(sha256)
+
+        monkeypatch.setattr(thumbnails, "_artifact_content_type", content_type)
+        url = f"http://store/{CAS_KEY}"
+
+        assert await thumbnails.preview_url(url) is None
+        types["ab" * 32] = "application/zip"
+        assert await thumbnails.preview_url(url) is None
+        assert not any(key.startswith("derived/") for key in storage.objects)
+
+        types["ab" * 32] = "image/png"
+        assert await thumbnails.preview_url(url) == f"http://store/derived/preview/{CAS_KEY}.webp"
+
+
+@pytest.mark.asyncio
+class TestLocalDerivative:
+    """Derivatives of local screenshot files"""
+
+    async def test_renders_and_revalidates(self, tmp_path):
+        path = tmp_path / "shot.png"
+        path.write_bytes(_image((640, 480)))
+
+        response = await thumbnails.local_derivative(str(path), "thumb", None)
+        assert response.status_code == 200
+        assert response.media_type == "image/webp"
+        assert _webp_size(response.body) == (320, 240)
+
+        etag = response.headers["etag"]
+        response = await thumbnails.local_derivative(str(path), "thumb", etag)
+        assert response.status_code == 304
+
+    async def test_unknown_variant(self, tmp_path):
+        from fastapi import HTTPException
+
+        with pytest.raises(HTTPException) as exc:
+            await thumbnails.local_derivative(str(tmp_path / "shot.png"), "huge", None)
+        assert exc.value.status_code == 404
@@ -0,0 +1,172 @@
+"""
+Unit tests for streaming artifact uploads (app.uploads) against an
+in-memory stand-in for the boto3 S3 client.
+"""
+
+import io
+import threading
+import time
+
+import pytest
+
+from app import uploads
+from app.uploads import part_size, read_part, stream_upload
+
+
+class FakeS3:
+    """put_object and the multipart calls of boto3; `fail_part` makes that
+    part number fail, `delay` slows every upload_part down"""
+
+    def __init__(self, fail_part: int | None = None, delay: float = 0.0):
+        self.objects = {}
+        self.calls = []
+        self.parts = {}
+        self.fail_part = fail_part
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        self.calls.append(("put_object", extra))
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **extra):
+        self.calls.append(("create_multipart_upload", extra))
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if PartNumber == self.fail_part:
+                raise ConnectionError("S3 is down")
+            self.parts[PartNumber] = Body
+            return {"ETag": f"etag-{PartNumber}"}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append(("complete_multipart_upload", MultipartUpload))
+        self.objects[Key] = b"".join(
+            self.parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append(("abort_multipart_upload", UploadId))
+
+
+def _reader(data: bytes, chunk: int = 3):
+    """UploadFile.read stand-in that returns at most `chunk` bytes per call"""
+    stream = io.BytesIO(data)
+
+    async def read(size: int) -> bytes:
+        return stream.read(min(size, chunk))
+
+    return read
+
+
+def _names(s3: FakeS3) -> list[str]:
+    return [name for name, _ in s3.calls]
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    monkeypatch.setattr(uploads, "MIN_PART_SIZE", 4)
+    monkeypatch.setattr(uploads.settings, "artifact_upload_part_size", 8)
+    monkeypatch.setattr(uploads.settings, "artifact_upload_concurrency", 2)
+
+
+class TestPartSize:
+    """Part size follows the setting but never goes below the S3 minimum"""
+
+    def test_configured_size(self, monkeypatch):
+        monkeypatch.setattr(uploads.settings, "artifact_upload_part_size", 16 * 1024 * 1024)
+        assert part_size() == 16 * 1024 * 1024
+
+    def test_floor_at_s3_minimum(self, monkeypatch):
+        monkeypatch.setattr(uploads.settings, "artifact_upload_part_size", 1024)
+        assert part_size() == 5 * 1024 * 1024
+
+
+@pytest.mark.asyncio
+class TestStreamUpload:
+    """Single put vs multipart, part contents and aborts"""
+
+    async def test_read_part_collects_short_reads(self):
+        read = _reader(b"abcdefghij", chunk=3)
+        assert await read_part(read, 8) == b"abcdefgh"
+        assert await read_part(read, 8) == b"ij"
+        assert await read_part(read, 8) == b""
+
+    async def test_small_file_is_a_single_put(self, small_parts):
+        s3 = FakeS3()
+        stored = await stream_upload(s3, "bucket", "k", _reader(b"1234567"), "image/png")
+
+        assert stored == 7
+        assert s3.calls == [("put_object", {"ContentType": "image/png"})]
+        assert s3.objects["k"] == b"1234567"
+
+    async def test_file_of_one_full_part_is_multipart(self, small_parts):
+        s3 = FakeS3()
+        assert await stream_upload(s3, "bucket", "k", _reader(b"12345678")) == 8
+        assert _names(s3) == ["create_multipart_upload", "complete_multipart_upload"]
+        assert s3.objects["k"] == b"12345678"
+
+    async def test_large_file_is_split_into_ordered_parts(self, small_parts):
+        s3 = FakeS3(delay=0.01)
+        data = bytes(range(30))
+
+        stored = await stream_upload(s3, "bucket", "k", _reader(data), "application/zip")
+
+        assert stored == 30
+        assert s3.calls[0] == ("create_multipart_upload", {"ContentType": "application/zip"})
+        assert {n: len(body) for n, body in s3.parts.items()} == {1: 8, 2: 8, 3: 8, 4: 6}
+        assert s3.calls[-1] == ("complete_multipart_upload", {"Parts": [
+            {"ETag": f"etag-{n}", "PartNumber": n} for n in (1, 2, 3, 4)]})
+        assert s3.objects["k"] == data
+        assert s3.max_in_flight <= 2
+
+    async def test_failed_part_aborts_the_upload(self, small_parts):
+        s3 = FakeS3(fail_part=2)
+
+        with pytest.raises(ConnectionError):
+            await stream_upload(s3, "bucket", "k", _reader(bytes(40)))
+
+        assert _names(s3)[-1] == "abort_multipart_upload"
+        assert "complete_multipart_upload" not in _names(s3)
+        assert "k" not in s3.objects
+
+    async def test_too_many_parts_aborts_the_upload(self, small_parts, monkeypatch):
+        monkeypatch.setattr(uploads, "MAX_PARTS", 2)
+        s3 = FakeS3()
+
+        with pytest.raises(ValueError):
+            await stream_upload(s3, "bucket", "k", _reader(bytes(20)))
+
+        assert _names(s3) == ["create_multipart_upload", "abort_multipart_upload"]
+
+
+class TestMultipartCleanupRule:
+    """The abort rule is added once and other lifecycle rules are kept"""
+
+    def test_rule_replaces_previous_and_keeps_others(self, monkeypatch):
+        monkeypatch.setattr(uploads.settings, "artifact_multipart_expiry_days", 3)
+
+        class LifecycleS3:
+            rules = [{"ID": "keep-me"}, {"ID": uploads.ABORT_RULE_ID, "Status": "Disabled"}]
+
+            def get_bucket_lifecycle_configuration(self, Bucket):
+                return {"Rules": self.rules}
+
+            def put_bucket_lifecycle_configuration(self, Bucket, LifecycleConfiguration):
+                self.rules = LifecycleConfiguration["Rules"]
+
+        s3 = LifecycleS3()
+        uploads.ensure_multipart_cleanup(s3, "bucket")
+
+        assert [r["ID"] for r in s3.rules] == ["keep-me", uploads.ABORT_RULE_ID]
+        assert s3.rules[1]["Status"] == "Enabled"
+        assert s3.rules[1]["AbortIncompleteMultipartUpload"] == {"DaysAfterInitiation": 3}
@@ -600,6 +600,53 @@ class TestWebSocketTaskResults:
                 # Connection should remain stable
                 assert ws.state == websockets.protocol.OPEN
 
+    @pytest.mark.asyncio
+    async def test_task_result_records_latency_histograms(self):
+        """Test that envelope timestamps feed the task stage histograms."""
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=15) as client:
+            access_token, _ = await create_user_and_get_token(client)
+            device_id, device_token = await enroll_device(client, access_token)
+
+            uri = f"{WS_URL}/v1/ws/agent?token={device_token}"
+
+            async with websockets.connect(uri) as ws:
+                task_response = await client.post(
+                    "/v1/tasks/",
+                    headers={
+                        "Authorization": f"Bearer {access_token}",
+                        "Idempotency-Key": uuid.uuid4().hex,
+                    },
+                    json={
+                        "device_id": device_id,
+                        "title": "Latency Test Task",
+                        "metadata": {"actions": [{"action_id": "a1", "type": "noop", "params": {}}]},
+                    },
+                )
+                task_id = task_response.json()["id"]
+
+                envelope = json.loads(await asyncio.wait_for(ws.recv(), timeout=5.0))
+                assert envelope["task_id"] == task_id
+                assert "queued_at" in envelope
+                assert "issued_at" in envelope
+
+                await ws.send(json.dumps({
+                    "type": "task.result",
+                    "task_id": task_id,
+                    "results": [{"action_id": "a1", "status": "done"}],
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "signature": "",
+                }))
+                await asyncio.sleep(1)
+
+            metrics = (await client.get("/metrics")).text
+            for name in (
+                "task_queue_wait_seconds_count",
+                "task_delivery_latency_seconds_count",
+                "task_execution_seconds_count",
+                "task_result_persist_seconds_count",
+            ):
+                assert f'{name}{{action_type="noop"' in metrics
+
     @pytest.mark.asyncio
     async def test_task_result_failure(self):
         """Test failed task result submission."""
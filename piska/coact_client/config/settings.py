@@ -62,6 +62,12 @@ class LoggingConfig(BaseModel):
     enable_remote_logging: bool = True
 
 
+class CacheConfig(BaseModel):
+    """Local cache limits; the oldest files are deleted first"""
+    screenshots_max_mb: int = 500
+    screenshots_max_files: int = 1000
+
+
 class Settings(BaseSettings):
     """Main application settings"""
     
@@ -75,6 +81,7 @@ class Settings(BaseSettings):
     device: DeviceConfig = Field(default_factory=DeviceConfig)
     security: SecurityConfig = Field(default_factory=SecurityConfig)
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
     
     # Paths
     config_dir: Path = Field(default_factory=lambda: Path(platformdirs.user_config_dir("coact-client")))
@@ -15,6 +15,7 @@ import threading
 from datetime import datetime
 
 from coact_client.config.settings import settings
+from coact_client.utils.file_cache import screenshot_cache
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +60,8 @@ class DesktopEnvModule:
         # Environment settings
         self.cache_dir = settings.cache_dir / "desktop_env"
         self.cache_dir.mkdir(exist_ok=True)
+        # Only screenshots; the rest of cache_dir belongs to DesktopEnv
+        self.screenshot_cache = screenshot_cache(self.cache_dir)
         
         # Environment instance
         self._env: Optional[DesktopEnv] = None
@@ -153,6 +156,7 @@ class DesktopEnvModule:
             # Convert PIL Image to file
             if hasattr(observation["screenshot"], "save"):
                 observation["screenshot"].save(screenshot_path)
+                self.screenshot_cache.add(screenshot_path)
                 processed["screenshot_path"] = str(screenshot_path)
                 processed["screenshot_size"] = observation["screenshot"].size
             
@@ -271,6 +275,7 @@ class DesktopEnvModule:
             
             if hasattr(screenshot, "save"):
                 screenshot.save(screenshot_path)
+                self.screenshot_cache.add(screenshot_path)
                 
                 return {
                     "success": True,
@@ -6,6 +6,7 @@ capabilities on the current system (macOS/Linux/Windows).
 """
 
 from coact_client.config.settings import settings
+from coact_client.utils.file_cache import screenshot_cache
 import asyncio
 import logging
 import tempfile
@@ -58,6 +59,7 @@ class EmbeddedDesktopEnvModule:
         # Environment settings
         self.cache_dir = settings.cache_dir / "embedded_desktop_env"
         self.cache_dir.mkdir(exist_ok=True)
+        self.screenshot_cache = screenshot_cache(self.cache_dir)
 
         # Environment instance
         self._env: Optional[EmbeddedDesktopEnv] = None
@@ -121,6 +123,7 @@ class EmbeddedDesktopEnvModule:
 
             with open(screenshot_path, 'wb') as f:
                 f.write(screenshot_bytes)
+            self.screenshot_cache.add(screenshot_path)
 
             # Get image dimensions (approximate from bytes length)
             # For more accurate dimensions, we could use PIL, but for now estimate
@@ -20,6 +20,7 @@ except ImportError:
     HAS_GUI_LIBS = False
 
 from coact_client.config.settings import settings
+from coact_client.utils.file_cache import screenshot_cache
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,7 @@ class ScreenModule:
     def __init__(self):
         self.screenshot_dir = settings.cache_dir / "screenshots"
         self.screenshot_dir.mkdir(exist_ok=True)
+        self.screenshot_cache = screenshot_cache(self.screenshot_dir)
 
         if not HAS_GUI_LIBS:
             logger.warning(
@@ -82,6 +84,7 @@ class ScreenModule:
             filepath = self.screenshot_dir / filename
 
             filepath.write_bytes(img_bytes)
+            self.screenshot_cache.add(filepath)
 
             # Get image info
             width, height = screenshot.size
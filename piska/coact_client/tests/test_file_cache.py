@@ -0,0 +1,77 @@
+"""
+Tests for the size-bounded screenshot cache (coact_client.utils.file_cache)
+"""
+
+import os
+
+from coact_client.utils.file_cache import FileCache
+
+
+def _write(directory, name, size, mtime=None):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestFileCache:
+    """Byte and file count budgets, oldest files evicted first"""
+
+    def test_file_count_budget(self, tmp_path):
+        cache = FileCache(tmp_path, max_bytes=1000, max_files=2)
+        paths = [_write(tmp_path, f"screenshot_{i}", 10) for i in range(3)]
+        for path in paths:
+            cache.add(path)
+
+        assert len(cache) == 2
+        assert not paths[0].exists()
+        assert paths[1].exists() and paths[2].exists()
+        assert cache.total_bytes == 20
+
+    def test_byte_budget(self, tmp_path):
+        cache = FileCache(tmp_path, max_bytes=25, max_files=10)
+        first = _write(tmp_path, "screenshot_1", 10)
+        cache.add(first)
+        cache.add(_write(tmp_path, "screenshot_2", 10))
+        cache.add(_write(tmp_path, "screenshot_3", 10))
+
+        assert not first.exists()
+        assert cache.total_bytes == 20
+
+    def test_newest_file_is_kept_over_budget(self, tmp_path):
+        cache = FileCache(tmp_path, max_bytes=5, max_files=10)
+        small = _write(tmp_path, "screenshot_1", 1)
+        cache.add(small)
+        big = _write(tmp_path, "screenshot_2", 50)
+        cache.add(big)
+
+        assert big.exists() and not small.exists()
+        assert len(cache) == 1
+
+    def test_rewritten_file_is_counted_once(self, tmp_path):
+        cache = FileCache(tmp_path, max_bytes=1000, max_files=10)
+        path = _write(tmp_path, "screenshot_1", 10)
+        cache.add(path)
+        path.write_bytes(b"x" * 30)
+        cache.add(path)
+
+        assert len(cache) == 1
+        assert cache.total_bytes == 30
+
+    def test_missing_file_is_ignored(self, tmp_path):
+        cache = FileCache(tmp_path, max_bytes=1000, max_files=10)
+        cache.add(tmp_path / "screenshot_gone")
+        assert len(cache) == 0
+
+    def test_existing_files_are_scanned_oldest_first(self, tmp_path):
+        old = _write(tmp_path, "screenshot_b", 10, mtime=1_000)
+        new = _write(tmp_path, "screenshot_a", 10, mtime=2_000)
+        other = _write(tmp_path, "notes.txt", 10, mtime=500)
+
+        cache = FileCache(tmp_path, max_bytes=1000, max_files=1, pattern="screenshot_*")
+
+        assert not old.exists()
+        assert new.exists()
+        assert other.exists()
+        assert cache.total_bytes == 10
@@ -0,0 +1,90 @@
+"""
+Size-bounded file cache
+
+Keeps a directory of generated files (screenshots) under a byte and file
+count budget by deleting the oldest files first. Cached files are written
+once and never reused, so eviction is FIFO by write time; the order is the
+file's mtime, so it survives restarts and existing files are picked up when
+the cache is created.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Union
+
+from coact_client.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FileCache:
+    """FIFO over the files in `directory` matching `pattern`"""
+
+    def __init__(self, directory: Path, max_bytes: int, max_files: int,
+                 pattern: str = "*"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.pattern = pattern
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        # Files are written from executor threads
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for path in self.directory.glob(self.pattern):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                files.append((stat.st_mtime, path, stat.st_size))
+        with self._lock:
+            for _, path, size in sorted(files):
+                self._entries[path] = size
+                self.total_bytes += size
+            self._evict()
+
+    def add(self, path: Union[str, Path]):
+        """Record a file that was just written and evict if over budget"""
+        path = Path(path)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        with self._lock:
+            self.total_bytes -= self._entries.pop(path, 0)
+            self._entries[path] = size
+            self.total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        # The newest file is kept even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            self.total_bytes > self.max_bytes or len(self._entries) > self.max_files
+        ):
+            path, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict cached file {path}: {e}")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def screenshot_cache(directory: Path) -> FileCache:
+    """Cache of `screenshot_*` files in `directory` with the configured limits"""
+    return FileCache(
+        directory,
+        max_bytes=settings.cache.screenshots_max_mb * 1024 * 1024,
+        max_files=settings.cache.screenshots_max_files,
+        pattern="screenshot_*",
+    )